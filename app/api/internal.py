@@ -2,11 +2,20 @@
 Internal API endpoints for operations/monitoring.
 These should NOT be exposed to the public internet.
 """
-from fastapi import APIRouter, Request
-from datetime import datetime
+from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+from datetime import datetime, timezone
+import asyncio
 import logging
-from app.services import sheet_service
+from app.services import (
+    sheet_service, voice_service, warmup_service, health_service, lifecycle_service,
+    digest_service, outbox_service, pipeline_service, fast_summary_service, result_cache_service,
+    cdr_service, metrics_service, profiler_service, prompt_audio_service, capture_service,
+    local_config_service, trace_service, repeat_caller_service
+)
 from app.core.config import settings
+from app.core import tenant_config
 
 internal_router = APIRouter(prefix="/internal", tags=["internal"])
 logger = logging.getLogger(__name__)
@@ -18,20 +27,10 @@ async def warmup_cache(request: Request):
     Call this via cron every 10 minutes to ensure config is ready.
     """
     start = datetime.utcnow()
-    tenants_warmed = []
-    errors = []
     
-    # Warm up all known tenants
-    for tenant_id in sheet_service.TENANT_MAP.keys():
-        try:
-            # Force cache refresh by getting config
-            config = sheet_service.get_tenant_config(tenant_id)
-            if config:
-                tenants_warmed.append(tenant_id)
-                logger.info(f"Warmed cache for {tenant_id}")
-        except Exception as e:
-            errors.append({"tenant": tenant_id, "error": str(e)})
-            logger.error(f"Failed to warm cache for {tenant_id}: {e}")
+    # Warm up all known tenants (config + precompiled TwiML). In a thread: it may
+    # fetch sheets and synthesize prompt audio, which would stall the event loop
+    tenants_warmed, errors = await asyncio.to_thread(warmup_service.warm_all_tenants)
     
     elapsed = (datetime.utcnow() - start).total_seconds()
     
@@ -43,10 +42,12 @@ async def warmup_cache(request: Request):
     }
 
 @internal_router.get("/status")
-async def detailed_status(request: Request):
+async def detailed_status(request: Request, detail: bool = False):
     """
     Detailed server status for monitoring.
     Returns uptime, call stats, cache status, etc.
+    detail=true adds the slow parts (config memory footprint walk, digest buffer
+    counts from disk), which the watchdog's frequent polling leaves out.
     """
     app = request.app
     now = datetime.utcnow()
@@ -74,10 +75,12 @@ async def detailed_status(request: Request):
     cache_info = {
         "ttl_seconds": settings.SHEET_CACHE_TTL,
         "current_size": len(sheet_service.msg_cache),
-        "max_size": sheet_service.msg_cache.maxsize
+        "max_size": sheet_service.msg_cache.maxsize,
+        "revisions": {t: rev for t, (rev, _) in sheet_service._config_store.items()},
+        "local": local_config_service.get_stats()
     }
     
-    return {
+    status = {
         "status": "healthy",
         "timestamp": now.isoformat(),
         "uptime": {
@@ -86,27 +89,195 @@ async def detailed_status(request: Request):
         },
         "calls": {
             "total": call_count,
-            "last_call_at": last_call.isoformat() if last_call else None
+            "last_call_at": last_call.isoformat() if last_call else None,
+            "by_tenant": metrics_service.snapshot()
         },
         "sheets": {
             "status": sheets_status,
             "mock_mode": settings.MOCK_MODE
         },
         "cache": cache_info,
+        "outbox": outbox_service.get_stats(),
+        "pipeline": pipeline_service.get_stats(),
+        "lifecycle": lifecycle_service.get_stats(),
+        "repeat_callers": repeat_caller_service.get_stats(),
+        "fast_summary": fast_summary_service.get_stats(),
+        "result_cache": result_cache_service.get_stats(),
+        "cdr": cdr_service.get_stats(),
+        "profiler": profiler_service.get_stats(),
+        "prompt_audio": prompt_audio_service.get_stats(),
+        "capture": capture_service.get_stats(),
+        "tracing": trace_service.get_stats(),
+        "startup": getattr(app.state, "startup", {}),
+        "readiness": health_service.readiness(app),
         "config": {
             "sendgrid_configured": bool(settings.SENDGRID_API_KEY),
             "openai_configured": bool(settings.OPENAI_API_KEY),
             "twilio_configured": bool(settings.TWILIO_ACCOUNT_SID)
         }
     }
+    if detail:
+        configs = [config for _, config in list(sheet_service._config_store.values())]
+        cache_info["footprint"] = await asyncio.to_thread(tenant_config.footprint, configs)
+        status["digest_pending"] = await asyncio.to_thread(digest_service.pending_counts)
+    return status
 
 @internal_router.post("/clear-cache")
 async def clear_cache():
     """Clear all cached data (for debugging/emergency)"""
-    sheet_service.msg_cache.clear()
+    sheet_service.clear_all()
     logger.warning("Cache cleared manually via /internal/clear-cache")
     return {"status": "ok", "message": "Cache cleared"}
 
+@internal_router.post("/invalidate")
+async def invalidate_tenant(
+    request: Request,
+    spreadsheet_id: Optional[str] = None,
+    tenant_id: Optional[str] = None,
+    refresh: bool = True
+):
+    """
+    Invalidate (and by default reload) a single tenant's cached config.
+    Intended for a Google Apps Script onEdit trigger, see scripts/sheets_onedit.gs.
+    Accepts spreadsheet_id/tenant_id as query params or JSON body.
+    """
+    if settings.INVALIDATE_TOKEN:
+        token = request.headers.get("X-Invalidate-Token") or request.query_params.get("token")
+        if token != settings.INVALIDATE_TOKEN:
+            raise HTTPException(status_code=401, detail="Invalid token")
+    
+    # Apps Script posts JSON; query params win if both are given
+    if not spreadsheet_id and not tenant_id:
+        try:
+            body = await request.json()
+        except Exception:
+            body = {}
+        if isinstance(body, dict):
+            spreadsheet_id = body.get("spreadsheet_id")
+            tenant_id = body.get("tenant_id")
+            refresh = _parse_bool(body.get("refresh", refresh))
+    
+    if not tenant_id and spreadsheet_id:
+        tenant_id = sheet_service.resolve_tenant_by_sheet_id(spreadsheet_id)
+    if not tenant_id or tenant_id not in sheet_service.TENANT_MAP:
+        raise HTTPException(status_code=404, detail="Unknown tenant")
+    
+    start = datetime.utcnow()
+    was_cached = sheet_service.invalidate_tenant(tenant_id)
+    
+    refreshed = False
+    if refresh:
+        try:
+            config = sheet_service.get_tenant_config(tenant_id)
+            voice_service.precompile(config)
+            refreshed = True
+        except Exception as e:
+            logger.error(f"Failed to refresh config for {tenant_id}: {e}")
+    
+    elapsed = (datetime.utcnow() - start).total_seconds()
+    logger.info(f"Invalidated cache for {tenant_id} (was_cached={was_cached}, refreshed={refreshed})")
+    
+    return {
+        "status": "ok" if refreshed or not refresh else "partial",
+        "tenant": tenant_id,
+        "was_cached": was_cached,
+        "refreshed": refreshed,
+        "elapsed_seconds": elapsed
+    }
+
+@internal_router.get("/calls")
+async def list_calls(
+    tenant_id: Optional[str] = None,
+    from_number: Optional[str] = None,
+    call_sid: Optional[str] = None,
+    event: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None
+):
+    """
+    Call detail records, newest first.
+    start/end accept epoch seconds or ISO 8601; pass next_cursor back as cursor for the next page.
+    """
+    try:
+        start_ts, end_ts = _parse_time(start), _parse_time(end)
+        # SQLite (and the lock the flush thread holds) stays off the event loop
+        return await asyncio.to_thread(
+            cdr_service.query_events,
+            tenant_id=tenant_id, from_number=from_number, call_sid=call_sid, event=event,
+            start=start_ts, end=end_ts, limit=max(1, min(limit, 500)), cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@internal_router.get("/calls/hourly")
+async def calls_hourly(
+    tenant_id: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+):
+    """Per tenant, per hour event counts (from the rollup table)"""
+    try:
+        start_ts, end_ts = _parse_time(start), _parse_time(end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    hours = await asyncio.to_thread(cdr_service.query_hourly, tenant_id=tenant_id, start=start_ts, end=end_ts)
+    return {"hours": hours}
+
+@internal_router.post("/profiler/start")
+async def profiler_start(
+    sample_rate: Optional[float] = None,
+    interval_ms: Optional[float] = None,
+    reset: bool = False
+):
+    """Start sampling a fraction of /voice/* requests and process_recording runs"""
+    profiler_service.start(rate=sample_rate, interval_ms=interval_ms, reset=reset)
+    return profiler_service.get_stats()
+
+@internal_router.post("/profiler/stop")
+async def profiler_stop():
+    """Stop sampling (collected stacks are kept until reset)"""
+    profiler_service.stop()
+    return profiler_service.get_stats()
+
+@internal_router.get("/profiler", response_class=PlainTextResponse)
+async def profiler_stacks(reset: bool = False):
+    """Collapsed stacks for flamegraph.pl / speedscope"""
+    output = profiler_service.collapsed()
+    if reset:
+        profiler_service.clear()
+    return output
+
+@internal_router.get("/traces/{call_sid}")
+async def call_trace(call_sid: str, format: str = "json"):
+    """Waterfall of one call's spans (webhooks, queue waits, AI calls, email); format=text for bars"""
+    trace = trace_service.waterfall(call_sid)
+    if not trace["spans"]:
+        raise HTTPException(status_code=404, detail="No spans for this call")
+    if format == "text":
+        return PlainTextResponse(trace_service.render_waterfall(trace))
+    return trace
+
+def _parse_bool(value) -> bool:
+    """JSON body flag parsed like a bool query param ("false", "0", "no", "off" are False)"""
+    if isinstance(value, str):
+        return value.strip().lower() not in ("false", "0", "no", "off", "f", "n", "")
+    return bool(value)
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    """Epoch seconds or ISO 8601 (naive = UTC)"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
 def _format_uptime(seconds: float) -> str:
     """Format seconds into human readable uptime"""
     days = int(seconds // 86400)
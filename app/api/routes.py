@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Request, Response, Form, BackgroundTasks
+from fastapi import APIRouter, Request, Response, Form, BackgroundTasks, HTTPException
+from fastapi.responses import FileResponse
 import logging
+import time
 from typing import Optional
 from cachetools import TTLCache
-from app.services import sheet_service, voice_service, processing_service
+from app.services import sheet_service, voice_service, processing_service, pipeline_service, cdr_service, metrics_service, prompt_audio_service, trace_service, repeat_caller_service
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -24,7 +26,31 @@ def _update_call_context(call_sid: str, **kwargs):
     call_context_cache[call_sid] = ctx
     logger.debug(f"Updated call context for {call_sid}: {ctx}")
 
+def _is_synthetic(request: Request) -> bool:
+    """Watchdog synthetic probe (scripts/watchdog.py --daemon)"""
+    return request.headers.get("X-Bluefone-Synthetic") == "1"
+
+def _record_event(call_sid: str, event: str, outcome: str, tenant_id: str = None, synthetic: bool = False,
+                  **detail):
+    """Count the event and queue a call detail record (tenant/numbers from the call context)"""
+    if synthetic:
+        return
+    ctx = _get_call_context(call_sid)
+    tenant_id = tenant_id or ctx.get("tenant_id")
+    metrics_service.increment(tenant_id, event, outcome)
+    repeat_caller_service.record_event(tenant_id, ctx.get("from_number"), event)
+    cdr_service.record_event(
+        call_sid,
+        tenant_id,
+        event,
+        from_number=ctx.get("from_number"),
+        to_number=ctx.get("to_number"),
+        outcome=outcome,
+        **detail
+    )
+
 @router.post("/voice/incoming")
+@trace_service.traced("voice.incoming", call_sid_arg="CallSid")
 async def voice_incoming(
     request: Request,
     To: Optional[str] = Form(None),
@@ -33,30 +59,54 @@ async def voice_incoming(
 ):
     """Handle incoming call - returns main menu or off-mode TwiML"""
     from datetime import datetime
+    started = time.perf_counter()
     
-    # Track call statistics
-    request.app.state.last_call_at = datetime.utcnow()
-    request.app.state.call_count = getattr(request.app.state, 'call_count', 0) + 1
+    # Track call statistics (watchdog synthetic probes excluded)
+    synthetic = _is_synthetic(request)
+    if not synthetic:
+        request.app.state.last_call_at = datetime.utcnow()
+        request.app.state.call_count = getattr(request.app.state, 'call_count', 0) + 1
     
     tenant_id = sheet_service.resolve_tenant_by_phone(To)
     logger.info(f"Incoming call for {tenant_id} from {From} (CallSid: {CallSid})")
     
     config = sheet_service.get_tenant_config(tenant_id)
     is_open = sheet_service.is_store_open(config)
-    
-    # Store initial call context
-    _update_call_context(CallSid, 
-        tenant_id=tenant_id,
-        from_number=From,
-        to_number=To,
-        is_open=is_open,
-        menu_selection="off" if not is_open else None
-    )
-    
-    xml = voice_service.generate_incoming_response(config, is_open)
+    # Looked up before this call's own event is counted
+    returning = is_open and not synthetic and repeat_caller_service.is_returning(tenant_id, From)
+    
+    # Store initial call context. Not for watchdog probes: a fresh CallSid every
+    # interval would push real calls' menu selections out of the cache.
+    if not synthetic:
+        _update_call_context(CallSid, 
+            tenant_id=tenant_id,
+            from_number=From,
+            to_number=To,
+            is_open=is_open,
+            menu_selection="off" if not is_open else None,
+            returning=returning
+        )
+    _record_event(CallSid, "incoming", "open" if is_open else "closed", tenant_id, synthetic=synthetic,
+                  is_open=is_open, returning=returning)
+    
+    xml = voice_service.generate_incoming_response(config, is_open, returning)
+    _record_first_call(request.app, started)
     return Response(content=xml, media_type="application/xml")
 
+def _record_first_call(app, started: float):
+    """Time-to-first-successful-call (latency of the first incoming webhook)"""
+    startup = getattr(app.state, "startup", None)
+    if startup is None or startup.get("first_call_ms") is not None:
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    startup["first_call_ms"] = round(elapsed_ms, 1)
+    budget = startup.get("budgets_ms", {}).get("first_call")
+    if budget and elapsed_ms > budget:
+        startup["over_budget"].append("first_call")
+        logger.warning(f"Startup budget exceeded: first call took {elapsed_ms:.0f}ms (budget {budget}ms)")
+
 @router.post("/voice/menu")
+@trace_service.traced("voice.menu", call_sid_arg="CallSid")
 async def voice_menu(
     Digits: str = Form(...),
     To: Optional[str] = Form(None),
@@ -73,11 +123,13 @@ async def voice_menu(
     # Store menu selection in call context
     _update_call_context(CallSid, menu_selection=menu_name, digit=Digits)
     logger.info(f"Menu selection: {menu_name} for CallSid: {CallSid}")
+    _record_event(CallSid, "menu", menu_name if Digits in menu_map else "invalid", tenant_id, digit=Digits)
     
     xml = voice_service.generate_menu_response(config, Digits)
     return Response(content=xml, media_type="application/xml")
 
 @router.post("/voice/no-input")
+@trace_service.traced("voice.no_input", call_sid_arg="CallSid")
 async def voice_no_input(
     To: Optional[str] = Form(None),
     CallSid: Optional[str] = Form(None)
@@ -87,11 +139,13 @@ async def voice_no_input(
     config = sheet_service.get_tenant_config(tenant_id)
     
     _update_call_context(CallSid, menu_selection="no-input")
+    _record_event(CallSid, "no-input", "no-input", tenant_id)
     
     xml = voice_service.generate_no_input_response(config)
     return Response(content=xml, media_type="application/xml")
 
 @router.post("/voice/recorded-thank-you")
+@trace_service.traced("voice.thank_you", call_sid_arg="CallSid")
 async def voice_recorded_thank_you(
     To: Optional[str] = Form(None),
     CallSid: Optional[str] = Form(None)
@@ -103,10 +157,12 @@ async def voice_recorded_thank_you(
     return Response(content=xml, media_type="application/xml")
 
 @router.post("/voice/recording-status")
+@trace_service.traced("voice.recording_status", call_sid_arg="CallSid")
 async def recording_status(
     background_tasks: BackgroundTasks,
     RecordingUrl: str = Form(...),
     RecordingDuration: Optional[str] = Form(None),
+    RecordingSid: Optional[str] = Form(None),
     From: Optional[str] = Form(None),
     To: Optional[str] = Form(None),
     CallSid: Optional[str] = Form(None)
@@ -118,21 +174,31 @@ async def recording_status(
     
     # Get call context for menu selection
     call_ctx = _get_call_context(CallSid)
-    menu_selection = call_ctx.get("menu_selection", "unknown")
+    menu_selection = call_ctx.get("menu_selection") or "unknown"
+    # Outcome keys stay bounded: "invalid(7)" counts as "invalid"
+    _record_event(CallSid, "recording", menu_selection.split("(")[0], tenant_id,
+                  recording_sid=RecordingSid, duration=RecordingDuration, recording_url=RecordingUrl)
     
-    background_tasks.add_task(
-        processing_service.process_recording, 
+    job = dict(
         tenant_id=tenant_id,
         recording_url=RecordingUrl, 
         from_number=From, 
         call_sid=CallSid, 
         duration=RecordingDuration,
-        menu_selection=menu_selection
+        menu_selection=menu_selection,
+        recording_sid=RecordingSid
     )
+    if pipeline_service.is_running():
+        # Bounded, prioritized, rate-limited processing
+        decision = await pipeline_service.submit(**job)
+        logger.info(f"Recording {CallSid} admitted: {decision}")
+    else:
+        background_tasks.add_task(processing_service.process_recording, **job)
     
     return Response(status_code=200)
 
 @router.post("/voice/call-status")
+@trace_service.traced("voice.call_status", call_sid_arg="CallSid")
 async def call_status(
     CallSid: Optional[str] = Form(None),
     CallStatus: Optional[str] = Form(None),
@@ -147,5 +213,19 @@ async def call_status(
         call_status=CallStatus,
         call_duration=CallDuration
     )
+    tenant_id = _get_call_context(CallSid).get("tenant_id") or sheet_service.resolve_tenant_by_phone(To)
+    _record_event(CallSid, "call-status", CallStatus or "unknown", tenant_id, duration=CallDuration)
     
     return Response(status_code=200)
+
+@router.get("/audio/{name}")
+async def prompt_audio(name: str):
+    """Pre-rendered prompt audio for <Play> (content-addressed, never changes)"""
+    path = prompt_audio_service.audio_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return FileResponse(
+        path,
+        media_type=prompt_audio_service.CONTENT_TYPES[name.rsplit(".", 1)[1]],
+        headers={"Cache-Control": "public, max-age=31536000, immutable", "ETag": f'"{name.split(".")[0]}"'}
+    )
@@ -10,10 +10,33 @@ class Settings(BaseSettings):
     GOOGLE_SERVICE_ACCOUNT_JSON: Optional[str] = None  # JSON string from env var
     
     SHEET_CACHE_TTL: int = 180  # 3 minutes cache
+    SHEET_CACHE_MAX_TENANTS: int = 2000  # configs cached at once, keep above the number of active tenants
+    # Cheap change check on cache expiry (Drive files.get, only version/modifiedTime)
+    SHEET_REVISION_URL: str = "https://www.googleapis.com/drive/v3/files/{spreadsheet_id}"
+    INVALIDATE_TOKEN: str = ""  # Shared secret for /internal/invalidate (empty = no check)
     MOCK_MODE: bool = True  # Default to True for immediate testing without creds
     
     # Transcription / AI
     OPENAI_API_KEY: str = ""
+    OPENAI_TRANSCRIPTION_RPM: float = 50  # Whisper requests/minute (token bucket)
+    OPENAI_SUMMARY_RPM: float = 500  # chat requests/minute
+    OPENAI_RATE_LIMIT_BACKOFF: float = 20  # seconds to pause on 429 without Retry-After
+    RESULT_CACHE_MAX_BYTES: int = 50_000_000  # transcript/summary cache on disk (LRU)
+    FAST_SUMMARY_ENABLED: bool = True  # keyword summary for short transcripts, skips GPT
+    FAST_SUMMARY_MAX_WORDS: int = 40
+    
+    # Recording pipeline admission control (see pipeline_service)
+    PIPELINE_CONCURRENCY: int = 4  # recordings processed at once
+    PIPELINE_TENANT_CONCURRENCY: int = 2  # per tenant
+    PIPELINE_MAX_BACKLOG: int = 200  # beyond this, lowest priority jobs are shed (link-only email)
+    PIPELINE_DEGRADE_DEPTH: int = 20  # backlog depth at which link is emailed first
+    PIPELINE_DEGRADE_WAIT: float = 60  # ...or when OpenAI tokens are this many seconds away
+    PIPELINE_MAX_RETRIES: int = 5  # rate-limited retries per job
+    PIPELINE_HANDOFF_POLL: float = 2.0  # seconds between checks for jobs handed over by a draining process
+    
+    # Graceful shutdown on SIGTERM/SIGHUP (see lifecycle_service, scripts/serve.py)
+    SHUTDOWN_DRAIN_DELAY: float = 0  # seconds /ready reports 503 before the listener closes (raise behind a load balancer)
+    SHUTDOWN_TIMEOUT: float = 20  # running recordings get this long, then the rest is checkpointed
     
     # Twilio
     TWILIO_ACCOUNT_SID: str = ""
@@ -24,6 +47,62 @@ class Settings(BaseSettings):
     SENDGRID_API_KEY: str = ""
     EMAIL_FROM: str = "noreply@bluefone.com"
     
+    # Outbox (durable email queue)
+    OUTBOX_CONCURRENCY: int = 4  # parallel SendGrid requests
+    OUTBOX_MAX_ATTEMPTS: int = 10  # then dead-lettered to emails.log
+    OUTBOX_BACKOFF_BASE: float = 5.0  # seconds, doubled per attempt
+    OUTBOX_BACKOFF_MAX: float = 3600.0
+    
+    # Digest mode (per tenant via settings sheet email_mode=digest)
+    DIGEST_FLUSH_INTERVAL: int = 60  # seconds between time-threshold checks
+    
+    # Call detail records (DATA_DIR/calls.db)
+    CDR_FLUSH_INTERVAL: float = 1.0  # seconds between batched writes
+    CDR_MAX_PENDING: int = 50000  # events buffered in memory before dropping
+    
+    # Local durable state (digest buffers, email outbox, ...)
+    DATA_DIR: str = "data"
+    
+    # Startup: budgets are logged/reported in /internal/status when exceeded (0 = no budget)
+    PRELOAD_SDKS: bool = True  # import openai/sendgrid/... in a worker after startup
+    IMPORT_BUDGET_MS: int = 1500
+    PRELOAD_BUDGET_MS: int = 5000
+    FIRST_CALL_BUDGET_MS: int = 300
+    
+    # Local file config sources (TENANT_MAP "local:<dir>"): seconds between change checks
+    LOCAL_CONFIG_POLL_INTERVAL: float = 2.0
+    
+    # Repeat callers: short greeting (prompts sheet "returning_intro") for numbers that called recently
+    REPEAT_CALLER_ENABLED: bool = True
+    REPEAT_CALLER_HALF_LIFE: float = 259200  # seconds; one call counts as recent for this long (3 days)
+    REPEAT_CALLER_MAX_PER_TENANT: int = 50000  # numbers remembered per tenant (~100 bytes each)
+    
+    # Tracing: spans per call (trace id = CallSid), see /internal/traces/{call_sid}
+    TRACE_ENABLED: bool = True
+    TRACE_MAX_CALLS: int = 2000  # recent calls kept in memory
+    TRACE_EXPORT: str = ""  # "" (memory only) | file | otlp
+    TRACE_FILE: str = "data/traces/spans.jsonl"
+    TRACE_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    TRACE_EXPORT_INTERVAL: float = 2.0
+    
+    # Webhook capture for scripts/replay.py (sanitized /voice/* requests + timing)
+    CAPTURE_ENABLED: bool = False
+    CAPTURE_PATH: str = "data/capture/webhooks.jsonl"
+    CAPTURE_SALT: str = ""  # pseudonymization key for caller numbers / CallSids (empty = random, kept in CAPTURE_SALT_FILE)
+    CAPTURE_SALT_FILE: str = "data/capture/salt"
+    
+    # Pre-rendered prompt audio: <Play> instead of <Say> (served from /audio/, needs BASE_URL)
+    PROMPT_AUDIO_ENABLED: bool = False
+    TTS_BACKEND: str = "openai"  # openai | stub (silent audio, for tests)
+    TTS_MODEL: str = "tts-1"
+    TTS_VOICE: str = "alloy"
+    PROMPT_AUDIO_RETRY_BASE: float = 30.0  # seconds before retrying a failed render, doubled per attempt
+    PROMPT_AUDIO_RETRY_MAX: float = 3600.0
+    
+    # Readiness (/ready): not ready after READY_LAG_BAD_SAMPLES consecutive lag samples (0.5s apart) over the max
+    READY_MAX_LOOP_LAG_MS: int = 100
+    READY_LAG_BAD_SAMPLES: int = 4
+    
     # Base URL for webhooks (used in recording callbacks)
     BASE_URL: str = ""
     
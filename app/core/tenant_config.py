@@ -0,0 +1,153 @@
+"""
+Immutable, compact tenant configuration.
+
+Built once per load from worksheet/CSV rows (from_rows). Compared to the plain
+nested dicts it replaces:
+    - strings are interned, so identical prompt text, keys and values are
+      stored once across all tenants
+    - identical sections (e.g. the same prompts sheet copied to 500 franchise
+      stores) are deduplicated into one shared FrozenSection
+    - the prompt format context (settings + repair_scope + upper-cased keys)
+      is built once here instead of on every render
+    - sections and the config itself are read-only, so sharing is safe
+
+Dict-style access is kept for existing callers: config.get("settings", {}),
+config["prompts"], "schedule" in config.
+"""
+import sys
+import weakref
+
+SECTIONS = ("settings", "schedule", "prompts", "repair_scope")
+
+class FrozenSection(dict):
+    """Read-only dict (still a dict for .get(), json, **kwargs formatting)"""
+    __slots__ = ("__weakref__",)
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("tenant config is read-only (use TenantConfig.with_settings)")
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = __ior__ = _readonly
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+# Shared sections: content hash -> FrozenSection (dropped when no config uses it)
+_sections = weakref.WeakValueDictionary()
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+def freeze_section(mapping) -> FrozenSection:
+    """Interned, deduplicated read-only copy of a key/value mapping"""
+    items = tuple((_intern(k), _intern(v)) for k, v in mapping.items() if k is not None)
+    try:
+        key = hash(items)
+    except TypeError:  # unhashable value, don't share
+        return FrozenSection(items)
+    section = _sections.get(key)
+    if section is not None and section == dict(items):
+        return section
+    section = FrozenSection(items)
+    if key not in _sections:  # on a hash collision the first section keeps the slot
+        _sections[key] = section
+    return section
+
+def freeze_rows(rows) -> tuple:
+    return tuple(freeze_section(row) for row in rows)
+
+def build_format_context(settings: dict, repair_scope: dict) -> FrozenSection:
+    """Placeholders available to prompt text: {store_name}, {STORE_NAME}, {HOURS}, ..."""
+    ctx = {}
+    ctx.update(settings)
+    ctx.update(repair_scope)
+    ctx["STORE_NAME"] = ctx.get("store_name", "")
+    ctx["ADDRESS_LINE"] = ctx.get("address_line", "")
+    ctx["HOURS"] = settings.get("hours_text", "")
+    # Template style is {STORE_NAME}; original keys are kept too
+    ctx.update({k.upper(): v for k, v in ctx.items() if isinstance(k, str)})
+    return freeze_section(ctx)
+
+class TenantConfig:
+    __slots__ = ("settings", "schedule", "prompts", "repair_scope", "format_context", "__weakref__")
+
+    def __init__(self, settings: dict, schedule, prompts: dict, repair_scope: dict):
+        settings = freeze_section(settings)
+        repair_scope = freeze_section(repair_scope)
+        object.__setattr__(self, "settings", settings)
+        object.__setattr__(self, "schedule", freeze_rows(schedule))
+        object.__setattr__(self, "prompts", freeze_section(prompts))
+        object.__setattr__(self, "repair_scope", repair_scope)
+        object.__setattr__(self, "format_context", build_format_context(settings, repair_scope))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("TenantConfig is immutable")
+
+    __delattr__ = __setattr__
+
+    # Dict-style access for callers written against the old nested dicts
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in SECTIONS else default
+
+    def __getitem__(self, key: str):
+        if key not in SECTIONS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key) -> bool:
+        return key in SECTIONS
+
+    def keys(self):
+        return SECTIONS
+
+    def with_settings(self, **updates) -> "TenantConfig":
+        """New config with some settings replaced (e.g. manual_mode overrides in tests)"""
+        return TenantConfig({**self.settings, **updates}, self.schedule, self.prompts, self.repair_scope)
+
+    def to_dict(self) -> dict:
+        return {
+            "settings": dict(self.settings),
+            "schedule": [dict(row) for row in self.schedule],
+            "prompts": dict(self.prompts),
+            "repair_scope": dict(self.repair_scope)
+        }
+
+    def __repr__(self):
+        return f"TenantConfig(store_name={self.settings.get('store_name')!r})"
+
+def from_rows(settings_rows, schedule_rows, prompts_rows, repair_rows) -> TenantConfig:
+    """Worksheet / CSV rows (settings: key,value  prompts: key,text  ...) to a TenantConfig"""
+    return TenantConfig(
+        {row.get("key"): row.get("value") for row in settings_rows},
+        schedule_rows,
+        {row.get("key"): row.get("text") for row in prompts_rows},
+        {row.get("key"): row.get("value") for row in repair_rows}
+    )
+
+def footprint(configs) -> dict:
+    """
+    Deep memory size of a set of configs. Objects shared between configs
+    (interned strings, deduplicated sections) are counted once.
+    """
+    configs = list(configs)
+    seen = set()
+    total = sum(_deep_size(config, seen) for config in configs)
+    return {
+        "tenants": len(configs),
+        "total_bytes": total,
+        "per_tenant_bytes": round(total / len(configs)) if configs else 0,
+        "shared_sections": len(_sections)
+    }
+
+def _deep_size(obj, seen: set) -> int:
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_deep_size(item, seen) for item in obj)
+    elif isinstance(obj, TenantConfig):
+        size += sum(_deep_size(getattr(obj, name), seen) for name in TenantConfig.__slots__[:-1])
+    return size
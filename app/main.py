@@ -1,6 +1,14 @@
+import time
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
 from app.api.routes import router
 from app.api.internal import internal_router
+from app.services import digest_service, outbox_service, warmup_service, health_service, pipeline_service, cdr_service, profiler_service, capture_service, local_config_service, trace_service, lifecycle_service, repeat_caller_service
+from app.core.config import settings
+import asyncio
 import logging
 from datetime import datetime
 
@@ -9,13 +17,133 @@ logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
+logger = logging.getLogger(__name__)
+
+IMPORT_MS = (time.perf_counter() - _import_started) * 1000
+
+def _check_budget(name: str, value_ms: float, budget_ms: int):
+    """Record a startup measurement and warn if it exceeds its budget"""
+    startup = app.state.startup
+    startup[f"{name}_ms"] = round(value_ms, 1)
+    if budget_ms and value_ms > budget_ms:
+        startup["over_budget"].append(name)
+        logger.warning(f"Startup budget exceeded: {name} took {value_ms:.0f}ms (budget {budget_ms}ms)")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _check_budget("import", IMPORT_MS, settings.IMPORT_BUDGET_MS)
+    
+    # Preload tenant configs + precompiled TwiML before accepting traffic
+    start = time.perf_counter()
+    tenants_warmed, errors = await asyncio.to_thread(warmup_service.warm_all_tenants)
+    app.state.startup["tenants_preloaded"] = tenants_warmed
+    app.state.startup["preload_errors"] = errors
+    _check_budget("preload", (time.perf_counter() - start) * 1000, settings.PRELOAD_BUDGET_MS)
+    # Repeat callers from the call history, so a restart keeps the short greeting
+    try:
+        await asyncio.to_thread(repeat_caller_service.rebuild_from_cdr)
+    except Exception as e:
+        logger.error(f"Repeat-caller index rebuild failed: {e}")
+    app.state.preloaded = True
+    
+    tasks = [
+        asyncio.create_task(health_service.run_loop_lag_monitor()),
+        asyncio.create_task(digest_service.run_flush_loop()),
+        asyncio.create_task(outbox_service.run_sender_loop()),
+        asyncio.create_task(cdr_service.run_flush_loop()),
+        asyncio.create_task(local_config_service.run_watch_loop())
+    ]
+    if settings.CAPTURE_ENABLED:
+        tasks.append(asyncio.create_task(capture_service.run_flush_loop()))
+    if settings.TRACE_EXPORT:
+        tasks.append(asyncio.create_task(trace_service.run_export_loop()))
+    tasks.extend(pipeline_service.start())
+    if settings.PRELOAD_SDKS:
+        tasks.append(asyncio.create_task(asyncio.to_thread(warmup_service.preload_sdks)))
+    
+    # SIGTERM/SIGHUP drain instead of uvicorn's immediate shutdown
+    lifecycle_service.install_signal_handlers()
+    lifecycle_service.notify_ready()
+    
+    yield
+    
+    # uvicorn has stopped accepting and finished in-flight requests. Running
+    # recordings get SHUTDOWN_TIMEOUT, the rest is checkpointed for the next process
+    # (the outbox sender keeps delivering their emails meanwhile).
+    shutdown_started = time.perf_counter()
+    await pipeline_service.stop(settings.SHUTDOWN_TIMEOUT)
+    for task in tasks:
+        task.cancel()
+    remaining = settings.SHUTDOWN_TIMEOUT - (time.perf_counter() - shutdown_started)
+    pending_emails = await asyncio.to_thread(outbox_service.drain, max(1.0, remaining))
+    if pending_emails:
+        logger.warning(f"{pending_emails} emails left in the outbox for the next start")
+    # Write out call records (and captured webhooks) still buffered in memory
+    await asyncio.to_thread(cdr_service.flush)
+    await asyncio.to_thread(capture_service.flush)
+    await asyncio.to_thread(trace_service.flush)
 
-app = FastAPI(title="Bluefone IVR", version="1.0.0")
+class ProfilerMiddleware:
+    """Samples /voice/* requests while the profiler is on (plain ASGI: one flag check when off)"""
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if not profiler_service.enabled or scope["type"] != "http" or not scope["path"].startswith("/voice/"):
+            return await self.app(scope, receive, send)
+        with profiler_service.sample(scope["path"].lstrip("/")):
+            await self.app(scope, receive, send)
+
+class CaptureMiddleware:
+    """Records sanitized /voice/* requests with timing for scripts/replay.py (CAPTURE_ENABLED)"""
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or not scope["path"].startswith("/voice/")
+                or (b"x-bluefone-synthetic", b"1") in scope["headers"]):
+            return await self.app(scope, receive, send)
+        
+        started_at, started = time.time(), time.perf_counter()
+        body = []
+        status = [500]
+        
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                body.append(message.get("body", b""))
+            return message
+        
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            capture_service.record(scope["path"], b"".join(body), started_at,
+                                   (time.perf_counter() - started) * 1000, status[0])
+
+app = FastAPI(title="Bluefone IVR", version="1.0.0", lifespan=lifespan)
+app.add_middleware(ProfilerMiddleware)
+if settings.CAPTURE_ENABLED:
+    app.add_middleware(CaptureMiddleware)
 
 # Track server start time
 app.state.started_at = datetime.utcnow()
 app.state.last_call_at = None
 app.state.call_count = 0
+app.state.preloaded = False
+app.state.startup = {
+    "budgets_ms": {
+        "import": settings.IMPORT_BUDGET_MS,
+        "preload": settings.PRELOAD_BUDGET_MS,
+        "first_call": settings.FIRST_CALL_BUDGET_MS
+    },
+    "over_budget": [],
+    "first_call_ms": None
+}
 
 app.include_router(router)
 app.include_router(internal_router)
@@ -26,5 +154,12 @@ async def root():
 
 @app.get("/health")
 async def health():
-    """Health check endpoint - simple and fast"""
+    """Liveness probe - simple and fast, never touches config"""
     return {"status": "healthy", "service": "bluefone-ivr"}
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe - 503 until configs/TwiML are warm and the loop is responsive"""
+    result = health_service.readiness(app)
+    body = {"status": "ready" if result["ready"] else "not_ready", "service": "bluefone-ivr", **result["checks"]}
+    return JSONResponse(content=body, status_code=200 if result["ready"] else 503)
@@ -1,61 +1,111 @@
-import openai
 from app.core.config import settings
+from app.services import result_cache_service, trace_service
 import logging
-import requests
 import os
+import re
+import tempfile
+
+# openai and requests are imported on first use: they are only needed on the
+# background processing path and dominate app import time otherwise.
 
 logger = logging.getLogger(__name__)
 
+SUMMARY_MODEL = "gpt-3.5-turbo"
+SUMMARY_PROMPT = "You are a helpful assistant for a phone repair shop. Summarize the following customer inquiry concisely in English. Include: device type, issue, and any specific requests."
+
 # Lazy client initialization (avoids error if API key not set at import time)
 _client = None
 
+class RateLimited(Exception):
+    """OpenAI returned 429; caller should back off and retry instead of reporting an error"""
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def _raise_if_rate_limited(e: Exception):
+    if type(e).__name__ != "RateLimitError" and getattr(e, "status_code", None) != 429:
+        return
+    retry_after = None
+    try:
+        retry_after = float(e.response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        pass
+    raise RateLimited(str(e), retry_after) from e
+
 def _get_client():
     global _client
     if _client is None and settings.OPENAI_API_KEY:
+        import openai
         _client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
     return _client
 
-def transcribe_audio_from_url(url: str, save_path: str = "temp_recording.wav") -> str:
+def transcribe_audio_from_url(url: str, save_path: str = None, recording_sid: str = None) -> str:
     if not settings.OPENAI_API_KEY:
         return "Transcription unavailable (No API Key)"
     
     client = _get_client()
     if not client:
         return "Transcription unavailable (Client initialization failed)"
+    
+    # Already transcribed this recording (retry / resend / restart)?
+    recording_sid = recording_sid or _recording_sid_from_url(url)
+    sid_key = f"transcript:sid:{recording_sid}" if recording_sid else None
+    if sid_key:
+        cached = result_cache_service.get(sid_key)
+        if cached is not None:
+            logger.info(f"Transcript cache hit for {recording_sid}")
+            return cached
         
+    import requests
+    if save_path is None:
+        # Unique per call: recordings are processed concurrently
+        fd, save_path = tempfile.mkstemp(suffix=".wav", prefix="recording_")
+        os.close(fd)
     try:
         # 1. Download File
         # Handle Twilio Auth if needed (using requests.get(url, auth=(sid, token)))
         # For MVP assuming public URL or add auth if fails
-        if settings.TWILIO_ACCOUNT_SID and settings.TWILIO_AUTH_TOKEN:
-            resp = requests.get(url, auth=(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN))
-        else:
-            resp = requests.get(url)
+        with trace_service.span("recording.download") as attrs:
+            if settings.TWILIO_ACCOUNT_SID and settings.TWILIO_AUTH_TOKEN:
+                resp = requests.get(url, auth=(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN))
+            else:
+                resp = requests.get(url)
+            attrs.update(status=resp.status_code, bytes=len(resp.content))
             
         if resp.status_code != 200:
             logger.error(f"Failed to download audio: {resp.status_code}")
             return f"Error downloading audio: {resp.status_code}"
-            
-        with open(save_path, "wb") as f:
-            f.write(resp.content)
-            
-        # 2. Transcribe
-        with open(save_path, "rb") as audio_file:
-            transcript = _get_client().audio.transcriptions.create(
-                model="whisper-1", 
-                file=audio_file,
-                language="en" # Force English as per spec
-            )
-            
-        # Cleanup
-        if os.path.exists(save_path):
-            os.remove(save_path)
-            
-        return transcript.text
+        
+        # Identical audio (e.g. same recording under another URL) is transcribed once
+        audio_key = f"transcript:audio:{result_cache_service.content_hash(resp.content)}"
+        text = result_cache_service.get(audio_key)
+        
+        if text is None:
+            with open(save_path, "wb") as f:
+                f.write(resp.content)
+                
+            # 2. Transcribe
+            with open(save_path, "rb") as audio_file, trace_service.span("openai.whisper"):
+                transcript = _get_client().audio.transcriptions.create(
+                    model="whisper-1", 
+                    file=audio_file,
+                    language="en" # Force English as per spec
+                )
+            text = transcript.text
+            result_cache_service.put(audio_key, text)
+        
+        if sid_key:
+            result_cache_service.put(sid_key, text)
+        return text
         
     except Exception as e:
+        _raise_if_rate_limited(e)
         logger.error(f"Transcription error: {e}")
         return f"Error during transcription: {e}"
+    finally:
+        # Cleanup
+        if os.path.exists(save_path):
+            os.remove(save_path)
 
 def generate_summary(text: str) -> str:
     if not settings.OPENAI_API_KEY:
@@ -65,15 +115,32 @@ def generate_summary(text: str) -> str:
     if not client:
         return "Summary unavailable (Client initialization failed)"
         
+    # Same prompt + model + (normalized) transcript -> same summary
+    normalized = " ".join(text.split()).lower()
+    digest = result_cache_service.content_hash("\n".join([SUMMARY_MODEL, SUMMARY_PROMPT, normalized]))
+    cache_key = f"summary:{digest}"
+    cached = result_cache_service.get(cache_key)
+    if cached is not None:
+        return cached
+        
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant for a phone repair shop. Summarize the following customer inquiry concisely in English. Include: device type, issue, and any specific requests."},
-                {"role": "user", "content": text}
-            ]
-        )
-        return response.choices[0].message.content
+        with trace_service.span("openai.chat", model=SUMMARY_MODEL):
+            response = client.chat.completions.create(
+                model=SUMMARY_MODEL,
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": text}
+                ]
+            )
+        summary = response.choices[0].message.content
+        result_cache_service.put(cache_key, summary)
+        return summary
     except Exception as e:
+        _raise_if_rate_limited(e)
         logger.error(f"Summary error: {e}")
         return f"Error generating summary: {e}"
+
+def _recording_sid_from_url(url: str):
+    """Twilio recording URLs end in /Recordings/RE<32 hex>"""
+    match = re.search(r"/Recordings/(RE[0-9a-fA-F]{32})", url or "")
+    return match.group(1) if match else None
@@ -0,0 +1,127 @@
+"""
+Webhook capture for load replay (opt-in, CAPTURE_ENABLED).
+
+Every /voice/* request is recorded as one compact JSON line in CAPTURE_PATH:
+    {"t": arrival epoch, "p": path, "f": {form fields}, "ms": latency, "s": status}
+
+Only the fields the IVR reads are kept, and caller identifiers are pseudonymized
+with a keyed hash (HMAC-SHA256 under CAPTURE_SALT, so per-caller and per-call
+sequences survive):
+    From      -> +0 followed by 10 hashed digits
+    CallSid   -> CA + 32 hashed hex chars
+    RecordingSid / RecordingUrl -> RE + hashed hex, URL under capture://
+The phone number space is small enough to brute-force an unkeyed or published
+salt, so without CAPTURE_SALT a random one is generated and kept in
+CAPTURE_SALT_FILE (owner-only). Watchdog synthetic calls are not captured. Lines are buffered in memory and
+appended by a background loop. Replay with scripts/replay.py.
+"""
+from app.core.config import settings
+from collections import deque
+from urllib.parse import parse_qsl
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Form fields kept (everything else Twilio sends is dropped)
+KEEP_FIELDS = ("To", "Digits", "RecordingDuration", "CallStatus", "CallDuration")
+PSEUDONYMIZED = ("From", "CallSid", "RecordingSid", "RecordingUrl")
+
+_pending = deque(maxlen=100000)
+_captured = 0
+_salt = None
+
+def record(path: str, body: bytes, started_at: float, latency_ms: float, status: int):
+    """Queue one request (called by the capture middleware, no I/O)"""
+    global _captured
+    form = dict(parse_qsl(body.decode("utf-8", "replace"), keep_blank_values=True))
+    line = {
+        "t": round(started_at, 4),
+        "p": path,
+        "f": sanitize(form),
+        "ms": round(latency_ms, 2),
+        "s": status
+    }
+    _pending.append(json.dumps(line, separators=(",", ":")))
+    _captured += 1
+
+def sanitize(form: dict) -> dict:
+    clean = {k: form[k] for k in KEEP_FIELDS if k in form}
+    if form.get("From"):
+        digits = str(int(_pseudo(form["From"]), 16))[-10:].zfill(10)
+        clean["From"] = f"+0{digits}"
+    if form.get("CallSid"):
+        clean["CallSid"] = "CA" + _pseudo(form["CallSid"])
+    recording = form.get("RecordingSid") or form.get("RecordingUrl")
+    if recording:
+        recording_sid = "RE" + _pseudo(recording)
+        if "RecordingSid" in form:
+            clean["RecordingSid"] = recording_sid
+        if "RecordingUrl" in form:
+            clean["RecordingUrl"] = f"capture://recordings/{recording_sid}"
+    return clean
+
+def flush() -> int:
+    lines = []
+    while _pending:
+        lines.append(_pending.popleft())
+    if not lines:
+        return 0
+    try:
+        os.makedirs(os.path.dirname(settings.CAPTURE_PATH) or ".", exist_ok=True)
+        with open(settings.CAPTURE_PATH, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+    except OSError as e:
+        logger.error(f"Capture write failed, {len(lines)} requests lost: {e}")
+        return 0
+    return len(lines)
+
+async def run_flush_loop():
+    """Background task: append buffered requests to the capture file"""
+    await asyncio.to_thread(_get_salt)  # load (or create) the salt before traffic
+    while True:
+        await asyncio.sleep(1)
+        if _pending:
+            await asyncio.to_thread(flush)
+
+def get_stats() -> dict:
+    return {
+        "enabled": settings.CAPTURE_ENABLED,
+        "path": settings.CAPTURE_PATH,
+        "captured": _captured,
+        "pending": len(_pending)
+    }
+
+def _pseudo(value: str) -> str:
+    return hmac.new(_get_salt(), value.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+def _get_salt() -> bytes:
+    """CAPTURE_SALT, or a random salt generated once and persisted in CAPTURE_SALT_FILE"""
+    global _salt
+    if _salt is None:
+        if settings.CAPTURE_SALT:
+            _salt = settings.CAPTURE_SALT.encode("utf-8")
+        else:
+            _salt = _load_or_create_salt(settings.CAPTURE_SALT_FILE)
+    return _salt
+
+def _load_or_create_salt(path: str) -> bytes:
+    try:
+        with open(path, "rb") as f:
+            salt = f.read().strip()
+        if salt:
+            return salt
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    salt = secrets.token_hex(32).encode("ascii")
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(salt)
+    logger.info(f"Generated capture salt in {path}")
+    return salt
@@ -0,0 +1,194 @@
+"""
+Call detail records.
+
+Every call lifecycle event seen by routes.py (incoming, menu, no-input,
+recording, call-status) is appended to an in-memory batch in O(1) and written
+to SQLite (DATA_DIR/calls.db) by a background flush loop, so the webhook path
+never waits on disk. The query functions block (SQLite, and the lock the flush
+holds): call them from a worker thread, never on the event loop.
+
+Tables:
+    call_events   one row per event, indexed by tenant/time, caller/time, time, CallSid
+    call_hourly   (tenant_id, hour, event) -> count rollup, maintained on flush,
+                  so per-tenant hourly aggregates stay fast over months of history
+"""
+from app.core.config import settings
+from collections import deque
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.path.join(settings.DATA_DIR, "calls.db")
+
+_pending = deque()
+_dropped = 0
+_written = 0
+_lock = threading.Lock()  # serializes flushes / DB access
+_conn = None
+
+def record_event(call_sid: str, tenant_id: str, event: str, from_number: str = None,
+                 to_number: str = None, **detail):
+    """Queue one call event (O(1), no I/O)"""
+    global _dropped
+    if len(_pending) >= settings.CDR_MAX_PENDING:
+        _dropped += 1
+        return
+    _pending.append((
+        call_sid, tenant_id, event, time.time(), from_number, to_number,
+        json.dumps(detail, default=str) if detail else None
+    ))
+
+def flush() -> int:
+    """Write queued events in one transaction. Returns rows written."""
+    global _written
+    with _lock:
+        batch = []
+        while _pending:
+            batch.append(_pending.popleft())
+        if not batch:
+            return 0
+
+        hourly = {}
+        for call_sid, tenant_id, event, ts, *_ in batch:
+            key = (tenant_id, int(ts // 3600), event)
+            hourly[key] = hourly.get(key, 0) + 1
+
+        try:
+            conn = _connect()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO call_events (call_sid, tenant_id, event, ts, from_number, to_number, detail) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", batch
+                )
+                conn.executemany(
+                    "INSERT INTO call_hourly (tenant_id, hour, event, count) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (tenant_id, hour, event) DO UPDATE SET count = count + excluded.count",
+                    [(t, h, e, c) for (t, h, e), c in hourly.items()]
+                )
+        except sqlite3.Error as e:
+            logger.error(f"CDR flush failed, {len(batch)} events requeued: {e}")
+            _pending.extendleft(reversed(batch))
+            return 0
+
+        _written += len(batch)
+        return len(batch)
+
+async def run_flush_loop():
+    """Background task: batch-write queued events"""
+    while True:
+        await asyncio.sleep(settings.CDR_FLUSH_INTERVAL)
+        if _pending:
+            try:
+                await asyncio.to_thread(flush)
+            except Exception as e:
+                logger.error(f"CDR flush error: {e}")
+
+def query_events(tenant_id: str = None, from_number: str = None, call_sid: str = None,
+                 event: str = None, start: float = None, end: float = None,
+                 limit: int = 50, cursor: str = None) -> dict:
+    """
+    Newest-first page of events. cursor is the opaque next_cursor of the previous
+    page (keyset pagination on (ts, id), so deep pages stay cheap).
+    """
+    where, params = _filters(tenant_id=tenant_id, from_number=from_number, call_sid=call_sid,
+                             event=event, start=start, end=end)
+    if cursor:
+        cursor_ts, cursor_id = cursor.split(":")
+        where.append("(ts < ? OR (ts = ? AND id < ?))")
+        params += [float(cursor_ts), float(cursor_ts), int(cursor_id)]
+
+    sql = ("SELECT id, call_sid, tenant_id, event, ts, from_number, to_number, detail FROM call_events"
+           + (" WHERE " + " AND ".join(where) if where else "")
+           + " ORDER BY ts DESC, id DESC LIMIT ?")
+    with _lock:
+        rows = _connect().execute(sql, params + [limit]).fetchall()
+
+    events = [{
+        "call_sid": call_sid_, "tenant_id": tenant_id_, "event": event_, "ts": ts,
+        "from_number": from_, "to_number": to_, **(json.loads(detail) if detail else {})
+    } for _, call_sid_, tenant_id_, event_, ts, from_, to_, detail in rows]
+    next_cursor = f"{rows[-1][4]!r}:{rows[-1][0]}" if len(rows) == limit else None
+    return {"events": events, "next_cursor": next_cursor}
+
+def query_hourly(tenant_id: str = None, start: float = None, end: float = None) -> list:
+    """Per tenant/hour/event counts from the rollup table"""
+    where, params = [], []
+    if tenant_id:
+        where.append("tenant_id = ?")
+        params.append(tenant_id)
+    if start is not None:
+        where.append("hour >= ?")
+        params.append(int(start // 3600))
+    if end is not None:
+        where.append("hour <= ?")
+        params.append(int(end // 3600))
+
+    sql = ("SELECT tenant_id, hour, event, count FROM call_hourly"
+           + (" WHERE " + " AND ".join(where) if where else "")
+           + " ORDER BY hour DESC, tenant_id, event")
+    with _lock:
+        rows = _connect().execute(sql, params).fetchall()
+
+    buckets = {}
+    for tenant_id_, hour, event, count in rows:
+        bucket = buckets.setdefault((tenant_id_, hour), {
+            "tenant_id": tenant_id_, "hour": hour * 3600, "events": {}
+        })
+        bucket["events"][event] = count
+    return list(buckets.values())
+
+def events_since(event: str, start: float) -> list:
+    """(tenant_id, from_number, ts) of one event type since start, oldest first"""
+    with _lock:
+        return _connect().execute(
+            "SELECT tenant_id, from_number, ts FROM call_events WHERE ts >= ? AND event = ? ORDER BY ts",
+            (start, event)
+        ).fetchall()
+
+def get_stats() -> dict:
+    return {"pending": len(_pending), "written": _written, "dropped": _dropped}
+
+def _filters(**kwargs):
+    where, params = [], []
+    for column in ("tenant_id", "from_number", "call_sid", "event"):
+        if kwargs.get(column):
+            where.append(f"{column} = ?")
+            params.append(kwargs[column])
+    if kwargs.get("start") is not None:
+        where.append("ts >= ?")
+        params.append(kwargs["start"])
+    if kwargs.get("end") is not None:
+        where.append("ts < ?")
+        params.append(kwargs["end"])
+    return where, params
+
+def _connect():
+    """Open (once) the CDR database (caller holds _lock)"""
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+        _conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.executescript("""
+            CREATE TABLE IF NOT EXISTS call_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                call_sid TEXT, tenant_id TEXT, event TEXT NOT NULL, ts REAL NOT NULL,
+                from_number TEXT, to_number TEXT, detail TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_events_tenant_ts ON call_events (tenant_id, ts);
+            CREATE INDEX IF NOT EXISTS idx_events_from_ts ON call_events (from_number, ts);
+            CREATE INDEX IF NOT EXISTS idx_events_ts ON call_events (ts);
+            CREATE INDEX IF NOT EXISTS idx_events_call ON call_events (call_sid);
+            CREATE TABLE IF NOT EXISTS call_hourly (
+                tenant_id TEXT, hour INTEGER, event TEXT, count INTEGER NOT NULL,
+                PRIMARY KEY (tenant_id, hour, event)
+            );
+        """)
+    return _conn
@@ -0,0 +1,219 @@
+"""
+Digest email mode for high-volume tenants.
+
+Settings sheet keys (per tenant):
+    email_mode           immediate (default) or digest
+    digest_max_items     flush once this many voicemails are buffered (default 10)
+    digest_max_minutes   flush once the oldest buffered voicemail is this old (default 30)
+    digest_urgent_menus  comma separated menus that bypass the digest, e.g. "repair"
+
+Buffered reports are appended to DATA_DIR/digest/{tenant_id}.jsonl so they
+survive restarts. A flush renames the buffer to .flushing, sends it, then deletes it;
+a leftover .flushing file (crash mid-send) is re-sent on the next flush.
+
+During a reload (scripts/serve.py) two workers share DATA_DIR, so append and
+the whole flush (rename, send, delete) hold an exclusive flock on
+DATA_DIR/digest/{tenant_id}.lock. Otherwise one process could re-send a
+.flushing file the other is still sending, rename a new buffer over an unsent
+.flushing file, or append to a buffer the other has already read.
+"""
+from app.services import email_service
+from app.core.config import settings
+from contextlib import contextmanager
+import asyncio
+import json
+import os
+import threading
+import time
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process locks (no overlapping workers there)
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DIGEST_DIR = os.path.join(settings.DATA_DIR, "digest")
+
+DEFAULT_MAX_ITEMS = 10
+DEFAULT_MAX_MINUTES = 30
+
+# Guards buffer append/rotate (reports can be produced from worker threads)
+_lock = threading.Lock()
+# Serializes flushes so a .flushing file is never sent twice concurrently
+_flush_lock = threading.Lock()
+
+def deliver_report(
+    tenant_id: str,
+    cfg_settings: dict,
+    recipients: list,
+    subject: str,
+    body: str,
+    menu_selection: str = "unknown"
+):
+    """Send a voicemail report now, or buffer it if the tenant is in digest mode"""
+    mode = str(cfg_settings.get("email_mode", "immediate")).strip().lower()
+    if mode != "digest" or str(menu_selection).lower() in _urgent_menus(cfg_settings):
+        email_service.send_report(recipients, subject, body)
+        return
+
+    item = {
+        "queued_at": time.time(),
+        "store_name": cfg_settings.get("store_name", "Store"),
+        "recipients": recipients,
+        "subject": subject,
+        "body": body
+    }
+    count = _append(tenant_id, item)
+    logger.info(f"Buffered report for {tenant_id} digest ({count} pending)")
+
+    if count >= _int_setting(cfg_settings, "digest_max_items", DEFAULT_MAX_ITEMS):
+        flush_tenant(tenant_id)
+
+def flush_tenant(tenant_id: str) -> int:
+    """Send everything buffered for a tenant as digest email(s). Returns items sent."""
+    path = _buffer_path(tenant_id)
+    flushing = path + ".flushing"
+    sent = 0
+
+    with _flush_lock, _tenant_lock(tenant_id):
+        # Leftover from an interrupted flush goes out first
+        if os.path.exists(flushing):
+            sent += _send_digest_file(tenant_id, flushing)
+
+        with _lock:
+            if not os.path.exists(path):
+                return sent
+            os.replace(path, flushing)
+
+        sent += _send_digest_file(tenant_id, flushing)
+    return sent
+
+def flush_due(now: float = None) -> int:
+    """Flush every tenant buffer whose oldest item exceeded digest_max_minutes"""
+    from app.services import sheet_service
+
+    if not os.path.isdir(DIGEST_DIR):
+        return 0
+    now = now or time.time()
+    sent = 0
+
+    for name in os.listdir(DIGEST_DIR):
+        if name.endswith(".jsonl.flushing"):
+            # Interrupted flush: always due
+            sent += flush_tenant(name[:-len(".jsonl.flushing")])
+            continue
+        if not name.endswith(".jsonl"):
+            continue
+
+        tenant_id = name[:-len(".jsonl")]
+        oldest = _oldest_queued_at(os.path.join(DIGEST_DIR, name))
+        if oldest is None:
+            continue
+        try:
+            cfg_settings = sheet_service.get_tenant_config(tenant_id).get("settings", {})
+        except Exception as e:
+            logger.error(f"Digest config lookup failed for {tenant_id}: {e}")
+            cfg_settings = {}
+        max_minutes = _int_setting(cfg_settings, "digest_max_minutes", DEFAULT_MAX_MINUTES)
+        if now - oldest >= max_minutes * 60:
+            sent += flush_tenant(tenant_id)
+
+    return sent
+
+async def run_flush_loop():
+    """Background task: time-based digest flushing"""
+    logger.info(f"Digest flush loop started (every {settings.DIGEST_FLUSH_INTERVAL}s)")
+    while True:
+        await asyncio.sleep(settings.DIGEST_FLUSH_INTERVAL)
+        try:
+            await asyncio.to_thread(flush_due)
+        except Exception as e:
+            logger.error(f"Digest flush error: {e}")
+
+def pending_counts() -> dict:
+    """tenant_id -> buffered item count (for status reporting)"""
+    counts = {}
+    if not os.path.isdir(DIGEST_DIR):
+        return counts
+    for name in os.listdir(DIGEST_DIR):
+        if name.endswith(".jsonl") or name.endswith(".jsonl.flushing"):
+            tenant_id = name.split(".jsonl")[0]
+            counts[tenant_id] = counts.get(tenant_id, 0) + len(_read_items(os.path.join(DIGEST_DIR, name)))
+    return counts
+
+def _send_digest_file(tenant_id: str, path: str) -> int:
+    items = _read_items(path)
+    # Items keep the recipients they were addressed to: if email_recipients changed
+    # during the digest window, each recipient set gets its own digest
+    groups = {}
+    for item in items:
+        groups.setdefault(tuple(sorted(item["recipients"])), []).append(item)
+    for recipients, group in groups.items():
+        subject = f"{group[-1]['store_name']} Voicemail Digest | {len(group)} recordings"
+        parts = [f"{len(group)} voicemail recordings received.\n"]
+        for i, item in enumerate(group, 1):
+            parts.append(f"\n#################### {i}/{len(group)} ####################")
+            parts.append(f"{item['subject']}\n")
+            parts.append(item["body"])
+        email_service.send_report(list(recipients), subject, "\n".join(parts))
+        logger.info(f"Digest sent for {tenant_id}: {len(group)} recordings to {len(recipients)} recipients")
+    os.remove(path)
+    return len(items)
+
+def _append(tenant_id: str, item: dict) -> int:
+    with _tenant_lock(tenant_id), _lock:
+        path = _buffer_path(tenant_id)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(item) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        with open(path, "r", encoding="utf-8") as f:
+            return sum(1 for _ in f)
+
+@contextmanager
+def _tenant_lock(tenant_id: str):
+    """Exclusive per-tenant lock across processes (taken before _lock, never inside it)"""
+    os.makedirs(DIGEST_DIR, exist_ok=True)
+    with open(os.path.join(DIGEST_DIR, f"{tenant_id}.lock"), "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield  # released when the file is closed
+
+def _read_items(path: str) -> list:
+    items = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    items.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.error(f"Skipping corrupt digest line in {path}")
+    except FileNotFoundError:
+        pass
+    return items
+
+def _oldest_queued_at(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            first = f.readline()
+        return json.loads(first).get("queued_at") if first.strip() else None
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def _buffer_path(tenant_id: str) -> str:
+    return os.path.join(DIGEST_DIR, f"{tenant_id}.jsonl")
+
+def _urgent_menus(cfg_settings: dict) -> set:
+    raw = cfg_settings.get("digest_urgent_menus", "") or ""
+    return {m.strip().lower() for m in str(raw).split(",") if m.strip()}
+
+def _int_setting(cfg_settings: dict, key: str, default: int) -> int:
+    try:
+        return max(1, int(cfg_settings.get(key) or default))
+    except (TypeError, ValueError):
+        return default
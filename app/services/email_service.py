@@ -1,27 +1,37 @@
 import logging
+import time
 from app.core.config import settings
+from app.services import outbox_service
 
 logger = logging.getLogger(__name__)
 
 def send_report(recipients: list, subject: str, body: str):
     """
-    Sends email report via SendGrid.
-    Falls back to logging if SendGrid is not configured.
+    Queues email report in the durable outbox and returns immediately.
+    The outbox sender loop delivers it (with retries) via deliver_email.
     """
     if not recipients:
         logger.warning("No email recipients defined.")
         return
 
     logger.info(f"Preparing email to {recipients} | Subject: {subject}")
-    
+    outbox_service.enqueue(recipients, subject, body)
+
+def deliver_email(recipients: list, subject: str, body: str) -> dict:
+    """
+    Sends one email now. Called by the outbox sender.
+    Returns {"ok", "status", "retry_after", "error"}.
+    Falls back to logging if SendGrid is not configured.
+    """
     # Use SendGrid if API key is configured
     if settings.SENDGRID_API_KEY:
-        _send_via_sendgrid(recipients, subject, body)
-    else:
-        # Fallback: Log to file for dev/testing
-        _log_email_to_file(recipients, subject, body)
+        return _send_via_sendgrid(recipients, subject, body)
+    
+    # Fallback: Log to file for dev/testing
+    _log_email_to_file(recipients, subject, body)
+    return {"ok": True, "status": None, "retry_after": None, "error": None}
 
-def _send_via_sendgrid(recipients: list, subject: str, body: str):
+def _send_via_sendgrid(recipients: list, subject: str, body: str) -> dict:
     """Send email using SendGrid API"""
     try:
         from sendgrid import SendGridAPIClient
@@ -46,13 +56,29 @@ def _send_via_sendgrid(recipients: list, subject: str, body: str):
         
         if response.status_code >= 400:
             logger.error(f"SendGrid error: {response.body}")
-            # Fallback to log
-            _log_email_to_file(recipients, subject, body)
+            return {"ok": False, "status": response.status_code,
+                    "retry_after": _retry_after(response.headers), "error": str(response.body)}
+        return {"ok": True, "status": response.status_code, "retry_after": None, "error": None}
             
     except Exception as e:
-        logger.error(f"SendGrid error: {e}")
-        # Fallback to log on error
-        _log_email_to_file(recipients, subject, body)
+        # python_http_client raises HTTPError (with status_code/headers) for 4xx/5xx
+        status = getattr(e, "status_code", None)
+        logger.error(f"SendGrid error: {status} {e}")
+        return {"ok": False, "status": status,
+                "retry_after": _retry_after(getattr(e, "headers", None)), "error": str(e)}
+
+def _retry_after(headers) -> float:
+    """Seconds to wait from Retry-After / X-RateLimit-Reset headers (None if absent)"""
+    if not headers:
+        return None
+    try:
+        if headers.get("Retry-After"):
+            return float(headers.get("Retry-After"))
+        if headers.get("X-RateLimit-Reset"):
+            return max(1.0, float(headers.get("X-RateLimit-Reset")) - time.time())
+    except (TypeError, ValueError):
+        pass
+    return None
 
 def _log_email_to_file(recipients: list, subject: str, body: str):
     """Fallback: Log email to file for dev/testing"""
@@ -63,6 +89,6 @@ def _log_email_to_file(recipients: list, subject: str, body: str):
             f.write(f"SUBJECT: {subject}\n")
             f.write(f"BODY:\n{body}\n")
             f.write(f"{'='*50}\n")
-        logger.info("Email written to emails.log (SendGrid not configured)")
+        logger.info("Email written to emails.log")
     except Exception as e:
         logger.error(f"Failed to log email: {e}")
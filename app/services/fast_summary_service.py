@@ -0,0 +1,142 @@
+"""
+Rule-based fast path for voicemail summaries.
+
+Short, simple transcripts ("iPhone 13 screen, call me back") are summarized
+locally from the tenant's repair_scope vocabulary instead of calling GPT:
+    repair_devices               device names (iPhone, Galaxy, iPad)
+    iphone_galaxy_main_repairs   issue keywords
+    ipad_main_repairs            issue keywords
+The matcher is compiled once per loaded config (like voice_service.precompile).
+summarize() returns None whenever it is not confident; the caller then uses the LLM.
+"""
+from app.core.config import settings
+from collections import Counter
+import re
+import weakref
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Extra issue phrasings mapped onto scope keywords (only used if the keyword is in scope)
+ISSUE_SYNONYMS = {
+    "screen": ["display", "broken glass", "front glass", "cracked screen"],
+    "battery": ["battery drain", "drains fast", "won't hold charge", "wont hold charge", "battery life"],
+    "back glass": ["back cover", "rear glass", "back is cracked"],
+    "lcd screen": ["lcd"],
+    "digitizer": ["touch screen", "touchscreen", "touch not working"],
+}
+
+# Tokens that can follow a device name as part of its model ("iPhone 13 Pro Max", "Galaxy S22 Ultra")
+MODEL_WORDS = r"(?:pro|max|plus|mini|ultra|air|fe|se|xr|xs|x|note|tab|tablet|lite|edge|\+|\d{1,4}[a-z]{0,2}|[a-z]\d{1,3}[a-z+]?)"
+
+NUMBER_WORDS = {
+    "one": "1", "two": "2", "three": "3", "four": "4", "five": "5", "six": "6", "seven": "7",
+    "eight": "8", "nine": "9", "ten": "10", "eleven": "11", "twelve": "12", "thirteen": "13",
+    "fourteen": "14", "fifteen": "15", "sixteen": "16", "seventeen": "17", "eighteen": "18",
+    "nineteen": "19", "twenty": "20",
+}
+_NUMBER_RE = re.compile(r"\b(" + "|".join(NUMBER_WORDS) + r")\b")
+
+CALLBACK_RE = re.compile(
+    r"\b(call (?:me )?back|ring (?:me )?back|call me|ring me|give (?:me|us) a call|"
+    r"contact me|get back to me|text me|message me)\b"
+)
+PHONE_RE = re.compile(r"(?:\+?\d[\d ]{7,14}\d)")
+
+# Signals the caller wants more than a quote/callback: leave it to the LLM
+AMBIGUOUS_RE = re.compile(r"\b(but|however|complain\w*|refund|warranty|already|again|last time|manager)\b|\?")
+
+# Compiled matchers per loaded config: config -> matcher (dropped with the config,
+# not size-bounded so tenants don't evict each other)
+_compiled = weakref.WeakKeyDictionary()
+_stats = Counter()
+
+def summarize(transcript: str, config) -> str:
+    """Structured summary without a network call, or None if not confident"""
+    if not settings.FAST_SUMMARY_ENABLED or not transcript or config is None:
+        return None
+
+    text = _normalize(transcript)
+    if len(text.split()) > settings.FAST_SUMMARY_MAX_WORDS or AMBIGUOUS_RE.search(text):
+        _stats["llm_long_or_ambiguous"] += 1
+        return None
+
+    matcher = _get_matcher(config)
+    devices = _unique(m for m in (_match_device(d, text) for d in matcher["devices"]) if m)
+    issues = _unique(label for label, pattern in matcher["issues"] if pattern.search(text))
+    # "lcd screen" already covers "screen"
+    issues = [i for i in issues if not any(i != other and i in other for other in issues)]
+
+    # Confident only for exactly one device and at least one in-scope issue
+    if len(devices) != 1 or not issues:
+        _stats["llm_no_match"] += 1
+        return None
+
+    caller_requests = []
+    if CALLBACK_RE.search(text):
+        caller_requests.append("Call back")
+    phone = PHONE_RE.search(transcript)
+    if phone:
+        caller_requests.append(f"Contact number: {phone.group(0).strip()}")
+
+    _stats["fast"] += 1
+    return "\n".join([
+        f"Device: {devices[0]}",
+        f"Issue: {', '.join(issues)}",
+        f"Requests: {'; '.join(caller_requests) if caller_requests else 'None stated'}",
+        "(Auto-summary from keywords)"
+    ])
+
+def get_stats() -> dict:
+    return dict(_stats)
+
+def _get_matcher(config) -> dict:
+    try:
+        matcher = _compiled.get(config)
+    except TypeError:  # plain dict config (not weak-referenceable): compiled per call
+        return _compile(config.get("repair_scope", {}))
+    if matcher is None:
+        matcher = _compiled[config] = _compile(config.get("repair_scope", {}))
+    return matcher
+
+def _compile(repair_scope: dict) -> dict:
+    devices = []
+    for name in _split(repair_scope.get("repair_devices")):
+        pattern = re.compile(r"\b" + re.escape(name.lower()) + r"((?:\s+" + MODEL_WORDS + r"){0,3})\b")
+        devices.append((name, pattern))
+
+    issues = []
+    keywords = _split(repair_scope.get("iphone_galaxy_main_repairs")) + _split(repair_scope.get("ipad_main_repairs"))
+    for keyword in _unique(k.lower() for k in keywords):
+        phrases = [keyword] + ISSUE_SYNONYMS.get(keyword, [])
+        pattern = re.compile(r"\b(" + "|".join(re.escape(p) for p in phrases) + r")\b")
+        issues.append((keyword, pattern))
+
+    # Longest keyword first so "lcd screen" is reported before "screen"
+    issues.sort(key=lambda item: -len(item[0]))
+    return {"devices": devices, "issues": issues}
+
+def _match_device(device, text: str):
+    name, pattern = device
+    match = pattern.search(text)
+    if not match:
+        return None
+    tokens = match.group(1).split()
+    model = " ".join(t.upper() if any(c.isdigit() for c in t) or t in ("se", "xr", "xs", "x", "fe") else t.title()
+                     for t in tokens)
+    return f"{name} {model}" if model else name
+
+def _normalize(transcript: str) -> str:
+    text = transcript.lower().replace("’", "'")
+    text = _NUMBER_RE.sub(lambda m: NUMBER_WORDS[m.group(1)], text)
+    return re.sub(r"[^\w\s+?']", " ", text)
+
+def _split(value) -> list:
+    return [v.strip() for v in str(value or "").split(",") if v.strip()]
+
+def _unique(items) -> list:
+    seen = []
+    for item in items:
+        if item not in seen:
+            seen.append(item)
+    return seen
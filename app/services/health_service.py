@@ -0,0 +1,74 @@
+"""
+Liveness vs readiness.
+/health is a cheap liveness probe (process is up and the loop answers).
+/ready additionally requires warm tenant configs, precompiled TwiML and a
+responsive event loop, so deploys/restarts never route callers to a cold instance,
+and turns 503 again once the instance starts draining for shutdown.
+
+Platforms also restart or deroute on failed checks (Render's healthCheckPath), so
+one slow call must not fail readiness: the loop only counts as unresponsive after
+READY_LAG_BAD_SAMPLES consecutive samples over READY_MAX_LOOP_LAG_MS.
+"""
+from app.services import sheet_service, voice_service, lifecycle_service
+from app.core.config import settings
+from collections import deque
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+LAG_SAMPLE_INTERVAL = 0.5  # seconds
+
+# Recent event loop lag samples in ms (last ~5 seconds)
+_lag_samples = deque(maxlen=10)
+
+async def run_loop_lag_monitor():
+    """Background task: measure how late the event loop wakes us up"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + LAG_SAMPLE_INTERVAL
+        await asyncio.sleep(LAG_SAMPLE_INTERVAL)
+        lag_ms = max(0.0, (loop.time() - expected) * 1000)
+        _lag_samples.append(lag_ms)
+        if lag_ms > settings.READY_MAX_LOOP_LAG_MS:
+            logger.warning(f"Event loop lag {lag_ms:.0f}ms")
+
+def loop_lag_ms():
+    """Worst recent event loop lag in ms (None before the first sample)"""
+    return max(_lag_samples) if _lag_samples else None
+
+def lag_bad_streak() -> int:
+    """Consecutive most recent samples over READY_MAX_LOOP_LAG_MS"""
+    streak = 0
+    for lag_ms in reversed(_lag_samples):
+        if lag_ms <= settings.READY_MAX_LOOP_LAG_MS:
+            break
+        streak += 1
+    return streak
+
+def readiness(app) -> dict:
+    """Evaluate readiness checks. Returns {"ready": bool, "checks": {...}}"""
+    preloaded = bool(getattr(app.state, "preloaded", False))
+    
+    cold_tenants = []
+    for tenant_id in sheet_service.TENANT_MAP.keys():
+        config = sheet_service.get_loaded_config(tenant_id)
+        if config is None or not voice_service.is_precompiled(config):
+            cold_tenants.append(tenant_id)
+    
+    lag = loop_lag_ms()
+    # No sample yet (first half second) counts as responsive: preload already finished
+    bad_streak = lag_bad_streak()
+    lag_ok = bad_streak < max(1, settings.READY_LAG_BAD_SAMPLES)
+    
+    return {
+        "ready": preloaded and not cold_tenants and lag_ok and not lifecycle_service.draining,
+        "checks": {
+            "preloaded": preloaded,
+            "draining": lifecycle_service.draining,
+            "cold_tenants": cold_tenants,
+            "loop_lag_ms": round(lag, 1) if lag is not None else None,
+            "loop_lag_max_ms": settings.READY_MAX_LOOP_LAG_MS,
+            "loop_lag_bad_samples": bad_streak
+        }
+    }
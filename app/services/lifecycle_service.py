@@ -0,0 +1,70 @@
+"""
+Graceful shutdown / restart.
+
+SIGTERM or SIGHUP starts a drain:
+    1. draining is set: /ready answers 503, so a load balancer health check
+       stops routing new traffic here
+    2. after SHUTDOWN_DRAIN_DELAY seconds uvicorn is asked to exit (SIGINT):
+       it stops accepting connections and lets in-flight webhooks finish
+       (uvicorn --timeout-graceful-shutdown)
+    3. the lifespan shutdown gives running recordings SHUTDOWN_TIMEOUT seconds,
+       checkpoints the rest of the pipeline for the next process
+       (pipeline_service.stop) and delivers queued emails
+A second SIGTERM/SIGHUP exits at once (uvicorn force exit, nothing is checkpointed).
+
+With scripts/serve.py the replacement process shares the listening socket and
+is started (and warm) before this one is told to drain, so restarts refuse no
+connections. The supervisor learns that a worker is ready through the pipe
+passed in BLUEFONE_READY_FD.
+"""
+from app.core.config import settings
+import asyncio
+import os
+import signal
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+draining = False
+_drain_started = None
+
+def install_signal_handlers():
+    """Take over SIGTERM/SIGHUP on the running loop (no-op outside the main thread)"""
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGHUP):
+        try:
+            loop.add_signal_handler(sig, begin_drain, sig)
+        except (NotImplementedError, RuntimeError, ValueError):
+            return False  # Windows, or the app runs in a worker thread (tests)
+    return True
+
+def begin_drain(sig=None):
+    global draining, _drain_started
+    if draining:
+        logger.warning("Second shutdown signal, exiting without further grace")
+        os.kill(os.getpid(), signal.SIGINT)
+        return
+    draining = True
+    _drain_started = time.time()
+    name = signal.Signals(sig).name if sig else "request"
+    logger.info(f"{name}: draining, /ready now 503, stopping in {settings.SHUTDOWN_DRAIN_DELAY}s")
+    asyncio.get_running_loop().call_later(settings.SHUTDOWN_DRAIN_DELAY, os.kill, os.getpid(), signal.SIGINT)
+
+def notify_ready():
+    """Tell the supervisor (scripts/serve.py) this worker is warm"""
+    fd = os.environ.pop("BLUEFONE_READY_FD", None)
+    if not fd:
+        return
+    try:
+        os.write(int(fd), b"ready\n")
+        os.close(int(fd))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not notify supervisor: {e}")
+
+def get_stats() -> dict:
+    return {
+        "draining": draining,
+        "draining_seconds": round(time.time() - _drain_started, 1) if _drain_started else None,
+        "pid": os.getpid()
+    }
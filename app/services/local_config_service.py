@@ -0,0 +1,160 @@
+"""
+File-based tenant config source.
+
+Tenants whose TENANT_MAP entry is "local:<directory>" are configured from files
+instead of Google Sheets. The directory holds one of (first match wins):
+    config.toml     [settings] / [prompts] / [repair_scope] tables, [[schedule]] rows
+    config.json     {"settings": {...}, "schedule": [...], "prompts": {...}, "repair_scope": {...}}
+    *.csv           settings.csv, schedule.csv, prompts.csv, repair_scope.csv
+                    (same columns as sheet_templates/)
+
+Each directory is parsed once into a TenantConfig. A watch loop polls file
+mtimes/sizes every LOCAL_CONFIG_POLL_INTERVAL seconds and, on change, parses the
+new version, precompiles its TwiML and swaps it in with a single assignment, so
+requests see either the old or the new config, never a partial one. A broken
+edit keeps the previous config. No network and no TTL: edits apply on the next
+poll. Without the watch loop (scripts), load() checks the files on each call.
+"""
+from app.core.config import settings
+from app.core.tenant_config import TenantConfig, from_rows
+import asyncio
+import csv
+import json
+import os
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "local:"
+CSV_SHEETS = ("settings", "schedule", "prompts", "repair_scope")
+WATCHED_FILES = ("config.toml", "config.json") + tuple(f"{name}.csv" for name in CSV_SHEETS)
+
+# directory -> (signature, TenantConfig)
+_loaded = {}
+_lock = threading.Lock()  # serializes parsing; readers never take it
+_watching = False
+_reloads = 0
+
+def is_local(source) -> bool:
+    return isinstance(source, str) and source.startswith(PREFIX)
+
+def directory_of(source: str) -> str:
+    return source[len(PREFIX):]
+
+def load(directory: str) -> TenantConfig:
+    """Current config for a directory (parsed on first use)"""
+    entry = _loaded.get(directory)
+    if entry is not None and (_watching or entry[0] == signature(directory)):
+        return entry[1]
+    with _lock:
+        return _reload(directory)
+
+def loaded(directory: str):
+    """Parsed config without touching the filesystem (None if never loaded)"""
+    entry = _loaded.get(directory)
+    return entry[1] if entry else None
+
+def invalidate(directory: str) -> bool:
+    return _loaded.pop(directory, None) is not None
+
+def signature(directory: str) -> str:
+    """Cheap change marker: mtime/size of the config files present"""
+    parts = []
+    for name in WATCHED_FILES:
+        try:
+            st = os.stat(os.path.join(directory, name))
+            parts.append(f"{name}:{st.st_mtime_ns}:{st.st_size}")
+        except OSError:
+            pass
+    return "|".join(parts)
+
+def check_all() -> list:
+    """Reload every loaded directory whose files changed. Returns reloaded directories."""
+    from app.services import voice_service
+    changed = []
+    for directory, (old_signature, _) in list(_loaded.items()):
+        if signature(directory) == old_signature:
+            continue
+        with _lock:
+            config = _reload(directory)
+        voice_service.precompile(config)
+        changed.append(directory)
+    return changed
+
+async def run_watch_loop():
+    """Background task: poll local config directories and swap in edits"""
+    global _watching
+    _watching = True
+    try:
+        while True:
+            await asyncio.sleep(settings.LOCAL_CONFIG_POLL_INTERVAL)
+            if _loaded:
+                try:
+                    await asyncio.to_thread(check_all)
+                except Exception as e:
+                    logger.error(f"Local config watch error: {e}")
+    finally:
+        _watching = False
+
+def get_stats() -> dict:
+    return {
+        "directories": {d: s for d, (s, _) in _loaded.items()},
+        "watching": _watching,
+        "reloads": _reloads
+    }
+
+def _reload(directory: str) -> TenantConfig:
+    """Parse and swap in a directory's config (caller holds _lock)"""
+    global _reloads
+    current = _loaded.get(directory)
+    sig = signature(directory)
+    if current is not None and current[0] == sig:
+        return current[1]
+    try:
+        config = _parse(directory)
+    except Exception as e:
+        if current is None:
+            raise
+        logger.error(f"Invalid config in {directory}, keeping previous version: {e}")
+        # Remember the broken signature so it isn't re-parsed on every poll
+        _loaded[directory] = (sig, current[1])
+        return current[1]
+    _loaded[directory] = (sig, config)
+    if current is not None:
+        _reloads += 1
+        logger.info(f"Reloaded local config from {directory}")
+    return config
+
+def _parse(directory: str) -> TenantConfig:
+    toml_path = os.path.join(directory, "config.toml")
+    json_path = os.path.join(directory, "config.json")
+    if os.path.exists(toml_path):
+        try:
+            import tomllib
+        except ImportError:  # Python 3.10
+            raise RuntimeError("config.toml needs Python 3.11+, use config.json or CSV files")
+        with open(toml_path, "rb") as f:
+            return _from_document(tomllib.load(f))
+    if os.path.exists(json_path):
+        with open(json_path, "r", encoding="utf-8") as f:
+            return _from_document(json.load(f))
+
+    def read_csv(name):
+        path = os.path.join(directory, f"{name}.csv")
+        if not os.path.exists(path):
+            return []
+        with open(path, "r", encoding="utf-8") as f:
+            return list(csv.DictReader(f))
+
+    if not any(os.path.exists(os.path.join(directory, f"{name}.csv")) for name in CSV_SHEETS):
+        raise FileNotFoundError(f"No config.toml, config.json or CSV files in {directory}")
+    return from_rows(read_csv("settings"), read_csv("schedule"), read_csv("prompts"), read_csv("repair_scope"))
+
+def _from_document(doc: dict) -> TenantConfig:
+    return TenantConfig(
+        doc.get("settings", {}),
+        doc.get("schedule", []),
+        doc.get("prompts", {}),
+        doc.get("repair_scope", {})
+    )
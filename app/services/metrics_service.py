@@ -0,0 +1,66 @@
+"""
+In-process call counters per tenant, route and outcome.
+
+Each (tenant, route, outcome) key owns two fixed-size rings:
+    fine     90 x 10s slots   -> last 1 minute (6 slots) and 15 minutes (90 slots)
+    coarse   96 x 15min slots -> last 24 hours
+A slot remembers which interval it belongs to and is reset lazily when reused,
+so increment() is O(1) and memory per key is constant.
+Windows are slot-aligned (e.g. "1m" covers the last 50-60 seconds).
+"""
+from array import array
+import time
+
+FINE_SLOT = 10
+FINE_SLOTS = 90
+COARSE_SLOT = 900
+COARSE_SLOTS = 96
+
+# Window name -> (ring, number of most recent slots)
+WINDOWS = {"1m": ("fine", 6), "15m": ("fine", 90), "24h": ("coarse", 96)}
+
+class Ring:
+    """Fixed number of time slots, each holding a count for one interval"""
+    __slots__ = ("width", "counts", "epochs")
+
+    def __init__(self, width: int, size: int):
+        self.width = width
+        self.counts = array("l", [0] * size)
+        self.epochs = array("q", [-1] * size)
+
+    def add(self, now: float, n: int = 1):
+        epoch = int(now // self.width)
+        slot = epoch % len(self.counts)
+        if self.epochs[slot] != epoch:
+            self.epochs[slot] = epoch
+            self.counts[slot] = 0
+        self.counts[slot] += n
+
+    def total(self, now: float, slots: int) -> int:
+        oldest = int(now // self.width) - slots
+        return sum(c for c, e in zip(self.counts, self.epochs) if e > oldest)
+
+# (tenant_id, route, outcome) -> {"fine": Ring, "coarse": Ring}
+_counters = {}
+
+def increment(tenant_id: str, route: str, outcome: str, now: float = None):
+    now = time.time() if now is None else now
+    rings = _counters.get((tenant_id, route, outcome))
+    if rings is None:
+        rings = _counters[(tenant_id, route, outcome)] = {
+            "fine": Ring(FINE_SLOT, FINE_SLOTS),
+            "coarse": Ring(COARSE_SLOT, COARSE_SLOTS)
+        }
+    rings["fine"].add(now)
+    rings["coarse"].add(now)
+
+def snapshot(now: float = None) -> dict:
+    """{tenant: {route: {outcome: {"1m", "15m", "24h"}}}}, keys idle for 24h omitted"""
+    now = time.time() if now is None else now
+    result = {}
+    for (tenant_id, route, outcome), rings in list(_counters.items()):
+        counts = {name: rings[ring].total(now, slots) for name, (ring, slots) in WINDOWS.items()}
+        if not counts["24h"]:
+            continue
+        result.setdefault(tenant_id, {}).setdefault(route, {})[outcome] = counts
+    return result
@@ -0,0 +1,368 @@
+"""
+Durable outbound email outbox.
+
+email_service.send_report appends the message here and returns immediately.
+run_sender_loop (started with the app) delivers due entries with bounded
+concurrency, exponential backoff, and a global pause when SendGrid rate-limits.
+
+Storage is an append-only log per process, DATA_DIR/outbox/outbox-<pid>-<token>.log,
+one JSON record per line:
+    {"op": "add",  "id": ..., "recipients": [...], "subject": ..., "body": ..., "created_at": ..., "trace": ...}
+    {"op": "fail", "id": ..., "attempts": n, "next_at": ..., "error": ...}
+    {"op": "done", "id": ...}
+    {"op": "dead", "id": ..., "error": ...}
+An entry is only marked done after SendGrid accepted it, so delivery is at-least-once.
+
+The owning process holds an exclusive flock on its log. During a reload
+(scripts/serve.py) the old and new workers run side by side on the same
+DATA_DIR, so neither may read or rewrite the other's log. When a process exits
+(drained or crashed) its lock is released. The other processes check for such
+logs at startup and every ADOPT_INTERVAL seconds. A log is claimed with an
+atomic rename, and its pending entries are replayed into the claimer's own log.
+Compaction writes a new log and deletes the old one. It never replaces a file
+in place, so a log can only be locked by someone else after its owner is gone.
+"""
+from app.core.config import settings
+from app.services import trace_service
+import asyncio
+import json
+import os
+import random
+import secrets
+import threading
+import time
+import uuid
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: no liveness check, other logs are adopted at startup only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_DIR = os.path.join(settings.DATA_DIR, "outbox")
+LEGACY_LOG = "outbox.log"  # single shared log of earlier versions, adopted like any other
+
+# Seconds between checks for logs left behind by exited processes
+ADOPT_INTERVAL = 5.0
+
+# Status codes that will never succeed on retry (bad payload)
+PERMANENT_STATUS = {400, 413}
+
+# Rewrite the log once it holds this many records more than the pending set needs
+COMPACT_THRESHOLD = 1000
+
+_lock = threading.Lock()
+_pending = {}       # id -> entry dict (recipients, subject, body, attempts, next_at, ...)
+_in_flight = set()
+_loaded = False
+_log = None         # this process's log file (open, flock held)
+_log_path = None
+_log_records = 0
+_paused_until = 0.0  # global SendGrid rate-limit pause (epoch seconds)
+_stats = {"enqueued": 0, "sent": 0, "retried": 0, "dead": 0, "rate_limited": 0, "adopted": 0}
+
+# Sender loop wakeup (set from any thread via call_soon_threadsafe)
+_loop = None
+_wakeup = None
+
+def enqueue(recipients: list, subject: str, body: str) -> str:
+    """Durably queue an email for delivery. Returns the outbox entry id."""
+    entry = {
+        "id": uuid.uuid4().hex,
+        "recipients": list(recipients),
+        "subject": subject,
+        "body": body,
+        "created_at": time.time(),
+        "attempts": 0,
+        "next_at": 0.0,
+        "trace": trace_service.current_context()  # continues the call's trace in the sender
+    }
+    with _lock:
+        _ensure_loaded()
+        _append({"op": "add", **entry}, sync=True)
+        _pending[entry["id"]] = entry
+        _stats["enqueued"] += 1
+    _wake()
+    logger.info(f"Queued email {entry['id']} to {recipients}")
+    return entry["id"]
+
+async def run_sender_loop():
+    """Background task: deliver due outbox entries"""
+    global _loop, _wakeup
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    semaphore = asyncio.Semaphore(max(1, settings.OUTBOX_CONCURRENCY))
+
+    with _lock:
+        _ensure_loaded()
+        logger.info(f"Outbox sender started ({len(_pending)} pending)")
+    adopt_checked = time.monotonic()
+
+    while True:
+        # One bad entry (or a disk error) must not kill the sender task
+        try:
+            if fcntl is not None and time.monotonic() - adopt_checked >= ADOPT_INTERVAL:
+                adopt_checked = time.monotonic()
+                await asyncio.to_thread(adopt_logs)
+
+            for entry in _take_due():
+                await semaphore.acquire()
+                task = asyncio.create_task(_deliver(entry))
+                task.add_done_callback(lambda _: semaphore.release())
+        except Exception as e:
+            logger.error(f"Outbox sender error: {e}")
+
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=1.0)
+        except asyncio.TimeoutError:
+            pass
+
+def drain(timeout: float = 60.0) -> int:
+    """
+    Synchronously deliver everything currently due (for scripts/CLI without the
+    sender loop). Returns number of entries still pending.
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        due = _take_due()
+        if not due:
+            break
+        for entry in due:
+            _finish(entry, _send(entry))
+    with _lock:
+        return len(_pending)
+
+def adopt_logs() -> int:
+    """Take over the pending entries of processes that exited. Returns entries adopted."""
+    with _lock:
+        _ensure_loaded()
+        return _adopt_logs()
+
+def get_stats() -> dict:
+    with _lock:
+        _ensure_loaded()
+        now = time.time()
+        oldest = min((e["created_at"] for e in _pending.values()), default=None)
+        return {
+            "pending": len(_pending),
+            "in_flight": len(_in_flight),
+            "oldest_pending_seconds": int(now - oldest) if oldest else None,
+            "paused_for_seconds": max(0, int(_paused_until - now)),
+            "log": os.path.basename(_log_path) if _log_path else None,
+            **_stats
+        }
+
+async def _deliver(entry: dict):
+    try:
+        result = await asyncio.to_thread(_send, entry)
+        _finish(entry, result)
+    except Exception as e:
+        # Not recorded: stays pending and is picked up again by the next pass
+        logger.error(f"Email {entry['id']} delivery error: {e}")
+        with _lock:
+            _in_flight.discard(entry["id"])
+
+def _send(entry: dict) -> dict:
+    from app.services import email_service
+    trace = entry.get("trace")
+    if trace and not entry["attempts"]:
+        trace_service.record_span("outbox.queued", entry["created_at"], time.time(), parent=trace)
+    with trace_service.span("email.send", parent=trace, attempt=entry["attempts"] + 1) as attrs:
+        try:
+            result = email_service.deliver_email(entry["recipients"], entry["subject"], entry["body"])
+        except Exception as e:
+            result = {"ok": False, "status": None, "retry_after": None, "error": str(e)}
+        attrs.update(ok=result["ok"], status=result["status"])
+        return result
+
+def _take_due() -> list:
+    """Claim entries whose next_at has passed (and we are not rate-limit paused)"""
+    now = time.time()
+    with _lock:
+        _ensure_loaded()
+        if now < _paused_until:
+            return []
+        due = [e for e in _pending.values() if e["id"] not in _in_flight and e["next_at"] <= now]
+        due.sort(key=lambda e: e["created_at"])
+        for e in due:
+            _in_flight.add(e["id"])
+        return due
+
+def _finish(entry: dict, result: dict):
+    global _paused_until
+    entry_id = entry["id"]
+    with _lock:
+        _in_flight.discard(entry_id)
+
+        if result["ok"]:
+            _append({"op": "done", "id": entry_id})
+            _pending.pop(entry_id, None)
+            _stats["sent"] += 1
+            _maybe_compact()
+            return
+
+        status = result.get("status")
+        error = result.get("error") or f"status {status}"
+        entry["attempts"] += 1
+
+        if status in PERMANENT_STATUS or entry["attempts"] >= settings.OUTBOX_MAX_ATTEMPTS:
+            _append({"op": "dead", "id": entry_id, "error": error}, sync=True)
+            _pending.pop(entry_id, None)
+            _stats["dead"] += 1
+            logger.error(f"Email {entry_id} dead-lettered after {entry['attempts']} attempts: {error}")
+            _dead_letter(entry, error)
+            return
+
+        now = time.time()
+        if status == 429:
+            # Pause all sends, SendGrid limits are per API key
+            delay = result.get("retry_after") or _backoff(entry["attempts"])
+            _paused_until = max(_paused_until, now + delay)
+            _stats["rate_limited"] += 1
+        else:
+            delay = _backoff(entry["attempts"])
+
+        entry["next_at"] = now + delay
+        _append({"op": "fail", "id": entry_id, "attempts": entry["attempts"],
+                 "next_at": entry["next_at"], "error": error}, sync=True)
+        _stats["retried"] += 1
+        logger.warning(f"Email {entry_id} attempt {entry['attempts']} failed ({error}), retry in {delay:.0f}s")
+
+def _backoff(attempts: int) -> float:
+    delay = min(settings.OUTBOX_BACKOFF_BASE * (2 ** (attempts - 1)), settings.OUTBOX_BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+def _dead_letter(entry: dict, error: str):
+    """Keep the content visible in emails.log (previous fallback behaviour)"""
+    from app.services import email_service
+    email_service._log_email_to_file(
+        entry["recipients"], f"[UNDELIVERED: {error}] {entry['subject']}", entry["body"]
+    )
+
+def _wake():
+    if _loop is not None and _wakeup is not None:
+        try:
+            _loop.call_soon_threadsafe(_wakeup.set)
+        except RuntimeError:
+            pass  # Loop closed (shutdown)
+
+def _ensure_loaded():
+    """Open this process's log and adopt abandoned ones (caller holds _lock)"""
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    _open_log()
+    adopted = _adopt_logs()
+    if adopted:
+        logger.info(f"Outbox recovered {adopted} pending emails")
+
+def _open_log():
+    """Start a new, already locked log for this process (caller holds _lock)"""
+    global _log, _log_path, _log_records
+    os.makedirs(OUTBOX_DIR, exist_ok=True)
+    name = f"outbox-{os.getpid()}-{secrets.token_hex(4)}.log"
+    # Locked under a hidden name first, so nobody sees it unlocked
+    tmp = os.path.join(OUTBOX_DIR, f".{name}.tmp")
+    log = open(tmp, "a", encoding="utf-8")
+    if fcntl is not None:
+        fcntl.flock(log, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    path = os.path.join(OUTBOX_DIR, name)
+    os.rename(tmp, path)
+    _log, _log_path, _log_records = log, path, 0
+
+def _adopt_logs() -> int:
+    """Claim logs whose owner exited and requeue their pending entries here (caller holds _lock)"""
+    adopted = 0
+    for name in sorted(os.listdir(OUTBOX_DIR)):
+        path = os.path.join(OUTBOX_DIR, name)
+        if path == _log_path or name.startswith("."):
+            continue
+        if not (name == LEGACY_LOG or name.startswith("outbox-")) or not name.endswith((".log", ".claimed")):
+            continue
+        f = _lock_abandoned(path)
+        if f is None:
+            continue
+        try:
+            # The atomic rename decides between processes that both got the lock in turn
+            claimed = path if name.endswith(".claimed") else f"{path}.{os.getpid()}.claimed"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue
+            entries = _replay(f)
+            for entry in entries.values():
+                if entry["id"] not in _pending:
+                    _append({"op": "add", **entry})
+                    _pending[entry["id"]] = entry
+                    adopted += 1
+            _log.flush()
+            os.fsync(_log.fileno())
+            os.remove(claimed)
+        finally:
+            f.close()
+    _stats["adopted"] += adopted
+    if adopted:
+        _wake()
+    return adopted
+
+def _lock_abandoned(path: str):
+    """Open a log and lock it if its owner is gone (else None)"""
+    try:
+        f = open(path, "r", encoding="utf-8")
+    except FileNotFoundError:
+        return None
+    if fcntl is not None:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return None  # owner still running
+    return f
+
+def _replay(f) -> dict:
+    """Pending entries of a log: id -> entry"""
+    pending = {}
+    for line in f:
+        if not line.strip():
+            continue
+        try:
+            rec = json.loads(line)
+        except json.JSONDecodeError:
+            logger.error("Skipping corrupt outbox record")
+            continue
+        op = rec.pop("op", None)
+        if op == "add":
+            pending[rec["id"]] = rec
+        elif op == "fail" and rec["id"] in pending:
+            pending[rec["id"]].update(attempts=rec["attempts"], next_at=rec["next_at"])
+        elif op in ("done", "dead"):
+            pending.pop(rec["id"], None)
+    return pending
+
+def _append(record: dict, sync: bool = False):
+    """Append one record to this process's log (caller holds _lock)"""
+    global _log_records
+    _log.write(json.dumps(record) + "\n")
+    _log.flush()
+    if sync:
+        os.fsync(_log.fileno())
+    _log_records += 1
+
+def _maybe_compact():
+    """Move pending entries to a fresh log and delete the old one (caller holds _lock)"""
+    if _log_records - len(_pending) < COMPACT_THRESHOLD:
+        return
+    old_log, old_path = _log, _log_path
+    _open_log()
+    for entry in _pending.values():
+        _append({"op": "add", **entry})
+    _log.flush()
+    os.fsync(_log.fileno())
+    # Delete before unlocking: a released lock must only ever mean "owner gone"
+    os.remove(old_path)
+    old_log.close()
+    logger.info(f"Outbox log compacted ({_log_records} pending)")
@@ -0,0 +1,347 @@
+"""
+Admission control for the recording pipeline.
+
+/voice/recording-status submits jobs here instead of spawning an unbounded
+BackgroundTasks job per recording. Workers (started with the app) run
+processing_service.process_recording with:
+    - a global concurrency limit (PIPELINE_CONCURRENCY workers)
+    - a per-tenant concurrency limit (PIPELINE_TENANT_CONCURRENCY)
+    - a bounded backlog ordered by menu priority (MENU_PRIORITY), then arrival
+    - OpenAI token buckets (rate_limit_service) with retry on 429
+
+Degraded mode: when the backlog is deeper than PIPELINE_DEGRADE_DEPTH, or OpenAI
+is rate limiting, the recording link is emailed immediately and the transcript
+follows in a second email. When the backlog is full, the lowest priority job is
+shed: it gets the link-only email and is never transcribed.
+
+Shutdown (stop): workers take no new jobs, running ones get a deadline, and
+everything unfinished is written to DATA_DIR/pipeline/handoff-*.jsonl. Jobs cut
+short by the deadline are written last: their OpenAI call keeps running in a
+thread, so stop waits for it first. Its result then sits in the result cache,
+and the next process only re-sends the email instead of paying for the call again. Every
+running process adopts handoff files (start, then every PIPELINE_HANDOFF_POLL
+seconds), so a replacement that started before the old process exited picks
+the jobs up. Each file is claimed by exactly one process (atomic rename).
+"""
+from app.services import processing_service, ai_service, rate_limit_service, trace_service
+from app.core.config import settings
+from collections import Counter
+import asyncio
+import itertools
+import json
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Lower value = processed first. Unlisted menus (invalid, unknown, ...) get DEFAULT_PRIORITY.
+MENU_PRIORITY = {"repair": 0, "off": 1, "accessory": 2}
+DEFAULT_PRIORITY = 3
+FOLLOWUP_PENALTY = 10  # transcript follow-ups yield to first-time jobs
+
+HANDOFF_DIR = os.path.join(settings.DATA_DIR, "pipeline")
+
+_backlog = []           # list of job dicts (small, bounded by PIPELINE_MAX_BACKLOG)
+_running = Counter()    # tenant_id -> jobs in progress
+_active = {}            # seq -> job being processed
+_delayed = {}           # task -> job waiting out a rate-limit retry delay
+_seq = itertools.count()
+_cond = None            # asyncio.Condition, created by start()
+_workers = []
+_poller = None
+_stopping = False
+_link_tasks = set()     # in-flight link-only emails (keep references)
+_stats = Counter()
+
+def start():
+    """Start worker tasks on the running loop (called from the app lifespan)"""
+    global _cond, _poller, _stopping
+    _cond = asyncio.Condition()
+    _stopping = False
+    adopt_handoffs()
+    _workers.clear()
+    for i in range(max(1, settings.PIPELINE_CONCURRENCY)):
+        _workers.append(asyncio.create_task(_worker(i)))
+    _poller = asyncio.create_task(_run_handoff_loop())
+    logger.info(f"Recording pipeline started ({len(_workers)} workers, {len(_backlog)} jobs handed over)")
+    return _workers + [_poller]
+
+async def stop(timeout: float) -> int:
+    """
+    Graceful shutdown: stop taking jobs, give running ones `timeout` seconds,
+    then checkpoint the rest (backlog, pending retries, jobs cut short) for the
+    next process. Returns the number of jobs checkpointed.
+    """
+    global _stopping
+    if _cond is None:
+        return 0
+    _stopping = True
+    if _poller:
+        _poller.cancel()
+    async with _cond:
+        _cond.notify_all()  # idle workers exit
+
+    workers = [w for w in _workers if not w.done()]
+    if workers:
+        _, unfinished = await asyncio.wait(workers, timeout=timeout)
+    else:
+        unfinished = set()
+    cut_short = [dict(job) for job in _active.values()]
+    delayed = list(_delayed.values())
+    cancelled = list(unfinished) + list(_delayed)
+    for task in cancelled:
+        task.cancel()
+    # Let cancelled workers run their cleanup (_active / _running bookkeeping)
+    await asyncio.gather(*cancelled, return_exceptions=True)
+    if _link_tasks:
+        await asyncio.wait(list(_link_tasks), timeout=5)
+
+    checkpointed = _write_handoff(_backlog + delayed)
+    _backlog.clear()
+    if cut_short:
+        logger.warning(f"{len(cut_short)} recordings still running after {timeout}s, handing them over")
+        still_running = await processing_service.wait_for_ai_calls(timeout)
+        if still_running:
+            logger.warning(f"{still_running} OpenAI calls still running, the next process may repeat them")
+        checkpointed += _write_handoff(cut_short)
+    return checkpointed
+
+def adopt_handoffs() -> int:
+    """Queue jobs checkpointed by other (or previous) processes. Caller notifies workers."""
+    try:
+        names = sorted(n for n in os.listdir(HANDOFF_DIR) if n.startswith("handoff-") and n.endswith(".jsonl"))
+    except OSError:
+        return 0
+    adopted = 0
+    for name in names:
+        path = os.path.join(HANDOFF_DIR, name)
+        claimed = f"{path}.{os.getpid()}.claimed"
+        try:
+            os.rename(path, claimed)
+        except OSError:
+            continue  # another process claimed it
+        with open(claimed, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    _enqueue(json.loads(line))
+                    adopted += 1
+        os.remove(claimed)
+    if adopted:
+        _stats["adopted"] += adopted
+        logger.info(f"Adopted {adopted} recordings handed over by a previous process")
+    return adopted
+
+async def submit(
+    tenant_id: str,
+    recording_url: str,
+    from_number: str,
+    call_sid: str,
+    duration: str = "N/A",
+    menu_selection: str = "unknown",
+    recording_sid: str = None
+) -> str:
+    """
+    Admit a recording. Returns the admission decision:
+    queued | degraded (link now, transcript queued) | shed (link only)
+    """
+    job = {
+        "tenant_id": tenant_id,
+        "recording_url": recording_url,
+        "from_number": from_number,
+        "call_sid": call_sid,
+        "duration": duration,
+        "menu_selection": menu_selection,
+        "recording_sid": recording_sid,
+        "mode": "full",
+        "attempts": 0,
+        "submitted_at": time.time(),
+        "trace": trace_service.current_context()
+    }
+    _stats["submitted"] += 1
+
+    async with _cond:
+        if len(_backlog) >= settings.PIPELINE_MAX_BACKLOG:
+            victim = max(_backlog + [job], key=_sort_key)
+            _stats["shed"] += 1
+            logger.warning(f"Backlog full ({len(_backlog)}), shedding {victim['call_sid']}")
+            if victim is job:
+                _send_link_only(job, "Transcript not available (system busy).")
+                return "shed"
+            _backlog.remove(victim)
+            if victim["mode"] == "full":
+                _send_link_only(victim, "Transcript not available (system busy).")
+
+        decision = "queued"
+        if len(_backlog) >= settings.PIPELINE_DEGRADE_DEPTH or _openai_throttled():
+            _degrade(job)
+            decision = "degraded"
+
+        _enqueue(job)
+        _cond.notify()
+    return decision
+
+def is_running() -> bool:
+    return _cond is not None and any(not w.done() for w in _workers)
+
+def get_stats() -> dict:
+    depth_by_priority = Counter(_priority(job) for job in _backlog)
+    oldest = min((job["submitted_at"] for job in _backlog), default=None)
+    return {
+        "depth": len(_backlog),
+        "max_backlog": settings.PIPELINE_MAX_BACKLOG,
+        "depth_by_priority": dict(sorted(depth_by_priority.items())),
+        "oldest_wait_seconds": int(time.time() - oldest) if oldest else None,
+        "running": sum(_running.values()),
+        "running_by_tenant": dict(_running),
+        "workers": len(_workers),
+        "counters": dict(_stats),
+        "rate_limits": rate_limit_service.get_stats()
+    }
+
+def pending_jobs() -> list:
+    """Copy of queued jobs (for checkpointing)"""
+    return [dict(job) for job in _backlog]
+
+async def _worker(index: int):
+    while True:
+        async with _cond:
+            job = None if _stopping else _take_next()
+            while job is None:
+                if _stopping:
+                    return
+                await _cond.wait()
+                job = None if _stopping else _take_next()
+            _running[job["tenant_id"]] += 1
+            _active[job["seq"]] = job
+
+        try:
+            await _run(job)
+        finally:
+            async with _cond:
+                _active.pop(job["seq"], None)
+                _running[job["tenant_id"]] -= 1
+                if _running[job["tenant_id"]] <= 0:
+                    del _running[job["tenant_id"]]
+                # A tenant slot freed up: another worker may now be eligible
+                _cond.notify_all()
+
+async def _run(job: dict):
+    trace_service.record_span("pipeline.queued", job["queued_at"], time.time(), parent=job["trace"],
+                              call_sid=job["call_sid"], attempt=job["attempts"] + 1)
+    try:
+        with trace_service.span("pipeline.job", call_sid=job["call_sid"], parent=job["trace"], mode=job["mode"]):
+            await processing_service.process_recording(
+                tenant_id=job["tenant_id"],
+                recording_url=job["recording_url"],
+                from_number=job["from_number"],
+                call_sid=job["call_sid"],
+                duration=job["duration"],
+                menu_selection=job["menu_selection"],
+                recording_sid=job.get("recording_sid"),
+                mode=job["mode"]
+            )
+        _stats["completed"] += 1
+    except ai_service.RateLimited as e:
+        _stats["rate_limited"] += 1
+        job["attempts"] += 1
+        if job["attempts"] > settings.PIPELINE_MAX_RETRIES or _cond is None:
+            _stats["failed"] += 1
+            logger.error(f"Giving up on {job['call_sid']} after {job['attempts']} rate-limited attempts")
+            if job["mode"] == "full":
+                _send_link_only(job, "Transcript not available (transcription service busy).")
+            return
+        # Link goes out now, transcript when OpenAI recovers
+        if job["mode"] == "full":
+            _degrade(job)
+        if _stopping:
+            _enqueue(job)  # checkpointed by stop()
+            return
+        delay = e.retry_after or settings.OPENAI_RATE_LIMIT_BACKOFF * job["attempts"]
+        logger.warning(f"Rate limited on {job['call_sid']}, retry {job['attempts']} in {delay:.0f}s")
+        task = asyncio.create_task(_requeue_later(job, delay))
+        _delayed[task] = job
+        task.add_done_callback(lambda t: _delayed.pop(t, None))
+    except Exception as e:
+        _stats["failed"] += 1
+        logger.error(f"Pipeline job {job['call_sid']} failed: {e}")
+
+async def _requeue_later(job: dict, delay: float):
+    await asyncio.sleep(delay)
+    _stats["retried"] += 1
+    async with _cond:
+        _delayed.pop(asyncio.current_task(), None)
+        _enqueue(job)
+        _cond.notify()
+
+async def _run_handoff_loop():
+    """Background task: adopt jobs checkpointed by a process that drained after we started"""
+    while True:
+        await asyncio.sleep(settings.PIPELINE_HANDOFF_POLL)
+        if _stopping:
+            return
+        async with _cond:
+            if adopt_handoffs():
+                _cond.notify_all()
+
+def _write_handoff(jobs: list) -> int:
+    if not jobs:
+        return 0
+    os.makedirs(HANDOFF_DIR, exist_ok=True)
+    path = os.path.join(HANDOFF_DIR, f"handoff-{time.time():.3f}-{os.getpid()}.jsonl")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        for job in jobs:
+            f.write(json.dumps({k: v for k, v in job.items() if k not in ("seq", "queued_at")}) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+    _stats["checkpointed"] += len(jobs)
+    logger.info(f"Checkpointed {len(jobs)} recordings to {path}")
+    return len(jobs)
+
+def _degrade(job: dict):
+    """Email the recording link now and turn the job into a transcript follow-up"""
+    _stats["degraded"] += 1
+    _send_link_only(job, "Transcript will follow in a separate email (system busy).")
+    job["mode"] = "followup"
+
+def _send_link_only(job: dict, note: str):
+    task = asyncio.create_task(processing_service.process_recording(
+        tenant_id=job["tenant_id"],
+        recording_url=job["recording_url"],
+        from_number=job["from_number"],
+        call_sid=job["call_sid"],
+        duration=job["duration"],
+        menu_selection=job["menu_selection"],
+        mode="link_only",
+        note=note
+    ))
+    _link_tasks.add(task)
+    task.add_done_callback(_link_tasks.discard)
+
+def _enqueue(job: dict):
+    job["seq"] = next(_seq)
+    job["queued_at"] = time.time()
+    _backlog.append(job)
+
+def _take_next():
+    """Highest priority job whose tenant is under its concurrency limit (caller holds _cond)"""
+    eligible = [job for job in _backlog
+                if _running[job["tenant_id"]] < settings.PIPELINE_TENANT_CONCURRENCY]
+    if not eligible:
+        return None
+    job = min(eligible, key=_sort_key)
+    _backlog.remove(job)
+    return job
+
+def _priority(job: dict) -> int:
+    priority = MENU_PRIORITY.get(str(job["menu_selection"]).lower(), DEFAULT_PRIORITY)
+    return priority + (FOLLOWUP_PENALTY if job["mode"] == "followup" else 0)
+
+def _sort_key(job: dict):
+    return (_priority(job), job.get("seq", float("inf")))
+
+def _openai_throttled() -> bool:
+    """OpenAI is pushing back: new jobs would wait longer than the degrade threshold"""
+    bucket = rate_limit_service.buckets["transcription"]
+    return bucket.wait_time() > settings.PIPELINE_DEGRADE_WAIT
@@ -1,26 +1,44 @@
-from app.services import sheet_service, ai_service, email_service
+from app.services import sheet_service, ai_service, digest_service, rate_limit_service, fast_summary_service, profiler_service, trace_service
 from app.core.config import settings
 from datetime import datetime
+import asyncio
 import pytz
 import logging
 
 logger = logging.getLogger(__name__)
 
+_ai_calls = set()  # OpenAI calls running in worker threads
+
+@profiler_service.profiled("process_recording")
+@trace_service.traced("process_recording")
 async def process_recording(
     tenant_id: str, 
     recording_url: str, 
     from_number: str, 
     call_sid: str, 
     duration: str = "N/A",
-    menu_selection: str = "unknown"
+    menu_selection: str = "unknown",
+    recording_sid: str = None,
+    mode: str = "full",
+    note: str = None,
+    deliver: bool = True
 ):
     """
     Process a completed recording:
     1. Download and transcribe audio (OpenAI Whisper)
     2. Generate summary (GPT)
     3. Send email with recording link + transcript + summary
+    
+    mode (set by pipeline_service under load):
+        full       steps 1-3
+        link_only  skip AI, email the recording link now (note explains why)
+        followup   steps 1-3 for a call whose link_only email already went out
+        reprocess  steps 1-3 again for an old recording (scripts/reprocess.py)
+    With deliver=False step 3 is skipped. Returns {"subject", "transcript", "summary"}
+    (None if it should email but the tenant has no recipients).
+    Raises ai_service.RateLimited on OpenAI 429 so the pipeline can retry later.
     """
-    logger.info(f"Processing recording for {tenant_id}, menu={menu_selection}...")
+    logger.info(f"Processing recording for {tenant_id}, menu={menu_selection}, mode={mode}...")
     
     # 1. Get Config
     config = sheet_service.get_tenant_config(tenant_id)
@@ -30,7 +48,7 @@ async def process_recording(
     recipients_str = cfg_settings.get("email_recipients", "")
     recipients = [r.strip() for r in recipients_str.split(",") if r.strip()]
     
-    if not recipients:
+    if not recipients and deliver:
         logger.error("No email recipients found for tenant")
         return
 
@@ -46,17 +64,29 @@ async def process_recording(
     transcript = "Transcription not available"
     summary = "Summary not available"
     
-    if settings.OPENAI_API_KEY:
+    if mode == "link_only":
+        transcript = note or "Transcript will follow in a separate email."
+        summary = "Summary will follow with the transcript."
+    elif settings.OPENAI_API_KEY:
         logger.info(f"Starting transcription for {call_sid}...")
         try:
-            transcript = ai_service.transcribe_audio_from_url(recording_url)
+            transcript = await _call_ai("transcription", ai_service.transcribe_audio_from_url,
+                                        recording_url, None, recording_sid)
             logger.info(f"Transcription complete: {len(transcript)} chars")
             
             # Generate summary if transcript is valid
             if transcript and not transcript.startswith("Error"):
-                logger.info(f"Generating summary for {call_sid}...")
-                summary = ai_service.generate_summary(transcript)
-                logger.info(f"Summary complete")
+                # Short/simple transcripts are summarized locally, no GPT call
+                fast_summary = fast_summary_service.summarize(transcript, config)
+                if fast_summary:
+                    summary = fast_summary
+                    logger.info(f"Fast-path summary for {call_sid}")
+                else:
+                    logger.info(f"Generating summary for {call_sid}...")
+                    summary = await _call_ai("summary", ai_service.generate_summary, transcript)
+                    logger.info(f"Summary complete")
+        except ai_service.RateLimited:
+            raise
         except Exception as e:
             logger.error(f"AI processing error: {e}")
             transcript = f"Transcription error: {e}"
@@ -68,6 +98,10 @@ async def process_recording(
     
     # 4. Format Subject: "{store_name} Call | Menu {digitOrOff} | {From} | recording"
     subject = f"{store_name} Call | Menu {menu_selection} | {from_number} | recording"
+    if mode == "followup":
+        subject = f"{store_name} Call | Menu {menu_selection} | {from_number} | transcript"
+    elif mode == "reprocess":
+        subject = f"{store_name} Call | Menu {menu_selection} | {from_number} | reprocessed"
     
     # 5. Build email body with transcript and summary
     body = f"""New voicemail recording received.
@@ -98,6 +132,39 @@ RECORDING
 {recording_url}
 """
     
-    # 6. Send Email
-    email_service.send_report(recipients, subject, body)
-    logger.info(f"Email sent for CallSid={call_sid}")
+    # 6. Send Email (or buffer into the tenant's digest)
+    if deliver:
+        with trace_service.span("email.queue", mode=mode):
+            digest_service.deliver_report(tenant_id, cfg_settings, recipients, subject, body, menu_selection)
+        logger.info(f"Email delivered for CallSid={call_sid}")
+    return {"subject": subject, "transcript": transcript, "summary": summary}
+
+async def wait_for_ai_calls(timeout: float) -> int:
+    """Wait for OpenAI calls still running in threads. Returns how many are still running."""
+    calls = list(_ai_calls)
+    if calls:
+        await asyncio.wait(calls, timeout=timeout)
+    return sum(not call.done() for call in calls)
+
+def _ai_call_done(call):
+    _ai_calls.discard(call)
+    if not call.cancelled():
+        call.exception()  # retrieved by the awaiting job, or nobody if it was cancelled
+
+async def _call_ai(bucket_name: str, func, *args):
+    """Run a blocking OpenAI call in a worker thread, paced by its token bucket"""
+    bucket = rate_limit_service.buckets[bucket_name]
+    with trace_service.span(f"ai.{bucket_name}") as attrs:
+        waited = asyncio.get_running_loop().time()
+        await bucket.acquire()
+        attrs["rate_limit_wait_ms"] = round((asyncio.get_running_loop().time() - waited) * 1000, 1)
+        # Shielded: the thread can't be stopped, so a cancelled job leaves the call
+        # running and pipeline_service.stop waits for it (wait_for_ai_calls)
+        call = asyncio.ensure_future(asyncio.to_thread(profiler_service.in_thread(func), *args))
+        _ai_calls.add(call)
+        call.add_done_callback(_ai_call_done)
+        try:
+            return await asyncio.shield(call)
+        except ai_service.RateLimited as e:
+            bucket.penalize(e.retry_after)
+            raise
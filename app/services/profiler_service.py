@@ -0,0 +1,177 @@
+"""
+Opt-in sampling profiler.
+
+Off by default; turned on at runtime via POST /internal/profiler/start. While on,
+a fraction (sample_rate) of /voice/* requests and process_recording runs are
+profiled: a daemon thread snapshots their thread's stack every interval_ms and
+aggregates the samples as collapsed stacks ("label;frame;frame count"), the input
+format of flamegraph.pl / speedscope.
+
+Samples are taken from the thread doing the work. On the event loop thread this
+includes anything else the loop was running at the same time, so profile at low
+traffic or read the stacks with that in mind.
+
+When disabled the cost is a single flag check per request.
+"""
+from collections import Counter
+from contextlib import contextmanager
+import contextvars
+import functools
+import os
+import random
+import sys
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_STACKS = 10000  # distinct stacks kept; further samples count as [truncated]
+MAX_DEPTH = 100
+
+enabled = False
+sample_rate = 0.1
+interval = 0.005
+
+_samples = Counter()
+_active = {}            # token -> (thread ident, label)
+_tokens = iter(range(sys.maxsize))
+_lock = threading.Lock()
+_sampler = None
+_started_at = None
+_profiled = Counter()   # label -> profiled runs
+_label = contextvars.ContextVar("profile_label", default=None)
+
+def start(rate: float = None, interval_ms: float = None, reset: bool = False):
+    global enabled, sample_rate, interval, _started_at
+    if rate is not None:
+        sample_rate = max(0.0, min(1.0, rate))
+    if interval_ms is not None:
+        interval = max(0.001, interval_ms / 1000)
+    if reset:
+        clear()
+    _started_at = _started_at or time.time()
+    enabled = True
+    logger.warning(f"Sampling profiler enabled (rate={sample_rate}, interval={interval * 1000:.0f}ms)")
+
+def stop():
+    global enabled
+    enabled = False
+    logger.warning("Sampling profiler disabled")
+
+def clear():
+    global _started_at
+    with _lock:
+        _samples.clear()
+        _profiled.clear()
+    _started_at = time.time() if enabled else None
+
+@contextmanager
+def sample(label: str):
+    """Profile the enclosed block on the current thread, for sample_rate of calls"""
+    if not enabled or random.random() >= sample_rate:
+        yield
+        return
+    with _register(label):
+        _profiled[label] += 1
+        token = _label.set(label)
+        try:
+            yield
+        finally:
+            _label.reset(token)
+
+def profiled(label: str):
+    """Decorator form of sample() for coroutine functions"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not enabled:
+                return await func(*args, **kwargs)
+            with sample(label):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def in_thread(func):
+    """
+    Wrap a callable passed to asyncio.to_thread so the worker thread is sampled
+    under the caller's label (to_thread copies the context, _label included).
+    """
+    if _label.get() is None:
+        return func
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        label = _label.get()
+        if label is None or not enabled:
+            return func(*args, **kwargs)
+        with _register(label + ";[thread]"):
+            return func(*args, **kwargs)
+    return wrapper
+
+def collapsed() -> str:
+    """Aggregated samples in collapsed-stack format, one stack per line"""
+    with _lock:
+        items = sorted(_samples.items())
+    return "".join(f"{stack} {count}\n" for stack, count in items)
+
+def get_stats() -> dict:
+    return {
+        "enabled": enabled,
+        "sample_rate": sample_rate,
+        "interval_ms": round(interval * 1000, 1),
+        "since": _started_at,
+        "profiled": dict(_profiled),
+        "samples": sum(_samples.values()),
+        "stacks": len(_samples)
+    }
+
+@contextmanager
+def _register(label: str):
+    global _sampler
+    token = next(_tokens)
+    with _lock:
+        _active[token] = (threading.get_ident(), label)
+        if _sampler is None or not _sampler.is_alive():
+            _sampler = threading.Thread(target=_run_sampler, name="profiler", daemon=True)
+            _sampler.start()
+    try:
+        yield
+    finally:
+        with _lock:
+            _active.pop(token, None)
+
+def _run_sampler():
+    """Sample registered threads until nothing is registered"""
+    while True:
+        with _lock:
+            if not _active:
+                return
+            targets = list(_active.values())
+        frames = sys._current_frames()
+        with _lock:
+            for ident, label in targets:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = label + ";" + _collapse(frame)
+                if stack not in _samples and len(_samples) >= MAX_STACKS:
+                    stack = label + ";[truncated]"
+                _samples[stack] += 1
+        time.sleep(interval)
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+@functools.lru_cache(maxsize=4096)
+def _short_path(filename: str) -> str:
+    parts = filename.replace(os.sep, "/").split("/")
+    for marker in ("site-packages", "app", "scripts"):
+        if marker in parts:
+            index = len(parts) - 1 - parts[::-1].index(marker)
+            return "/".join(parts[index + (marker == "site-packages"):])
+    return "/".join(parts[-2:])
@@ -0,0 +1,178 @@
+"""
+Pre-rendered prompt audio (optional, PROMPT_AUDIO_ENABLED).
+
+Instead of <Say> (Twilio text-to-speech on every call), voice_service emits
+<Play> for prompts whose audio has already been rendered. Audio is:
+    - synthesized once per distinct prompt text by a pluggable TTS backend
+      (TTS_BACKEND: "stub" writes silent WAVs for tests, "openai" uses the TTS API)
+    - stored content-addressed in DATA_DIR/audio/{sha256}.{ext}, so a config
+      reload with unchanged prompts reuses the files
+    - served by GET /audio/{name} with immutable cache headers
+
+url_for() never synthesizes on the request path: a missing prompt is queued
+for a background worker and <Say> is used until it is ready. Warmup renders
+synchronously (render_pending) before precompiling TwiML.
+
+A failed render is retried by the worker with exponential backoff
+(PROMPT_AUDIO_RETRY_BASE .. PROMPT_AUDIO_RETRY_MAX). TwiML that fell back to
+<Say> is only recompiled when generation moves, so without the retry the
+prompt would stay on <Say> until some other prompt rendered or a restart.
+"""
+from app.core.config import settings
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+import wave
+import logging
+
+logger = logging.getLogger(__name__)
+
+AUDIO_DIR = os.path.join(settings.DATA_DIR, "audio")
+NAME_RE = re.compile(r"^[0-9a-f]{64}\.(wav|mp3)$")
+CONTENT_TYPES = {"wav": "audio/wav", "mp3": "audio/mpeg"}
+
+# Bumped whenever new audio lands; voice_service recompiles TwiML that fell back to <Say>
+generation = 0
+
+_queue = {}              # cache key -> (text, path) waiting to be synthesized
+_retry = {}              # cache key -> (text, path, attempts, retry_at) after a failed render
+_lock = threading.Lock()
+_wakeup = threading.Condition(_lock)  # worker waiting out a retry delay
+_worker = None
+_stats = {"rendered": 0, "failed": 0, "retried": 0}
+
+def _stub_backend(text: str) -> bytes:
+    """Silent 8kHz WAV, ~0.3s per word (deterministic, no network)"""
+    seconds = max(0.5, 0.3 * len(text.split()))
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(1)
+        w.setframerate(8000)
+        w.writeframes(b"\x80" * int(8000 * seconds))
+    return buf.getvalue()
+
+def _openai_backend(text: str) -> bytes:
+    from app.services import ai_service
+    client = ai_service._get_client()
+    if client is None:
+        raise RuntimeError("OpenAI client not configured")
+    resp = client.audio.speech.create(
+        model=settings.TTS_MODEL, voice=settings.TTS_VOICE, input=text, response_format="mp3"
+    )
+    return resp.content
+
+# name -> (synthesize(text) -> bytes, file extension)
+BACKENDS = {
+    "stub": (_stub_backend, "wav"),
+    "openai": (_openai_backend, "mp3"),
+}
+
+def register_backend(name: str, synthesize, ext: str):
+    """Plug in another TTS engine (ext must be a key of CONTENT_TYPES)"""
+    BACKENDS[name] = (synthesize, ext)
+
+def url_for(text: str):
+    """URL of the rendered audio for this text, or None (queued for rendering)"""
+    if not settings.PROMPT_AUDIO_ENABLED or not text or not text.strip():
+        return None
+    key, path = _locate(text)
+    if os.path.exists(path):
+        return f"{settings.BASE_URL.rstrip('/')}/audio/{os.path.basename(path)}"
+    with _lock:
+        if key not in _retry:  # else the worker retries it when its backoff expires
+            _queue.setdefault(key, (text, path))
+            _start_worker()
+    return None
+
+def render_pending():
+    """Synthesize everything queued, in the calling thread (warmup path)"""
+    while True:
+        with _lock:
+            if not _queue:
+                return
+            key, (text, path) = _queue.popitem()
+        _render(key, text, path)
+
+def audio_path(name: str):
+    """Filesystem path for GET /audio/{name}, or None if invalid/missing"""
+    if not NAME_RE.match(name):
+        return None
+    path = os.path.join(AUDIO_DIR, name)
+    return path if os.path.exists(path) else None
+
+def get_stats() -> dict:
+    return {
+        "enabled": settings.PROMPT_AUDIO_ENABLED,
+        "backend": settings.TTS_BACKEND,
+        "queued": len(_queue),
+        "retry_pending": len(_retry),
+        "generation": generation,
+        **_stats
+    }
+
+def _locate(text: str):
+    _, ext = BACKENDS[settings.TTS_BACKEND]
+    key = hashlib.sha256(
+        f"{settings.TTS_BACKEND}|{settings.TTS_MODEL}|{settings.TTS_VOICE}|{text}".encode("utf-8")
+    ).hexdigest()
+    return key, os.path.join(AUDIO_DIR, f"{key}.{ext}")
+
+def _render(key: str, text: str, path: str):
+    global generation
+    if os.path.exists(path):
+        return
+    synthesize, _ = BACKENDS[settings.TTS_BACKEND]
+    try:
+        audio = synthesize(text)
+        os.makedirs(AUDIO_DIR, exist_ok=True)
+        tmp = f"{path}.tmp{threading.get_ident()}"
+        with open(tmp, "wb") as f:
+            f.write(audio)
+        os.replace(tmp, path)
+    except Exception as e:
+        _stats["failed"] += 1
+        with _lock:
+            attempts = _retry.pop(key, (None, None, 0, None))[2] + 1
+            delay = min(settings.PROMPT_AUDIO_RETRY_BASE * 2 ** (attempts - 1), settings.PROMPT_AUDIO_RETRY_MAX)
+            _retry[key] = (text, path, attempts, time.monotonic() + delay)
+            _start_worker()
+            _wakeup.notify()
+        logger.error(f"Prompt audio rendering failed ({settings.TTS_BACKEND}), retry in {delay:.0f}s: {e}")
+        return
+    with _lock:
+        _retry.pop(key, None)
+    _stats["rendered"] += 1
+    generation += 1
+    logger.info(f"Rendered prompt audio {os.path.basename(path)} ({len(audio)} bytes)")
+
+def _start_worker():
+    """Background renderer for prompts first seen on the request path (caller holds _lock)"""
+    global _worker
+    if _worker is None:
+        _worker = threading.Thread(target=_run_worker, name="prompt-audio", daemon=True)
+        _worker.start()
+    else:
+        _wakeup.notify()
+
+def _run_worker():
+    global _worker
+    while True:
+        with _lock:
+            while not _queue:
+                if not _retry:
+                    _worker = None
+                    return
+                now = time.monotonic()
+                due = [key for key, entry in _retry.items() if entry[3] <= now]
+                for key in due:
+                    text, path, _, _ = _retry[key]
+                    _queue[key] = (text, path)
+                    _stats["retried"] += 1
+                if not due:
+                    _wakeup.wait(min(entry[3] for entry in _retry.values()) - now)
+            key, (text, path) = _queue.popitem()
+        _render(key, text, path)
@@ -0,0 +1,75 @@
+"""
+Token buckets for outbound API rate limits (OpenAI Whisper / chat).
+Workers await acquire() before each call; a 429 drains the bucket and
+blocks it for the server-provided Retry-After.
+"""
+from app.core.config import settings
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Async token bucket: `rate_per_minute` tokens/min, bursts up to `burst`"""
+
+    def __init__(self, name: str, rate_per_minute: float, burst: float = None):
+        self.name = name
+        self.rate = max(rate_per_minute, 0.001) / 60.0  # tokens per second
+        self.capacity = burst or max(1.0, rate_per_minute / 10.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.waiting = 0
+        self.throttled = 0  # 429s seen
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until a token would be available (0 = now)"""
+        now = time.monotonic()
+        self._refill(now)
+        blocked = max(0.0, self.blocked_until - now)
+        missing = max(0.0, 1.0 - self.tokens) / self.rate
+        return max(blocked, missing)
+
+    async def acquire(self):
+        self.waiting += 1
+        try:
+            while True:
+                delay = self.wait_time()
+                if delay <= 0:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep(delay)
+        finally:
+            self.waiting -= 1
+
+    def penalize(self, retry_after: float = None):
+        """Server said 429: drop available tokens and pause for retry_after"""
+        delay = retry_after or settings.OPENAI_RATE_LIMIT_BACKOFF
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = 0.0
+        self.blocked_until = max(self.blocked_until, now + delay)
+        self.throttled += 1
+        logger.warning(f"{self.name} rate limited, pausing {delay:.0f}s")
+
+    def snapshot(self) -> dict:
+        return {
+            "rate_per_minute": round(self.rate * 60, 1),
+            "tokens": round(self.tokens, 2),
+            "wait_seconds": round(self.wait_time(), 1),
+            "waiting": self.waiting,
+            "throttled": self.throttled
+        }
+
+buckets = {
+    "transcription": TokenBucket("transcription", settings.OPENAI_TRANSCRIPTION_RPM),
+    "summary": TokenBucket("summary", settings.OPENAI_SUMMARY_RPM),
+}
+
+def get_stats() -> dict:
+    return {name: bucket.snapshot() for name, bucket in buckets.items()}
@@ -0,0 +1,103 @@
+"""
+Repeat-caller index: who called this tenant recently.
+
+/voice/incoming asks is_returning() before answering. Callers seen recently
+get the short greeting (prompts sheet "returning_intro", see voice_service)
+instead of main_intro + main_scope. Tenants without that prompt are unaffected.
+
+Per tenant, a dict maps the caller number to one float. The float is a
+time-decayed call count stored as log2(count) + t / REPEAT_CALLER_HALF_LIFE,
+so it never has to be rewritten while it decays:
+    count now = 2 ** (stored - now / half_life)
+A caller is "returning" while that count is >= 0.5, i.e. one call within the
+last half-life, two within two half-lives, and so on. Keys are ints of the
+digits (about 100 bytes per entry with the float), in last-call order. Past
+REPEAT_CALLER_MAX_PER_TENANT entries the caller whose last call is oldest is
+dropped. Lookups and updates are O(1).
+
+The index is fed from the call events in routes.py (synthetic probes
+excluded). On startup it is rebuilt from the incoming events in the CDR
+database, so restarts keep it.
+"""
+from app.core.config import settings
+import math
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+RETURNING_LOG2 = -1.0  # decayed count >= 0.5
+# Twilio's placeholders for withheld numbers (anonymous, restricted, unavailable, blocked)
+WITHHELD = {"266696687", "86282452253", "8656696", "2562533"}
+
+# tenant_id -> {number key: log2(count) + t / half_life}, oldest last call first
+_index = {}
+_stats = {"lookups": 0, "returning": 0, "evicted": 0, "rebuilt": 0}
+
+def normalize(number: str):
+    """Compact key for a caller number (None for withheld or junk numbers)"""
+    if not number:
+        return None
+    digits = "".join(c for c in number if c.isdigit())
+    if len(digits) < 6 or digits in WITHHELD:
+        return None
+    return int("1" + digits)  # leading 1 keeps leading zeros significant
+
+def is_returning(tenant_id: str, number: str, now: float = None) -> bool:
+    """O(1): did this number call this tenant recently enough?"""
+    if not settings.REPEAT_CALLER_ENABLED:
+        return False
+    _stats["lookups"] += 1
+    key = normalize(number)
+    entries = _index.get(tenant_id)
+    if key is None or not entries or key not in entries:
+        return False
+    now = time.time() if now is None else now
+    if entries[key] - now / settings.REPEAT_CALLER_HALF_LIFE < RETURNING_LOG2:
+        return False
+    _stats["returning"] += 1
+    return True
+
+def record_event(tenant_id: str, number: str, event: str, ts: float = None):
+    """Count a call event (only "incoming" counts: one per call)"""
+    if event != "incoming" or not settings.REPEAT_CALLER_ENABLED:
+        return
+    key = normalize(number)
+    if key is None:
+        return
+    t = (time.time() if ts is None else ts) / settings.REPEAT_CALLER_HALF_LIFE
+    entries = _index.get(tenant_id)
+    if entries is None:
+        entries = _index[tenant_id] = {}
+    previous = entries.pop(key, None)  # re-inserted at the end: newest last call
+    count = 2.0 ** (previous - t) if previous is not None else 0.0
+    entries[key] = math.log2(count + 1.0) + t
+    while len(entries) > settings.REPEAT_CALLER_MAX_PER_TENANT:
+        del entries[next(iter(entries))]
+        _stats["evicted"] += 1
+
+def rebuild_from_cdr() -> int:
+    """Replay recent incoming events from the CDR database (startup, before traffic)"""
+    from app.services import cdr_service
+    if not settings.REPEAT_CALLER_ENABLED:
+        return 0
+    # Older calls have decayed below 1/16 of a call
+    since = time.time() - 4 * settings.REPEAT_CALLER_HALF_LIFE
+    replayed = 0
+    for tenant_id, from_number, ts in cdr_service.events_since("incoming", since):
+        record_event(tenant_id, from_number, "incoming", ts)
+        replayed += 1
+    _stats["rebuilt"] = replayed
+    if replayed:
+        logger.info(f"Repeat-caller index rebuilt from {replayed} calls")
+    return replayed
+
+def clear():
+    _index.clear()
+
+def get_stats() -> dict:
+    return {
+        "enabled": settings.REPEAT_CALLER_ENABLED,
+        "callers": {tenant_id: len(entries) for tenant_id, entries in _index.items()},
+        **_stats
+    }
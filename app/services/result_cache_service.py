@@ -0,0 +1,135 @@
+"""
+Persistent content-addressed cache for AI results.
+
+Keys (see ai_service):
+    transcript:sid:{RecordingSid}     transcript of a Twilio recording
+    transcript:audio:{sha256}         transcript of identical audio bytes
+    summary:{sha256}                  summary of a normalized transcript (+ model/prompt)
+
+Stored in SQLite at DATA_DIR/results.db, bounded to RESULT_CACHE_MAX_BYTES with
+LRU eviction (least recently read first). Reprocessing a recording after a retry,
+manual resend or restart becomes a local lookup instead of a download + API call.
+Inside refreshing("transcript", ...) reads of those kinds miss, so a bulk
+reprocess after a model/prompt fix recomputes and overwrites them.
+"""
+from app.core.config import settings
+from collections import Counter
+from contextlib import contextmanager
+import contextvars
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.path.join(settings.DATA_DIR, "results.db")
+
+_lock = threading.Lock()
+_conn = None
+_total_bytes = 0
+_stats = Counter()
+_refresh = contextvars.ContextVar("result_cache_refresh", default=frozenset())
+
+def content_hash(data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+def get(key: str):
+    """Cached value or None. Counts a hit/miss for the key's kind."""
+    kind = key.split(":", 1)[0]
+    if kind in _refresh.get():
+        _stats[f"{kind}_refreshed"] += 1
+        return None
+    with _lock:
+        try:
+            conn = _connect()
+            row = conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+                conn.commit()
+        except sqlite3.Error as e:
+            # A broken cache must never break processing
+            logger.error(f"Result cache read failed: {e}")
+            row = None
+        if row is None:
+            _stats[f"{kind}_misses"] += 1
+            return None
+        _stats[f"{kind}_hits"] += 1
+        return row[0]
+
+@contextmanager
+def refreshing(*kinds: str):
+    """Ignore cached values of these kinds (still written) in the enclosed context"""
+    token = _refresh.set(_refresh.get() | frozenset(kinds))
+    try:
+        yield
+    finally:
+        _refresh.reset(token)
+
+def put(key: str, value: str):
+    global _total_bytes
+    size = len(key) + len(value.encode("utf-8"))
+    with _lock:
+        try:
+            conn = _connect()
+            old = conn.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now)
+            )
+            _total_bytes += size - (old[0] if old else 0)
+            if _total_bytes > settings.RESULT_CACHE_MAX_BYTES:
+                _evict(conn)
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Result cache write failed: {e}")
+
+def get_stats() -> dict:
+    with _lock:
+        conn = _connect()
+        entries = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        stats = dict(_stats)
+    for kind in ("transcript", "summary"):
+        hits, misses = stats.get(f"{kind}_hits", 0), stats.get(f"{kind}_misses", 0)
+        stats[f"{kind}_hit_rate"] = round(hits / (hits + misses), 3) if hits + misses else None
+    return {
+        "entries": entries,
+        "bytes": _total_bytes,
+        "max_bytes": settings.RESULT_CACHE_MAX_BYTES,
+        **stats
+    }
+
+def _evict(conn):
+    """Drop least recently used entries down to 90% of the budget (caller holds _lock)"""
+    global _total_bytes
+    target = settings.RESULT_CACHE_MAX_BYTES * 0.9
+    rows = conn.execute("SELECT key, size FROM results ORDER BY last_access ASC").fetchall()
+    evicted = []
+    for key, size in rows:
+        if _total_bytes <= target:
+            break
+        evicted.append((key,))
+        _total_bytes -= size
+    conn.executemany("DELETE FROM results WHERE key = ?", evicted)
+    _stats["evictions"] += len(evicted)
+
+def _connect():
+    """Open (once) the cache database (caller holds _lock)"""
+    global _conn, _total_bytes
+    if _conn is None:
+        os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+        _conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_results_last_access ON results (last_access)")
+        _total_bytes = _conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+    return _conn
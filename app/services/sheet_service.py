@@ -1,8 +1,8 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 from app.core.config import settings
-from cachetools import TTLCache, cached
-import csv
+from app.core.tenant_config import from_rows
+from app.services import local_config_service
+from cachetools import TTLCache
+from typing import Optional
 import os
 import json
 from datetime import datetime
@@ -11,10 +11,21 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-# Cache configuration (180s TTL)
-msg_cache = TTLCache(maxsize=100, ttl=settings.SHEET_CACHE_TTL)
+# Cache configuration (180s TTL). Sized for every active tenant: an evicted tenant
+# costs a synchronous revision check on its next /voice/incoming
+msg_cache = TTLCache(maxsize=settings.SHEET_CACHE_MAX_TENANTS, ttl=settings.SHEET_CACHE_TTL)
 
-# Tenant Mapping: phone_number -> spreadsheet_id
+# Last loaded config per tenant: tenant_id -> (revision, config)
+# Outlives msg_cache entries so an expired tenant can be revalidated
+# with a cheap revision check instead of a full re-download.
+_config_store = {}
+
+# Local CSV templates (mock mode / fallback), independent of the working directory
+CSV_BASE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "sheet_templates")
+
+# Tenant Mapping: tenant_id -> config source
+#   spreadsheet_id        Google Sheets (cached, SHEET_CACHE_TTL + revision check)
+#   "local:<directory>"   files watched on disk (see local_config_service)
 # In production, this could come from a master sheet or database
 TENANT_MAP = {
     "bluefone_cannonhill": os.environ.get("SHEET_ID_CANNONHILL", "SPREADSHEET_ID_PLACEHOLDER")
@@ -25,10 +36,20 @@ PHONE_TO_TENANT = {
     # Add your Twilio numbers here: "+61XXXXXXXXX": "bluefone_cannonhill"
 }
 
+# Authorized client is reused across fetches (token refresh is handled by gspread)
+_gspread_client = None
+
 def get_gspread_client():
     """Get authenticated gspread client, supports both file and JSON string credentials"""
+    global _gspread_client
     if settings.MOCK_MODE:
         return None
+    if _gspread_client is not None:
+        return _gspread_client
+    
+    # Imported lazily: not needed in MOCK_MODE and slow to import
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
     
     scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
     
@@ -48,8 +69,8 @@ def get_gspread_client():
         logger.error("No Google credentials available")
         return None
     
-    client = gspread.authorize(creds)
-    return client
+    _gspread_client = gspread.authorize(creds)
+    return _gspread_client
 
 def resolve_tenant_by_phone(to_number: str) -> str:
     """Resolve tenant_id from incoming phone number"""
@@ -65,17 +86,86 @@ def resolve_tenant_by_phone(to_number: str) -> str:
     logger.warning(f"No tenant mapping for {clean_number}, using default")
     return "bluefone_cannonhill"
 
-@cached(msg_cache)
+def resolve_tenant_by_sheet_id(spreadsheet_id: str) -> Optional[str]:
+    """Reverse lookup: spreadsheet_id -> tenant_id (None if unknown)"""
+    clean_id = spreadsheet_id.strip() if spreadsheet_id else ""
+    for tenant_id, sheet_id in TENANT_MAP.items():
+        if sheet_id == clean_id:
+            return tenant_id
+    return None
+
+def invalidate_tenant(tenant_id: str) -> bool:
+    """
+    Drop one tenant's cached config so the next lookup refetches it.
+    Other tenants keep their cache entries.
+    Returns True if an entry was cached.
+    """
+    source = TENANT_MAP.get(tenant_id)
+    if local_config_service.is_local(source):
+        return local_config_service.invalidate(local_config_service.directory_of(source))
+    _config_store.pop(tenant_id, None)
+    return msg_cache.pop(tenant_id, None) is not None
+
+def clear_all():
+    """Drop every cached config, including revision markers (forces full refetch)"""
+    msg_cache.clear()
+    _config_store.clear()
+
 def get_tenant_config(tenant_id: str):
     """
     Fetches and consolidates settings from Google Sheets or CSV templates (Mock).
-    Returns a dict with: settings, schedule, prompts, repair_scope
+    Returns an immutable TenantConfig with: settings, schedule, prompts, repair_scope
     """
+    source = TENANT_MAP.get(tenant_id)
+    if local_config_service.is_local(source):
+        # Watched files: no TTL, no network
+        try:
+            return local_config_service.load(local_config_service.directory_of(source))
+        except Exception as e:
+            logger.error(f"Error loading local config for {tenant_id}: {e}")
+            return _fetch_from_csv()
+    
+    config = msg_cache.get(tenant_id)
+    if config is not None:
+        return config
+    
+    config = _load_tenant_config(tenant_id)
+    msg_cache[tenant_id] = config
+    return config
+
+def get_loaded_config(tenant_id: str):
+    """
+    Last loaded config for a tenant without fetching (None if never loaded).
+    An expired TTL entry still counts: it is revalidated cheaply on next use.
+    """
+    source = TENANT_MAP.get(tenant_id)
+    if local_config_service.is_local(source):
+        return local_config_service.loaded(local_config_service.directory_of(source))
+    config = msg_cache.get(tenant_id)
+    if config is not None:
+        return config
+    stored = _config_store.get(tenant_id)
+    return stored[1] if stored else None
+
+def _load_tenant_config(tenant_id: str):
+    """
+    Called on cache miss. Checks the cheap revision marker first and reuses
+    the last loaded config if nothing changed; only downloads and
+    re-normalizes the worksheets when the revision moved.
+    """
+    revision = get_config_revision(tenant_id)
+    
+    stored = _config_store.get(tenant_id)
+    if stored and revision is not None and stored[0] == revision:
+        logger.debug(f"Config unchanged for {tenant_id} (revision {revision}), extending cache")
+        return stored[1]
+    
     if settings.MOCK_MODE:
-        return _fetch_from_csv()
+        config = _fetch_from_csv()
+        _config_store[tenant_id] = (revision, config)
+        return config
     
     # Real Sheet logic
-    client = get_gspread_client()
     spreadsheet_id = TENANT_MAP.get(tenant_id)
     if not spreadsheet_id:
         # Fallback or error
@@ -83,68 +173,74 @@ def get_tenant_config(tenant_id: str):
         return _fetch_from_csv() # Fallback to mock/default
 
     try:
-        sheet = client.open_by_key(spreadsheet_id)
-        
-        # Load all 4 worksheets
-        ws_settings = sheet.worksheet("settings").get_all_records()
-        ws_schedule = sheet.worksheet("schedule").get_all_records()
-        ws_prompts = sheet.worksheet("prompts").get_all_records()
-        ws_repair = sheet.worksheet("repair_scope").get_all_records()
-        
-        return _normalize_config(ws_settings, ws_schedule, ws_prompts, ws_repair)
-        
+        config = _fetch_from_sheet(get_gspread_client(), spreadsheet_id)
     except Exception as e:
         logger.error(f"Error fetching sheets: {e}")
-        # Fallback to defaults?
+        # Fallback to defaults? Not remembered, so the next miss retries the sheet
         return _fetch_from_csv()
+    
+    logger.info(f"Loaded config for {tenant_id} (revision {revision})")
+    _config_store[tenant_id] = (revision, config)
+    return config
 
-def _fetch_from_csv():
-    """Reads from local CSV templates for mocking"""
-    base_path = "sheet_templates"
-    
-    def read_csv(name):
-        path = os.path.join(base_path, f"{name}.csv")
-        if not os.path.exists(path):
-            return []
-        with open(path, 'r', encoding='utf-8') as f:
-            return list(csv.DictReader(f))
-            
-    return _normalize_config(
-        read_csv("settings"),
-        read_csv("schedule"),
-        read_csv("prompts"),
-        read_csv("repair_scope")
-    )
-
-def _normalize_config(settings_rows, schedule_rows, prompts_rows, repair_rows):
-    """Converts list of dicts to usable dictionaries"""
-    
-    # 1. Settings (Key-Value)
-    config = {}
-    for row in settings_rows:
-        config[row.get('key')] = row.get('value')
-        
-    # 2. Schedule (List)
-    schedule = schedule_rows # Keep as list
+def _fetch_from_sheet(client, spreadsheet_id: str):
+    """Downloads all 4 worksheets and normalizes them"""
+    sheet = client.open_by_key(spreadsheet_id)
     
-    # 3. Prompts (Key-Text)
-    prompts = {}
-    for row in prompts_rows:
-        prompts[row.get('key')] = row.get('text')
-        
-    # 4. Repair Scope (Key-Value)
-    repair = {}
-    for row in repair_rows:
-        repair[row.get('key')] = row.get('value')
-        
-    return {
-        "settings": config,
-        "schedule": schedule,
-        "prompts": prompts,
-        "repair_scope": repair
-    }
-
-def is_store_open(config: dict, current_dt: datetime = None) -> bool:
+    # Load all 4 worksheets
+    ws_settings = sheet.worksheet("settings").get_all_records()
+    ws_schedule = sheet.worksheet("schedule").get_all_records()
+    ws_prompts = sheet.worksheet("prompts").get_all_records()
+    ws_repair = sheet.worksheet("repair_scope").get_all_records()
+    
+    return from_rows(ws_settings, ws_schedule, ws_prompts, ws_repair)
+
+def get_config_revision(tenant_id: str) -> Optional[str]:
+    """
+    Lightweight revision marker for a tenant's config source.
+    Sheets: Drive file version (one small metadata request, no worksheet reads).
+    Mock: mtime/size of the CSV templates.
+    Local: mtime/size of the watched config files.
+    Returns None if unknown, which forces a full fetch.
+    """
+    source = TENANT_MAP.get(tenant_id)
+    if local_config_service.is_local(source):
+        return local_config_service.signature(local_config_service.directory_of(source))
+    if settings.MOCK_MODE:
+        return local_config_service.signature(CSV_BASE_PATH)
+    
+    spreadsheet_id = TENANT_MAP.get(tenant_id)
+    if not spreadsheet_id:
+        return None
+    
+    try:
+        client = get_gspread_client()
+        if not client:
+            return None
+        url = settings.SHEET_REVISION_URL.format(spreadsheet_id=spreadsheet_id)
+        resp = client.http_client.request("get", url, params={
+            "fields": "version,modifiedTime",
+            "supportsAllDrives": True
+        })
+        data = resp.json()
+        return str(data.get("version") or data.get("modifiedTime") or "") or None
+    except Exception as e:
+        logger.warning(f"Revision check failed for {tenant_id}: {e}")
+        return None
+
+def _fetch_from_csv():
+    """
+    Local CSV templates (mock mode / fallback), parsed once and re-read only when edited.
+    Also the last resort when a sheet fetch fails, so it never raises: without
+    templates the config is empty (default prompts/settings).
+    """
+    try:
+        return local_config_service.load(CSV_BASE_PATH)
+    except Exception as e:
+        logger.error(f"CSV templates unavailable in {CSV_BASE_PATH}: {e}")
+        return from_rows([], [], [], [])
+
+def is_store_open(config, current_dt: datetime = None) -> bool:
     """
     Determines if store is open based on config.
     Logic:
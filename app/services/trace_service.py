@@ -0,0 +1,242 @@
+"""
+Lightweight span tracing, one trace per call (trace id = CallSid).
+
+    with trace_service.span("transcribe", recording_sid=sid):
+        ...
+
+The current span lives in a contextvar, so nesting works across awaits and
+into asyncio.to_thread workers (which copy the context). Work that crosses a
+queue carries the context explicitly: current_context() is stored on the
+pipeline job / outbox entry and passed back as span(..., parent=ctx) by the
+consumer. Queue waits are recorded as spans with explicit times (record_span).
+
+Spans outside any call (no CallSid, no parent) are not recorded. Finished
+spans are kept in memory per call (TRACE_MAX_CALLS most recent calls) for
+GET /internal/traces/{call_sid}, and exported in batches by a background loop
+when TRACE_EXPORT is set:
+    file   JSON lines appended to TRACE_FILE
+    otlp   OTLP/HTTP JSON POSTed to TRACE_OTLP_ENDPOINT (e.g. a local collector)
+"""
+from app.core.config import settings
+from cachetools import LRUCache
+from collections import deque
+from contextlib import contextmanager
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_SPANS_PER_CALL = 200
+
+# (trace_id, span_id) of the innermost open span
+_current = contextvars.ContextVar("trace_span", default=None)
+
+_calls = LRUCache(maxsize=settings.TRACE_MAX_CALLS)  # call_sid -> [span dicts]
+_lock = threading.Lock()
+_export_queue = deque(maxlen=50000)
+_stats = {"spans": 0, "exported": 0, "export_errors": 0}
+
+def current_context():
+    """{"trace_id", "span_id"} of the current span, for carrying across a queue"""
+    ctx = _current.get()
+    return {"trace_id": ctx[0], "span_id": ctx[1]} if ctx else None
+
+@contextmanager
+def span(name: str, call_sid: str = None, parent: dict = None, **attributes):
+    """
+    Time the enclosed block as a span. Trace id comes from (in order) parent,
+    call_sid, or the enclosing span; without any of them nothing is recorded.
+    """
+    enclosing = _current.get()
+    if parent:
+        trace_id, parent_id = parent.get("trace_id"), parent.get("span_id")
+    elif call_sid:
+        same_trace = enclosing is not None and enclosing[0] == call_sid
+        trace_id, parent_id = call_sid, enclosing[1] if same_trace else None
+    elif enclosing:
+        trace_id, parent_id = enclosing
+    else:
+        trace_id = None
+
+    if not settings.TRACE_ENABLED or not trace_id:
+        yield attributes
+        return
+
+    span_id = secrets.token_hex(8)
+    token = _current.set((trace_id, span_id))
+    start = time.time()
+    error = None
+    try:
+        yield attributes  # callers may add attributes while the span is open
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        _finish(trace_id, span_id, parent_id, name, start, time.time(), attributes, error)
+
+def record_span(name: str, start: float, end: float, parent: dict = None, call_sid: str = None, **attributes):
+    """Record a span with explicit times (e.g. time spent waiting in a queue)"""
+    trace_id = (parent or {}).get("trace_id") or call_sid
+    if not settings.TRACE_ENABLED or not trace_id:
+        return
+    _finish(trace_id, secrets.token_hex(8), (parent or {}).get("span_id"), name, start, end, attributes, None)
+
+def traced(name: str, call_sid_arg: str = "call_sid"):
+    """Decorator for coroutine functions: span named `name`, trace id from the call_sid_arg kwarg"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name, call_sid=kwargs.get(call_sid_arg)):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def get_trace(call_sid: str) -> list:
+    """Spans of one call, ordered by start"""
+    with _lock:
+        spans = list(_calls.get(call_sid, []))
+    return sorted(spans, key=lambda s: s["start"])
+
+def waterfall(call_sid: str) -> dict:
+    """Spans with offsets from the first span and their depth in the tree"""
+    spans = get_trace(call_sid)
+    if not spans:
+        return {"call_sid": call_sid, "spans": []}
+    t0 = spans[0]["start"]
+    by_id = {s["span_id"]: s for s in spans}
+
+    def depth(s):
+        d = 0
+        while s.get("parent_id") in by_id and d < 20:
+            s = by_id[s["parent_id"]]
+            d += 1
+        return d
+
+    end = max(s["end"] for s in spans)
+    return {
+        "call_sid": call_sid,
+        "total_ms": round((end - t0) * 1000, 1),
+        "spans": [{
+            "name": s["name"],
+            "depth": depth(s),
+            "offset_ms": round((s["start"] - t0) * 1000, 1),
+            "duration_ms": s["duration_ms"],
+            "error": s.get("error"),
+            "attributes": s.get("attributes", {})
+        } for s in spans]
+    }
+
+def render_waterfall(trace: dict, width: int = 60) -> str:
+    """Text waterfall (one bar per span)"""
+    total = trace.get("total_ms") or 1
+    lines = [f"{trace['call_sid']}  total {trace.get('total_ms', 0)}ms"]
+    for s in trace["spans"]:
+        start = int(s["offset_ms"] / total * width)
+        length = max(1, int(s["duration_ms"] / total * width))
+        bar = " " * start + "#" * min(length, width - start)
+        label = ("  " * s["depth"] + s["name"])[:32]
+        flag = " !" if s["error"] else ""
+        lines.append(f"{label:<32} |{bar:<{width}}| {s['offset_ms']:>9.1f} +{s['duration_ms']:.1f}ms{flag}")
+    return "\n".join(lines) + "\n"
+
+async def run_export_loop():
+    """Background task: ship finished spans to TRACE_EXPORT"""
+    while True:
+        await asyncio.sleep(settings.TRACE_EXPORT_INTERVAL)
+        if _export_queue:
+            await asyncio.to_thread(flush)
+
+def flush() -> int:
+    batch = []
+    while _export_queue:
+        batch.append(_export_queue.popleft())
+    if not batch:
+        return 0
+    try:
+        if settings.TRACE_EXPORT == "file":
+            _export_file(batch)
+        elif settings.TRACE_EXPORT == "otlp":
+            _export_otlp(batch)
+    except Exception as e:
+        _stats["export_errors"] += 1
+        logger.error(f"Span export failed ({len(batch)} spans dropped): {e}")
+        return 0
+    _stats["exported"] += len(batch)
+    return len(batch)
+
+def get_stats() -> dict:
+    return {
+        "enabled": settings.TRACE_ENABLED,
+        "export": settings.TRACE_EXPORT or None,
+        "calls": len(_calls),
+        "export_pending": len(_export_queue),
+        **_stats
+    }
+
+def _finish(trace_id, span_id, parent_id, name, start, end, attributes, error):
+    record = {
+        "trace_id": trace_id,
+        "span_id": span_id,
+        "parent_id": parent_id,
+        "name": name,
+        "start": start,
+        "end": end,
+        "duration_ms": round((end - start) * 1000, 2),
+    }
+    if attributes:
+        record["attributes"] = {k: v for k, v in attributes.items() if v is not None}
+    if error:
+        record["error"] = error
+    with _lock:
+        spans = _calls.get(trace_id)
+        if spans is None:
+            spans = _calls[trace_id] = []
+        if len(spans) < MAX_SPANS_PER_CALL:
+            spans.append(record)
+        _stats["spans"] += 1
+    if settings.TRACE_EXPORT:
+        _export_queue.append(record)
+
+def _export_file(batch: list):
+    os.makedirs(os.path.dirname(settings.TRACE_FILE) or ".", exist_ok=True)
+    with open(settings.TRACE_FILE, "a", encoding="utf-8") as f:
+        f.write("".join(json.dumps(s, separators=(",", ":"), default=str) + "\n" for s in batch))
+
+def _export_otlp(batch: list):
+    """OTLP/HTTP JSON (/v1/traces). Trace ids are derived from the CallSid."""
+    from urllib.request import urlopen, Request
+    import hashlib
+
+    def otlp_span(s):
+        attributes = [{"key": "call_sid", "value": {"stringValue": s["trace_id"]}}]
+        attributes += [{"key": k, "value": {"stringValue": str(v)}} for k, v in s.get("attributes", {}).items()]
+        span_json = {
+            "traceId": hashlib.md5(s["trace_id"].encode()).hexdigest(),
+            "spanId": s["span_id"],
+            "name": s["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(int(s["start"] * 1e9)),
+            "endTimeUnixNano": str(int(s["end"] * 1e9)),
+            "attributes": attributes,
+            "status": {"code": 2, "message": s["error"]} if s.get("error") else {"code": 1}
+        }
+        if s.get("parent_id"):
+            span_json["parentSpanId"] = s["parent_id"]
+        return span_json
+
+    payload = {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "bluefone-ivr"}}]},
+        "scopeSpans": [{"scope": {"name": "bluefone.trace_service"}, "spans": [otlp_span(s) for s in batch]}]
+    }]}
+    req = Request(settings.TRACE_OTLP_ENDPOINT, data=json.dumps(payload).encode(),
+                  headers={"Content-Type": "application/json"})
+    with urlopen(req, timeout=10) as resp:
+        resp.read()
@@ -1,8 +1,29 @@
 from twilio.twiml.voice_response import VoiceResponse
+from app.core.config import settings
+from app.core.tenant_config import build_format_context
+from app.services import prompt_audio_service
+import weakref
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Precompiled TwiML per loaded config: config -> ({name: xml}, audio_generation)
+# Every response is static for a given config, so it is rendered once per
+# config load instead of on every webhook. A reloaded config is a new object
+# and gets compiled afresh; the old entry goes away with the old config.
+# Not size-bounded: readiness requires every tenant to stay precompiled.
+# audio_generation is set when some prompt fell back to <Say> because its audio
+# was not rendered yet; the entry is recompiled once new audio is available.
+_compiled = weakref.WeakKeyDictionary()
+
+def _say(node, text):
+    """<Play> the pre-rendered prompt audio if available, else <Say>"""
+    url = prompt_audio_service.url_for(text)
+    if url:
+        node.play(url)
+    else:
+        node.say(text, voice="alice")
+
 def _get_prompt(config, key, context=None):
     """Helper to get and format prompt"""
     prompts = config.get("prompts", {})
@@ -16,21 +37,67 @@ def _get_prompt(config, key, context=None):
     return text
 
 def _build_context(config):
-    """Merges settings and repair_scope for formatting"""
-    ctx = {}
-    ctx.update(config.get("settings", {}))
-    ctx.update(config.get("repair_scope", {}))
-    # Add calculated fields if needed
-    ctx["STORE_NAME"] = ctx.get("store_name", "")
-    ctx["ADDRESS_LINE"] = ctx.get("address_line", "")
+    """Format context (settings + repair_scope, upper-cased keys), prebuilt per TenantConfig"""
+    context = getattr(config, "format_context", None)
+    if context is not None:
+        return context
+    return build_format_context(config.get("settings", {}), config.get("repair_scope", {}))
+
+def precompile(config) -> dict:
+    """Render (or fetch already rendered) TwiML for every static response of a config"""
+    entry = _lookup(config)
+    if entry is not None:
+        if entry[1] is None or entry[1] == prompt_audio_service.generation:
+            return entry[0]
     
-    # Upper case keys for matching the template style {STORE_NAME}
-    # Create a copy with upper keys
-    upper_ctx = {k.upper(): v for k, v in ctx.items()}
-    # Also keep original keys just in case
-    return {**ctx, **upper_ctx}
+    generation = prompt_audio_service.generation
+    responses = {
+        "incoming_open": _render_incoming_response(config, True),
+        "incoming_closed": _render_incoming_response(config, False),
+        "incoming_returning": _render_returning_response(config),
+        "menu_1": _render_menu_response(config, "1"),
+        "menu_2": _render_menu_response(config, "2"),
+        "menu_3": _render_menu_response(config, "3"),
+        "menu_invalid": _render_menu_response(config, None),
+        "no_input": _render_no_input_response(config),
+        "thank_you": _render_thank_you_response(config)
+    }
+    incomplete = settings.PROMPT_AUDIO_ENABLED and any("<Say" in xml for xml in responses.values() if xml)
+    try:
+        _compiled[config] = (responses, generation if incomplete else None)
+    except TypeError:
+        pass  # plain dict config (not weak-referenceable): rendered per call
+    return responses
+
+def is_precompiled(config) -> bool:
+    return _lookup(config) is not None
+
+def _lookup(config):
+    try:
+        return _compiled.get(config)
+    except TypeError:
+        return None
+
+def generate_incoming_response(config, is_open, returning=False):
+    responses = precompile(config)
+    if not is_open:
+        return responses["incoming_closed"]
+    # Recent callers (repeat_caller_service) skip the full intro if the tenant has a returning_intro
+    return (returning and responses["incoming_returning"]) or responses["incoming_open"]
 
-def generate_incoming_response(config, is_open):
+def generate_menu_response(config, digit):
+    key = f"menu_{digit}" if digit in ("1", "2", "3") else "menu_invalid"
+    return precompile(config)[key]
+
+def generate_no_input_response(config):
+    return precompile(config)["no_input"]
+
+def generate_thank_you_response(config=None):
+    if config:
+        return precompile(config)["thank_you"]
+    return _render_thank_you_response(None)
+
+def _render_incoming_response(config, is_open):
     resp = VoiceResponse()
     ctx = _build_context(config)
     
@@ -39,7 +106,7 @@ def generate_incoming_response(config, is_open):
         off_mode = config.get("settings", {}).get("off_mode", "voicemail")
         if off_mode == "voicemail":
             prompt = _get_prompt(config, "off_voicemail_prompt", ctx)
-            resp.say(prompt, voice="alice")
+            _say(resp, prompt)
             resp.record(max_length=60, timeout=5, play_beep=True, trim="trim-silence",
                         recording_status_callback="/voice/recording-status",
                         recording_status_callback_method="POST",
@@ -48,7 +115,7 @@ def generate_incoming_response(config, is_open):
         else:
             # Hangup mode
             prompt = _get_prompt(config, "off_hangup_prompt", ctx)
-            resp.say(prompt, voice="alice")
+            _say(resp, prompt)
             resp.hangup()
         return str(resp)
 
@@ -59,21 +126,37 @@ def generate_incoming_response(config, is_open):
     
     full_intro = f"{prompt_intro} {prompt_scope}"
     
-    resp.say(full_intro, voice="alice")
+    _say(resp, full_intro)
     gather = resp.gather(num_digits=1, timeout=6, action="/voice/menu", method="POST")
-    gather.say(prompt_menu, voice="alice")
+    _say(gather, prompt_menu)
     
     # No Input redirect
     resp.redirect("/voice/no-input")
     return str(resp)
 
-def generate_menu_response(config, digit):
+def _render_returning_response(config):
+    """Short greeting for recent callers, None without a returning_intro prompt"""
+    ctx = _build_context(config)
+    prompt_intro = _get_prompt(config, "returning_intro", ctx)
+    if not prompt_intro:
+        return None
+    prompt_menu = _get_prompt(config, "menu_prompt", ctx)
+    
+    resp = VoiceResponse()
+    # Inside the Gather: a caller who knows the menu can press a digit right away
+    gather = resp.gather(num_digits=1, timeout=6, action="/voice/menu", method="POST")
+    _say(gather, prompt_intro)
+    _say(gather, prompt_menu)
+    resp.redirect("/voice/no-input")
+    return str(resp)
+
+def _render_menu_response(config, digit):
     resp = VoiceResponse()
     ctx = _build_context(config)
     
     if digit == "1": # Repairs
         prompt = _get_prompt(config, "repair_prompt", ctx)
-        resp.say(prompt, voice="alice")
+        _say(resp, prompt)
         resp.record(max_length=120, timeout=5, play_beep=True, trim="trim-silence",
                     recording_status_callback="/voice/recording-status",
                     recording_status_callback_method="POST",
@@ -81,41 +164,40 @@ def generate_menu_response(config, digit):
                     
     elif digit == "2": # Accessories
         prompt = _get_prompt(config, "accessory_prompt", ctx)
-        resp.say(prompt, voice="alice")
+        _say(resp, prompt)
         resp.record(max_length=90, timeout=5, play_beep=True, trim="trim-silence",
                     recording_status_callback="/voice/recording-status",
                     recording_status_callback_method="POST",
                     action="/voice/recorded-thank-you")
                     
     elif digit == "3": # Hours
-        # Add hours to context specifically
-        ctx['HOURS'] = config.get("settings", {}).get("hours_text", "")
+        # {HOURS} is settings.hours_text (see build_format_context)
         prompt = _get_prompt(config, "hours_prompt", ctx)
-        resp.say(prompt, voice="alice")
+        _say(resp, prompt)
         resp.hangup()
         
     else: # Invalid
         prompt = _get_prompt(config, "invalid_prompt", ctx)
-        resp.say(prompt, voice="alice")
+        _say(resp, prompt)
         resp.hangup()
         
     return str(resp)
 
-def generate_no_input_response(config):
+def _render_no_input_response(config):
     resp = VoiceResponse()
     ctx = _build_context(config)
     prompt = _get_prompt(config, "no_input_prompt", ctx)
-    resp.say(prompt, voice="alice")
+    _say(resp, prompt)
     resp.hangup()
     return str(resp)
 
-def generate_thank_you_response(config=None):
+def _render_thank_you_response(config=None):
     # Support optional config for dynamic prompt
     text = "Thank you. We will review your message and call you back."
     if config:
         text = _get_prompt(config, "after_record_thanks") or text
         
     resp = VoiceResponse()
-    resp.say(text, voice="alice")
+    _say(resp, text)
     resp.hangup()
     return str(resp)
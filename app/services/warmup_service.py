@@ -0,0 +1,48 @@
+"""
+Cache warmup and startup preloading.
+Used by the app lifespan hook (before serving) and /internal/warmup (cron).
+"""
+from app.services import sheet_service, voice_service, prompt_audio_service
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+def warm_all_tenants():
+    """
+    Load every known tenant's config and precompile its TwiML
+    (rendering prompt audio first when PROMPT_AUDIO_ENABLED).
+    Returns (tenants_warmed, errors).
+    """
+    tenants_warmed = []
+    errors = []
+    
+    for tenant_id in sheet_service.TENANT_MAP.keys():
+        try:
+            config = sheet_service.get_tenant_config(tenant_id)
+            if config:
+                voice_service.precompile(config)
+                if settings.PROMPT_AUDIO_ENABLED:
+                    # Synthesize prompts queued by precompile, then recompile with <Play>
+                    prompt_audio_service.render_pending()
+                    voice_service.precompile(config)
+                tenants_warmed.append(tenant_id)
+                logger.info(f"Warmed cache for {tenant_id}")
+        except Exception as e:
+            errors.append({"tenant": tenant_id, "error": str(e)})
+            logger.error(f"Failed to warm cache for {tenant_id}: {e}")
+    
+    return tenants_warmed, errors
+
+def preload_sdks():
+    """
+    Import the SDKs only used on the background path (run in a worker thread
+    after startup) so the first recording doesn't pay for them on the event loop.
+    """
+    import openai  # noqa: F401
+    import requests  # noqa: F401
+    import sendgrid  # noqa: F401
+    if not settings.MOCK_MODE:
+        import gspread  # noqa: F401
+        import oauth2client.service_account  # noqa: F401
+    logger.info("Background SDKs preloaded")
@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+"""
+Bluefone IVR Benchmark Harness
+Measures performance budgets locally (MOCK_MODE, no network).
+
+Usage:
+    python scripts/benchmark.py startup [--runs 5]
+    python scripts/benchmark.py tenants [--count 1000] [--budget-mb 32]
+    python scripts/benchmark.py soak [--hours 8] [--calls-per-hour 300] [--callers 2000]
+
+Modes:
+    startup   Cold import time of app.main (fresh interpreter per run) and
+              time to first successful /voice/incoming after lifespan startup.
+              Exits 1 if a budget from app.core.config is exceeded.
+    tenants   Memory footprint of N tenant configs built from sheet_templates
+              (franchise-like: shared prompts, per-store name/address/recipients),
+              as TenantConfig vs. the previous plain nested dicts.
+              Exits 1 if the TenantConfig total exceeds --budget-mb.
+    soak      Weeks-between-restarts check: drives simulated calls (incoming, menu,
+              recording, call-status) through the full app with its background
+              loops, over --hours of simulated time (time.time/time.monotonic are
+              advanced between calls, so TTLs, digests, rings and retries age as
+              in production; OpenAI and email delivery are stubbed). Samples RSS,
+              tracemalloc, thread/task/logger counts and the size of every
+              module-level container in app.* (caches, queues, indexes), one
+              level deep into dict values (per-tenant indexes, metric rings).
+              Exits 1 if a cache exceeds its maxsize/maxlen, if an unbounded
+              container or traced memory keeps growing with traffic in the second
+              half of the run, or if RSS grows more than --max-rss-growth-mb.
+              Bounded caches must fill before the midpoint, so the trace LRU and
+              the repeat-caller index are shrunk (TRACE_MAX_CALLS=250,
+              REPEAT_CALLER_MAX_PER_TENANT=500) unless set in the environment;
+              if one is still filling in the second half the run is too short
+              and it exits 2 instead of reporting a leak. Reports the top
+              allocating call sites on the webhook and processing paths.
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import random
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault("MOCK_MODE", "TRUE")
+
+INCOMING_FORM = {"To": "+61400000000", "From": "+61400000001", "CallSid": "CAbenchmark"}
+
+def measure_import_ms() -> float:
+    """Import app.main in a fresh interpreter, return wall time in ms"""
+    code = (
+        "import time; t = time.perf_counter(); import app.main; "
+        "print((time.perf_counter() - t) * 1000)"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+def measure_first_call() -> dict:
+    """Boot the app in-process (runs lifespan preload) and time the first call"""
+    import logging
+    logging.disable(logging.INFO)
+    from fastapi.testclient import TestClient
+
+    boot = time.perf_counter()
+    from app.main import app
+    with TestClient(app) as client:
+        ready_ms = (time.perf_counter() - boot) * 1000
+        start = time.perf_counter()
+        resp = client.post("/voice/incoming", data=INCOMING_FORM)
+        first_call_ms = (time.perf_counter() - start) * 1000
+        ok = resp.status_code == 200 and "<Response>" in resp.text
+        startup = client.get("/internal/status").json().get("startup", {})
+
+    return {
+        "boot_to_ready_ms": round(ready_ms, 1),
+        "first_call_ms": round(first_call_ms, 1),
+        "first_call_ok": ok,
+        "preload_ms": startup.get("preload_ms")
+    }
+
+def run_startup(args) -> int:
+    from app.core.config import settings
+
+    samples = [measure_import_ms() for _ in range(args.runs)]
+    result = {
+        "import_ms": {
+            "median": round(statistics.median(samples), 1),
+            "max": round(max(samples), 1),
+            "samples": [round(s, 1) for s in samples]
+        },
+        **measure_first_call()
+    }
+
+    failures = []
+    if settings.IMPORT_BUDGET_MS and result["import_ms"]["median"] > settings.IMPORT_BUDGET_MS:
+        failures.append(f"import {result['import_ms']['median']}ms > {settings.IMPORT_BUDGET_MS}ms")
+    if settings.PRELOAD_BUDGET_MS and (result["preload_ms"] or 0) > settings.PRELOAD_BUDGET_MS:
+        failures.append(f"preload {result['preload_ms']}ms > {settings.PRELOAD_BUDGET_MS}ms")
+    if settings.FIRST_CALL_BUDGET_MS and result["first_call_ms"] > settings.FIRST_CALL_BUDGET_MS:
+        failures.append(f"first call {result['first_call_ms']}ms > {settings.FIRST_CALL_BUDGET_MS}ms")
+    if not result["first_call_ok"]:
+        failures.append("first call failed")
+
+    result["budget_failures"] = failures
+    print(json.dumps(result, indent=2))
+    return 1 if failures else 0
+
+def _franchise_rows(index: int, templates: dict) -> dict:
+    """Template rows with the per-store fields changed, as a store's sheet would be"""
+    per_store = {
+        "tenant_id": f"bluefone_store{index}",
+        "store_name": f"Bluefone Store {index}",
+        "address_line": f"Shop {index}, {100 + index} Example Road, Brisbane QLD 4000",
+        "email_recipients": f"owner{index}@email.com,staff{index}@email.com",
+    }
+    settings_rows = [
+        {**row, "value": per_store.get(row.get("key"), row.get("value"))}
+        for row in templates["settings"]
+    ]
+    # Fresh string objects, as parsed from each sheet download
+    copy = lambda rows: [{"".join(k): "".join(v) for k, v in row.items() if k} for row in rows]
+    return {
+        "settings": copy(settings_rows),
+        "schedule": copy(templates["schedule"]),
+        "prompts": copy(templates["prompts"]),
+        "repair_scope": copy(templates["repair_scope"])
+    }
+
+def _legacy_config(rows: dict) -> dict:
+    """Config shape before TenantConfig (plain nested dicts)"""
+    return {
+        "settings": {r.get("key"): r.get("value") for r in rows["settings"]},
+        "schedule": rows["schedule"],
+        "prompts": {r.get("key"): r.get("text") for r in rows["prompts"]},
+        "repair_scope": {r.get("key"): r.get("value") for r in rows["repair_scope"]}
+    }
+
+def run_tenants(args) -> int:
+    import csv
+    import gc
+    import tracemalloc
+    from app.core import tenant_config
+    from app.services import sheet_service, local_config_service
+
+    templates = {}
+    for name in local_config_service.CSV_SHEETS:
+        with open(os.path.join(sheet_service.CSV_BASE_PATH, f"{name}.csv"), encoding="utf-8") as f:
+            templates[name] = list(csv.DictReader(f))
+
+    def measure(build):
+        """Build configs from freshly parsed rows; memory still held once the rows are gone"""
+        gc.collect()
+        tracemalloc.start()
+        configs = [build(_franchise_rows(i, templates)) for i in range(args.count)]
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return configs, retained
+
+    legacy, legacy_bytes = measure(_legacy_config)
+    legacy_deep = tenant_config._deep_size(legacy, set())
+    del legacy
+
+    build = lambda rows: tenant_config.from_rows(
+        rows["settings"], rows["schedule"], rows["prompts"], rows["repair_scope"])
+    configs, compact_bytes = measure(build)
+    report = tenant_config.footprint(configs)
+
+    result = {
+        "tenants": args.count,
+        "tenant_config": {
+            "deep_bytes": report["total_bytes"],
+            "per_tenant_bytes": report["per_tenant_bytes"],
+            "retained_bytes": compact_bytes,
+            "shared_sections": report["shared_sections"]
+        },
+        "legacy_dicts": {
+            "deep_bytes": legacy_deep,
+            "per_tenant_bytes": round(legacy_deep / args.count),
+            "retained_bytes": legacy_bytes,
+            "note": "excludes the per-request format context copies TenantConfig also removes"
+        },
+        "budget_mb": args.budget_mb
+    }
+    over = report["total_bytes"] > args.budget_mb * 1024 * 1024
+    result["budget_failures"] = [f"{report['total_bytes']} bytes > {args.budget_mb}MB"] if over else []
+    print(json.dumps(result, indent=2))
+    return 1 if over else 0
+
+class SimClock:
+    """Simulated wall/monotonic clock: real time plus an offset advanced by the driver"""
+
+    def __init__(self):
+        self.offset = 0.0
+        self._time, self._monotonic = time.time, time.monotonic
+
+    def install(self):
+        # Before app imports: cachetools binds time.monotonic as the TTL timer default
+        time.time = lambda: self._time() + self.offset
+        time.monotonic = lambda: self._monotonic() + self.offset
+
+    def uninstall(self):
+        time.time, time.monotonic = self._time, self._monotonic
+
+    def advance(self, seconds: float):
+        self.offset += seconds
+
+# Allocation sites are attributed to the innermost app frame and classified by
+# the first of these found anywhere in the traceback
+WEBHOOK_MARKERS = ("app/api/",)
+PROCESSING_MARKERS = ("processing_service.py", "pipeline_service.py", "outbox_service.py",
+                      "ai_service.py", "digest_service.py", "email_service.py")
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1048576, 1)
+    except (OSError, ValueError):
+        import resource
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)  # peak on macOS/BSD
+
+# Per-value bounds enforced by code rather than declared by the container
+NESTED_BOUNDS = {"app.services.repeat_caller_service._index": "REPEAT_CALLER_MAX_PER_TENANT"}
+
+def _container_sizes() -> dict:
+    """name -> (len, bound) for every module-level container in app.*
+
+    Values of unbounded dicts that are containers themselves (per-tenant
+    indexes, metric rings) are walked one level: bounded ones are listed as
+    name[key], the unbounded ones summed as name[*].
+    """
+    from collections import deque
+    from collections.abc import MutableMapping, MutableSequence, MutableSet
+    from app.core.config import settings
+    kinds = (MutableMapping, MutableSequence, MutableSet, deque)
+    sizes = {}
+    for module_name, module in list(sys.modules.items()):
+        if not module_name.startswith("app.") or module is None:
+            continue
+        for attr, value in list(vars(module).items()):
+            if attr.startswith("__") or isinstance(value, type):
+                continue
+            if isinstance(value, kinds):
+                name = f"{module_name}.{attr}"
+                bound = getattr(value, "maxsize", None) or getattr(value, "maxlen", None)
+                sizes[name] = (len(value), bound)
+                if bound or not isinstance(value, MutableMapping):
+                    continue  # values of a bounded cache are bounded by it
+                nested_total, nested_count = 0, 0
+                for key, item in list(value.items()):
+                    if not isinstance(item, kinds):
+                        continue
+                    item_bound = (getattr(item, "maxsize", None) or getattr(item, "maxlen", None)
+                                  or getattr(settings, NESTED_BOUNDS.get(name, ""), None))
+                    if item_bound:
+                        sizes[f"{name}[{key!r}]"] = (len(item), item_bound)
+                    else:
+                        nested_total += len(item)
+                        nested_count += 1
+                if nested_count:
+                    sizes[f"{name}[*]"] = (nested_total, None)
+    return sizes
+
+def _sample(calls: int, clock, client) -> dict:
+    import gc
+    import logging
+    import threading
+    import tracemalloc
+
+    async def task_count():
+        import asyncio
+        return len(asyncio.all_tasks())
+
+    gc.collect()
+    return {
+        "calls": calls,
+        "sim_hours": round(clock.offset / 3600, 2),
+        "rss_mb": _rss_mb(),
+        "traced_mb": round(tracemalloc.get_traced_memory()[0] / 1048576, 2),
+        "threads": threading.active_count(),
+        "tasks": client.portal.call(task_count),
+        "loggers": len(logging.Logger.manager.loggerDict),
+        "containers": _container_sizes()
+    }
+
+def _allocation_sites(stats, top: int) -> dict:
+    """Group tracemalloc statistics by innermost app/ frame, split by path"""
+    app_dir = os.path.join(ROOT, "app") + os.sep
+    sites = {"webhook": {}, "processing": {}, "other": {}}
+    for stat in stats:
+        frames = [frame.filename for frame in stat.traceback]
+        path = "other"
+        for markers, name in ((WEBHOOK_MARKERS, "webhook"), (PROCESSING_MARKERS, "processing")):
+            if any(m in filename for filename in frames for m in markers):
+                path = name
+                break
+        site = next((f"{os.path.relpath(frame.filename, ROOT)}:{frame.lineno}"
+                     for frame in reversed(stat.traceback) if frame.filename.startswith(app_dir)), None)
+        if site is None:
+            continue
+        size = getattr(stat, "size_diff", stat.size)
+        count = getattr(stat, "count_diff", stat.count)
+        entry = sites[path].setdefault(site, [0, 0])
+        entry[0] += size
+        entry[1] += count
+    return {
+        path: [{"site": site, "kb": round(size / 1024, 1), "blocks": count}
+               for site, (size, count) in sorted(entries.items(), key=lambda kv: -kv[1][0])[:top]]
+        for path, entries in sites.items()
+    }
+
+def _simulate_call(client, rng, index: int, callers: list):
+    """One call's webhooks: incoming, menu, then a voicemail for some of them"""
+    from_number = rng.choice(callers) if rng.random() < 0.7 else f"+614{rng.randrange(10**8):08d}"
+    call_sid = f"CAsoak{index:026d}"
+    base = {"To": INCOMING_FORM["To"], "From": from_number, "CallSid": call_sid}
+    client.post("/voice/incoming", data=base)
+    digits = rng.choice("1111223459")
+    client.post("/voice/menu", data={**base, "Digits": digits})
+    duration = rng.randrange(20, 300)
+    if digits in "12" and rng.random() < 0.5:
+        client.post("/voice/recording-status", data={
+            **base,
+            "RecordingSid": f"REsoak{index:026d}",
+            "RecordingUrl": f"http://localhost/recordings/REsoak{index:026d}",
+            "RecordingDuration": str(rng.randrange(5, 90))
+        })
+    client.post("/voice/call-status", data={**base, "CallStatus": "completed", "CallDuration": str(duration)})
+
+def _install_soak_stubs(counts: dict):
+    """OpenAI and email delivery without network (varied output, like real traffic)"""
+    from app.core.config import settings
+    from app.services import ai_service, email_service
+
+    words = "screen battery cracked quote pickup tomorrow warranty charger case iphone samsung".split()
+
+    def transcribe(url, save_path=None, recording_sid=None):
+        rng = random.Random(recording_sid or url)
+        return "Hi, " + " ".join(rng.choice(words) for _ in range(rng.randrange(8, 80))) + "."
+
+    def summarize(text):
+        return f"Caller asked about {text.split()[2] if len(text.split()) > 2 else 'a repair'}."
+
+    def deliver_email(recipients, subject, body):
+        counts["emails"] += 1
+        return {"ok": True, "status": 202, "retry_after": None, "error": None}
+
+    settings.OPENAI_API_KEY = settings.OPENAI_API_KEY or "soak"
+    settings.SENDGRID_API_KEY = ""
+    ai_service.transcribe_audio_from_url = transcribe
+    ai_service.generate_summary = summarize
+    email_service.deliver_email = deliver_email
+
+def _wait_idle(timeout: float = 30.0):
+    """Let the pipeline and outbox finish queued work (real time)"""
+    from app.services import pipeline_service, outbox_service
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        stats = pipeline_service.get_stats()
+        if not stats["depth"] and not stats["running"] and not outbox_service.get_stats().get("pending"):
+            return True
+        time.sleep(0.05)
+    return False
+
+def run_soak(args) -> int:
+    clock = SimClock()
+    clock.install()
+    os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="bluefone-soak-")
+    os.environ.setdefault("TRACE_MAX_CALLS", "250")
+    os.environ.setdefault("REPEAT_CALLER_MAX_PER_TENANT", "500")
+
+    import logging
+    import tracemalloc
+    # Keep INFO logging on (it is part of the steady state) but discard the output
+    logging.basicConfig(level=logging.INFO, stream=open(os.devnull, "w"),
+                        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    counts = {"emails": 0}
+    _install_soak_stubs(counts)
+    rng = random.Random(args.seed)
+    callers = [f"+614{rng.randrange(10**8):08d}" for _ in range(args.callers)]
+    total = int(args.hours * args.calls_per_hour)
+    step = 3600.0 / args.calls_per_hour
+    sample_every = max(1, total // args.samples)
+    mid_call = total // 2
+    if not 0 <= args.warmup < 0.5 or total < 10:
+        print("need --warmup below 0.5 and at least 10 simulated calls")
+        return 2
+
+    samples = []
+    started = time.perf_counter()
+    with TestClient(app) as client:
+        for i in range(total):
+            _simulate_call(client, rng, i, callers)
+            clock.advance(step)
+            if i == int(total * args.warmup):
+                # Trace from steady state on (tracing the warmup only slows it down)
+                _wait_idle()
+                tracemalloc.start(args.frames)
+                samples.append(_sample(i, clock, client))
+            elif i == mid_call:
+                _wait_idle()
+                mid_snapshot = tracemalloc.take_snapshot()
+                samples.append(_sample(i, clock, client))
+            elif i % sample_every == 0:
+                samples.append(_sample(i, clock, client))
+        idle = _wait_idle()
+        samples.append(_sample(total, clock, client))
+        end_snapshot = tracemalloc.take_snapshot()
+        status = client.get("/internal/status").json()
+    tracemalloc.stop()
+    clock.uninstall()
+    wall = time.perf_counter() - started
+
+    failures = []
+    mid = next(s for s in samples if s["calls"] == mid_call)
+    end = samples[-1]
+    calls_second_half = end["calls"] - mid["calls"]
+
+    # Declared bounds must hold at every sample
+    for sample in samples:
+        for name, (size, bound) in sample["containers"].items():
+            if bound and size > bound:
+                failures.append(f"{name} holds {size} > bound {bound} at {sample['sim_hours']}h")
+    # Bounded caches still filling after the midpoint make second-half growth
+    # meaningless: that is a setup problem (run too short), not a leak
+    filling = {}
+    for name, (size, bound) in end["containers"].items():
+        before = mid["containers"].get(name, (0, None))[0]
+        if bound and before < bound and size > before:
+            filling[name] = {"mid": before, "end": size, "bound": bound}
+    setup_errors = [f"bounded caches not yet full at midpoint ({', '.join(filling)}), "
+                    f"run longer / more calls per hour"] if filling else []
+    # Unbounded containers must stop growing once traffic is steady
+    growing = {}
+    for name, (size, bound) in end["containers"].items():
+        before = mid["containers"].get(name, (0, None))[0]
+        if not bound and size - before >= args.max_entries_per_call * calls_second_half and size > before:
+            growing[name] = {"mid": before, "end": size}
+            failures.append(f"{name} grew {before} -> {size} over the second half")
+    traced_per_call = (end["traced_mb"] - mid["traced_mb"]) * 1048576 / max(calls_second_half, 1)
+    if traced_per_call > args.max_bytes_per_call and not setup_errors:
+        failures.append(f"traced memory grows {traced_per_call:.0f} bytes/call in the second half")
+    rss_growth = end["rss_mb"] - mid["rss_mb"]
+    if rss_growth > args.max_rss_growth_mb and not setup_errors:
+        failures.append(f"RSS grew {rss_growth:.1f}MB over the second half")
+    for key in ("threads", "tasks", "loggers"):
+        if end[key] > mid[key]:
+            failures.append(f"{key} grew {mid[key]} -> {end[key]} over the second half")
+    if not idle:
+        failures.append("pipeline/outbox did not drain at the end")
+
+    def largest(containers):
+        ranked = sorted(containers.items(), key=lambda kv: -kv[1][0])[:args.top]
+        return {name: {"size": size, "bound": bound} for name, (size, bound) in ranked}
+
+    result = {
+        "sim_hours": args.hours,
+        "calls": total,
+        "wall_seconds": round(wall, 1),
+        "calls_per_second": round(total / max(wall, 1e-9), 1),
+        "emails": counts["emails"],
+        "pipeline": status.get("pipeline", {}).get("counters"),
+        "timeline": [{k: v for k, v in s.items() if k != "containers"} for s in samples],
+        "second_half": {
+            "traced_bytes_per_call": round(traced_per_call, 1),
+            "rss_growth_mb": round(rss_growth, 1),
+            "growing_containers": growing,
+            "filling_caches": filling
+        },
+        "largest_containers": largest(end["containers"]),
+        "top_allocations": {
+            "retained": _allocation_sites(end_snapshot.statistics("traceback"), args.top),
+            "second_half_growth": _allocation_sites(
+                [s for s in end_snapshot.compare_to(mid_snapshot, "traceback") if s.size_diff > 0], args.top)
+        },
+        "setup_errors": setup_errors,
+        "budget_failures": failures
+    }
+    print(json.dumps(result, indent=2))
+    if failures:
+        return 1
+    return 2 if setup_errors else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Bluefone IVR Benchmark Harness")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    p_startup = sub.add_parser("startup", help="Import time and time-to-first-call budgets")
+    p_startup.add_argument("--runs", type=int, default=5, help="Cold import samples")
+
+    p_tenants = sub.add_parser("tenants", help="Per-tenant config memory footprint")
+    p_tenants.add_argument("--count", type=int, default=1000, help="Tenants to load")
+    p_tenants.add_argument("--budget-mb", type=float, default=32, help="Max total config memory")
+
+    p_soak = sub.add_parser("soak", help="Long-running memory/state growth check")
+    p_soak.add_argument("--hours", type=float, default=8, help="Simulated hours of traffic")
+    p_soak.add_argument("--calls-per-hour", type=float, default=300)
+    p_soak.add_argument("--callers", type=int, default=2000, help="Repeat caller pool (30%% of calls are new numbers)")
+    p_soak.add_argument("--seed", type=int, default=1)
+    p_soak.add_argument("--warmup", type=float, default=0.25, help="Untraced fraction of the run before steady state (< 0.5)")
+    p_soak.add_argument("--samples", type=int, default=24, help="Timeline samples")
+    p_soak.add_argument("--frames", type=int, default=8, help="tracemalloc traceback depth")
+    p_soak.add_argument("--top", type=int, default=10, help="Allocation sites / containers to report")
+    p_soak.add_argument("--max-bytes-per-call", type=float, default=256, help="Allowed traced growth per call")
+    p_soak.add_argument("--max-entries-per-call", type=float, default=0.25, help="Allowed container growth per call")
+    p_soak.add_argument("--max-rss-growth-mb", type=float, default=32)
+
+    args = parser.parse_args()
+    if args.mode == "soak":
+        sys.exit(run_soak(args))
+    if args.mode == "startup":
+        sys.exit(run_startup(args))
+    if args.mode == "tenants":
+        sys.exit(run_tenants(args))
+
+if __name__ == "__main__":
+    main()
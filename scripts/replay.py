@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Bluefone IVR Webhook Replay
+Re-drives a webhook capture (CAPTURE_ENABLED, see app/services/capture_service.py)
+against a MOCK_MODE instance and reports latency distributions.
+
+Usage:
+    python scripts/replay.py data/capture/webhooks.jsonl [--target http://localhost:8000]
+        [--speed 1] [--limit N] [--concurrency 50] [--include-recordings]
+        [--save-baseline baseline.json] [--baseline baseline.json] [--max-regression 0.2]
+
+The target must be in MOCK_MODE without OpenAI/SendGrid keys (checked through
+/internal/status, --force skips the check). Otherwise replayed recordings would be
+transcribed and emailed for real. /voice/recording-status requests are skipped
+unless --include-recordings is given.
+
+Inter-arrival times are preserved (scaled by --speed; 0 = as fast as possible) and
+requests of one CallSid are sent strictly in captured order, each after the
+previous one completed. With --baseline, p50/p95/p99 per path are diffed against
+a saved report and the exit code is 1 if any p95 regressed by more than
+--max-regression (fraction).
+"""
+
+import sys
+import os
+import json
+import time
+import asyncio
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from urllib.request import urlopen, Request
+from urllib.error import URLError, HTTPError
+
+def load_capture(path: str, limit: int = None) -> list:
+    events = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                events.append(json.loads(line))
+    events.sort(key=lambda e: e["t"])
+    return events[:limit] if limit else events
+
+def post(url: str, form: dict, timeout: float) -> tuple[int, float]:
+    """POST a form, return (status, latency ms); status 0 = connection error"""
+    data = urlencode(form).encode()
+    req = Request(url, data=data, headers={"Content-Type": "application/x-www-form-urlencoded"})
+    start = time.perf_counter()
+    try:
+        with urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            status = resp.status
+    except HTTPError as e:
+        status = e.code
+    except (URLError, OSError):
+        status = 0
+    return status, (time.perf_counter() - start) * 1000
+
+def percentile(samples, q: float):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2)
+
+def distribution(samples) -> dict:
+    return {
+        "count": len(samples),
+        "p50": percentile(samples, 0.50),
+        "p90": percentile(samples, 0.90),
+        "p95": percentile(samples, 0.95),
+        "p99": percentile(samples, 0.99),
+        "max": round(max(samples), 2) if samples else None
+    }
+
+async def replay(events: list, args) -> dict:
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=args.concurrency))
+
+    # Per-CallSid sequences; requests without a CallSid are independent
+    calls = defaultdict(list)
+    for i, event in enumerate(events):
+        calls[event["f"].get("CallSid") or f"_{i}"].append(event)
+
+    t0 = events[0]["t"]
+    started = time.perf_counter()
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    schedule_lag = []
+
+    async def run_call(sequence):
+        for event in sequence:
+            due = (event["t"] - t0) / args.speed if args.speed > 0 else 0
+            delay = due - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            schedule_lag.append(max(0.0, -delay) * 1000)
+            status, ms = await asyncio.to_thread(post, args.target + event["p"], event["f"], args.timeout)
+            latencies[event["p"]].append(ms)
+            if status != 200:
+                errors[event["p"]] += 1
+
+    await asyncio.gather(*(run_call(sequence) for sequence in calls.values()))
+
+    return {
+        "requests": len(events),
+        "calls": len(calls),
+        "speed": args.speed,
+        "wall_seconds": round(time.perf_counter() - started, 1),
+        "captured_span_seconds": round(events[-1]["t"] - t0, 1),
+        "schedule_lag_ms": distribution(schedule_lag),
+        "overall": distribution([ms for samples in latencies.values() for ms in samples]),
+        "paths": {
+            path: {**distribution(samples), "errors": errors[path]}
+            for path, samples in sorted(latencies.items())
+        },
+        "captured": {
+            path: distribution([e["ms"] for e in events if e["p"] == path])
+            for path in sorted({e["p"] for e in events})
+        }
+    }
+
+def diff_baseline(report: dict, baseline: dict, max_regression: float) -> tuple[dict, list]:
+    """Per path p50/p95/p99 deltas; p95 regressions beyond max_regression are failures"""
+    diff, failures = {}, []
+    rows = {"overall": (report["overall"], baseline.get("overall", {}))}
+    for path, current in report["paths"].items():
+        rows[path] = (current, baseline.get("paths", {}).get(path, {}))
+    for name, (current, base) in rows.items():
+        entry = {}
+        for q in ("p50", "p95", "p99"):
+            if current.get(q) is None or not base.get(q):
+                continue
+            change = (current[q] - base[q]) / base[q]
+            entry[q] = {"baseline": base[q], "current": current[q], "change": f"{change:+.0%}"}
+            if q == "p95" and change > max_regression:
+                failures.append(f"{name} p95 {base[q]}ms -> {current[q]}ms ({change:+.0%})")
+        diff[name] = entry
+    return diff, failures
+
+def preflight(target: str) -> list:
+    """Reasons the target is unsafe to replay against (empty = OK)"""
+    try:
+        with urlopen(f"{target}/internal/status", timeout=10) as resp:
+            status = json.loads(resp.read().decode())
+    except Exception as e:
+        return [f"not reachable ({e})"]
+    problems = []
+    if not status.get("sheets", {}).get("mock_mode"):
+        problems.append("not in MOCK_MODE")
+    config = status.get("config", {})
+    if config.get("openai_configured"):
+        problems.append("OPENAI_API_KEY is set (recordings would be transcribed)")
+    if config.get("sendgrid_configured"):
+        problems.append("SENDGRID_API_KEY is set (reports would be emailed)")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Bluefone IVR Webhook Replay")
+    parser.add_argument("capture", help="Capture file (CAPTURE_PATH)")
+    parser.add_argument("--target", default=os.environ.get("REPLAY_TARGET", "http://localhost:8000"))
+    parser.add_argument("--speed", type=float, default=1.0, help="Time scale (2 = twice as fast, 0 = no delays)")
+    parser.add_argument("--limit", type=int, help="Replay only the first N requests")
+    parser.add_argument("--concurrency", type=int, default=50, help="Max requests in flight")
+    parser.add_argument("--timeout", type=float, default=15)
+    parser.add_argument("--save-baseline", help="Write this run's report here")
+    parser.add_argument("--baseline", help="Diff against a saved report")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed p95 increase vs baseline")
+    parser.add_argument("--include-recordings", action="store_true",
+                        help="Also replay /voice/recording-status (runs the recording pipeline)")
+    parser.add_argument("--force", action="store_true", help="Skip the MOCK_MODE / API key preflight")
+    args = parser.parse_args()
+    args.target = args.target.rstrip("/")
+
+    problems = [] if args.force else preflight(args.target)
+    if problems:
+        print(f"Refusing to replay against {args.target}: {'; '.join(problems)} (use --force to override)")
+        sys.exit(2)
+
+    events = load_capture(args.capture, args.limit)
+    if not args.include_recordings:
+        events = [e for e in events if e["p"] != "/voice/recording-status"]
+    if not events:
+        print("Capture is empty")
+        sys.exit(2)
+
+    report = asyncio.run(replay(events, args))
+
+    failures = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["baseline_diff"], failures = diff_baseline(report, json.load(f), args.max_regression)
+        report["regressions"] = failures
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({k: v for k, v in report.items() if k not in ("baseline_diff", "regressions")}, f, indent=2)
+
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
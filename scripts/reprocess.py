@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Bluefone IVR Bulk Reprocessing
+Runs old recordings through processing_service again (transcript + summary),
+e.g. after a transcription fix or a summary prompt change.
+
+Usage:
+    python scripts/reprocess.py --input recordings.csv --output results.jsonl
+    python scripts/reprocess.py --since 2026-10-01 [--until 2026-10-08] [--tenant bluefone_cannonhill] --send-emails
+        [--workers 8] [--transcription-rpm 50] [--summary-rpm 500] [--max-retries 5]
+        [--refresh transcript,summary] [--checkpoint PATH] [--restart] [--limit N]
+        [--stub [--stub-latency-ms 200]]
+
+Recordings come from either:
+    --input           CSV (with header) or JSON lines; call_sid and recording_url are
+                      required, tenant_id, to_number, recording_sid, from_number,
+                      menu_selection and duration are optional
+    --since/--until   "recording" events in the call history (DATA_DIR/calls.db),
+                      dates, ISO times or epoch seconds, optionally one --tenant
+
+Results go to --output (JSON lines: subject, transcript, summary, status) and/or,
+with --send-emails, out as report emails marked "reprocessed" (tenants in digest
+mode get them in their next digest). Workers are paced by the same OpenAI token
+buckets as the live pipeline; --transcription-rpm/--summary-rpm override the
+rates for this run and 429s are retried after the bucket's pause.
+
+Progress: each recording that finished cleanly is appended to the checkpoint file
+(default <output>.checkpoint, or data/reprocess/checkpoint.jsonl) and skipped when
+the same command is run again, so an interrupted run resumes where it stopped.
+Failed recordings are not checkpointed and are retried on the next run.
+--restart ignores the checkpoint.
+
+--refresh ignores cached transcripts/summaries (results.db) so they are recomputed.
+--stub replaces the OpenAI calls with local fakes (no network) to dry-run a large
+batch: worker pool, rate limits, checkpointing and output, without API cost.
+Stub reports are fake, so --stub cannot be combined with --send-emails.
+"""
+
+import sys
+import os
+import csv
+import json
+import time
+import asyncio
+import argparse
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from app.core.config import settings
+from app.services import (
+    processing_service, ai_service, rate_limit_service, result_cache_service,
+    cdr_service, sheet_service, outbox_service
+)
+
+TWILIO_RECORDING_URL = "https://api.twilio.com/2010-04-01/Accounts/{account}/Recordings/{sid}"
+FIELDS = ("call_sid", "recording_url", "tenant_id", "to_number", "recording_sid",
+          "from_number", "menu_selection", "duration")
+
+def parse_time(value: str) -> float:
+    """Epoch seconds from epoch / YYYY-MM-DD / ISO 8601 (naive = UTC)"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def load_input(path: str) -> list:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.endswith((".jsonl", ".json")):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    items = []
+    for row in rows:
+        item = {k: str(row[k]).strip() for k in FIELDS if row.get(k) not in (None, "")}
+        if not item.get("call_sid") or not item.get("recording_url"):
+            print(f"Skipping row without call_sid/recording_url: {row}", file=sys.stderr)
+            continue
+        items.append(item)
+    return items
+
+def load_history(start: float, end: float, tenant_id: str = None) -> list:
+    """Recordings from the call history, oldest first"""
+    items, cursor = [], None
+    while True:
+        page = cdr_service.query_events(tenant_id=tenant_id, event="recording", start=start, end=end,
+                                        limit=1000, cursor=cursor)
+        for event in page["events"]:
+            url = event.get("recording_url")
+            if not url and event.get("recording_sid") and settings.TWILIO_ACCOUNT_SID:
+                # Events recorded before recording_url was kept
+                url = TWILIO_RECORDING_URL.format(account=settings.TWILIO_ACCOUNT_SID, sid=event["recording_sid"])
+            if not url:
+                print(f"Skipping {event['call_sid']}: no recording URL", file=sys.stderr)
+                continue
+            items.append({
+                "call_sid": event["call_sid"],
+                "recording_url": url,
+                "tenant_id": event.get("tenant_id"),
+                "recording_sid": event.get("recording_sid"),
+                "from_number": event.get("from_number"),
+                "menu_selection": event.get("outcome"),
+                "duration": event.get("duration")
+            })
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    items.reverse()
+    return items
+
+def item_key(item: dict) -> str:
+    return item.get("recording_sid") or f"{item['call_sid']}|{item['recording_url']}"
+
+def load_checkpoint(path: str) -> set:
+    done = set()
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)["key"])
+                except (ValueError, KeyError):
+                    continue  # torn last line of an interrupted run
+    return done
+
+def install_stub(latency_ms: float):
+    """Local stand-ins for the OpenAI calls (run in worker threads like the real ones)"""
+    def transcribe(url, save_path=None, recording_sid=None):
+        time.sleep(latency_ms / 1000)
+        return f"Stub transcript of {recording_sid or url}. Caller asked about a screen repair and a quote."
+
+    def summarize(text):
+        time.sleep(latency_ms / 1000)
+        return f"Stub summary ({len(text)} chars)."
+
+    ai_service.transcribe_audio_from_url = transcribe
+    ai_service.generate_summary = summarize
+    settings.OPENAI_API_KEY = settings.OPENAI_API_KEY or "stub"
+
+def failed(result: dict) -> bool:
+    transcript = (result or {}).get("transcript") or ""
+    return transcript.startswith(("Error", "Transcription error"))
+
+async def run(items: list, args) -> dict:
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=args.workers))
+    output = open(args.output, "a", encoding="utf-8") if args.output else None
+    os.makedirs(os.path.dirname(args.checkpoint) or ".", exist_ok=True)
+    checkpoint = open(args.checkpoint, "a", encoding="utf-8")
+
+    pending = iter(items)
+    counts = {"ok": 0, "error": 0, "retries": 0}
+    started = time.perf_counter()
+    last_report = started
+
+    def report_progress(force=False):
+        nonlocal last_report
+        now = time.perf_counter()
+        if not force and now - last_report < 5:
+            return
+        last_report = now
+        finished = counts["ok"] + counts["error"]
+        rate = finished / max(now - started, 1e-9)
+        eta = (len(items) - finished) / rate if rate else 0
+        print(f"{finished}/{len(items)} done ({counts['error']} failed), {rate:.1f}/s, eta {eta:.0f}s",
+              file=sys.stderr)
+
+    tenants = {}  # to_number -> tenant_id
+
+    async def process(item: dict) -> dict:
+        tenant_id = item.get("tenant_id")
+        if not tenant_id:
+            to_number = item.get("to_number")
+            if to_number not in tenants:
+                tenants[to_number] = sheet_service.resolve_tenant_by_phone(to_number)
+            tenant_id = tenants[to_number]
+        for attempt in range(args.max_retries + 1):
+            try:
+                result = await processing_service.process_recording(
+                    tenant_id=tenant_id,
+                    recording_url=item["recording_url"],
+                    from_number=item.get("from_number"),
+                    call_sid=item["call_sid"],
+                    duration=item.get("duration") or "N/A",
+                    menu_selection=item.get("menu_selection") or "unknown",
+                    recording_sid=item.get("recording_sid"),
+                    mode="reprocess",
+                    deliver=args.send_emails
+                )
+            except ai_service.RateLimited as e:
+                # The bucket is already paused for Retry-After; the next acquire waits
+                if attempt == args.max_retries:
+                    return {"tenant_id": tenant_id, "status": "error", "error": f"rate limited: {e}"}
+                counts["retries"] += 1
+                continue
+            except Exception as e:
+                return {"tenant_id": tenant_id, "status": "error", "error": f"{type(e).__name__}: {e}"}
+            if result is None:
+                return {"tenant_id": tenant_id, "status": "error", "error": "tenant has no email recipients"}
+            return {"tenant_id": tenant_id, "status": "error" if failed(result) else "ok", **result}
+
+    async def worker():
+        for item in pending:  # shared iterator: each item goes to exactly one worker
+            t = time.perf_counter()
+            outcome = await process(item)
+            counts[outcome["status"]] += 1
+            if output:
+                line = {"call_sid": item["call_sid"], "recording_sid": item.get("recording_sid"),
+                        "ms": round((time.perf_counter() - t) * 1000, 1), **outcome}
+                output.write(json.dumps(line) + "\n")
+                output.flush()
+            if outcome["status"] == "ok":
+                checkpoint.write(json.dumps({"key": item_key(item), "t": round(time.time(), 1)}) + "\n")
+                checkpoint.flush()
+            report_progress()
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, args.workers))))
+    finally:
+        report_progress(force=True)
+        checkpoint.close()
+        if output:
+            output.close()
+
+    outbox_pending = None
+    if args.send_emails:
+        outbox_pending = await asyncio.to_thread(outbox_service.drain, args.email_timeout)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "processed": counts["ok"] + counts["error"],
+        "ok": counts["ok"],
+        "failed": counts["error"],
+        "rate_limit_retries": counts["retries"],
+        "seconds": round(elapsed, 1),
+        "per_second": round((counts["ok"] + counts["error"]) / max(elapsed, 1e-9), 1),
+        "outbox_pending": outbox_pending,
+        "rate_limits": rate_limit_service.get_stats(),
+        "result_cache": {k: v for k, v in result_cache_service.get_stats().items() if "refreshed" in k or "hit" in k}
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Bluefone IVR Bulk Reprocessing")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="CSV or JSON lines of recordings")
+    source.add_argument("--since", help="Reprocess recordings from the call history since this time")
+    parser.add_argument("--until", help="End of the --since range (default now)")
+    parser.add_argument("--tenant", help="Only this tenant's recordings (with --since)")
+    parser.add_argument("--limit", type=int, help="Process at most N recordings this run")
+    parser.add_argument("--output", help="Append results here (JSON lines)")
+    parser.add_argument("--send-emails", action="store_true", help="Email the new reports")
+    parser.add_argument("--email-timeout", type=float, default=300, help="Max seconds to deliver queued emails")
+    parser.add_argument("--workers", type=int, default=settings.PIPELINE_CONCURRENCY)
+    parser.add_argument("--transcription-rpm", type=float, help="Override OPENAI_TRANSCRIPTION_RPM")
+    parser.add_argument("--summary-rpm", type=float, help="Override OPENAI_SUMMARY_RPM")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries per recording after a 429")
+    parser.add_argument("--refresh", default="", help="Ignore cached results: transcript, summary or both (comma separated)")
+    parser.add_argument("--checkpoint", help="Progress file (default <output>.checkpoint)")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint, process everything")
+    parser.add_argument("--stub", action="store_true", help="Fake OpenAI calls locally (dry run)")
+    parser.add_argument("--stub-latency-ms", type=float, default=200)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if not args.output and not args.send_emails:
+        parser.error("nothing to do: pass --output and/or --send-emails")
+    if args.stub and args.send_emails:
+        parser.error("--stub writes fake transcripts: use --output, not --send-emails")
+    refresh = [kind.strip() for kind in args.refresh.split(",") if kind.strip()]
+    if set(refresh) - {"transcript", "summary"}:
+        parser.error("--refresh takes transcript, summary or transcript,summary")
+
+    import logging
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    args.checkpoint = args.checkpoint or (
+        f"{args.output}.checkpoint" if args.output else os.path.join(settings.DATA_DIR, "reprocess", "checkpoint.jsonl")
+    )
+    if args.stub:
+        install_stub(args.stub_latency_ms)
+    if args.transcription_rpm:
+        rate_limit_service.buckets["transcription"] = rate_limit_service.TokenBucket("transcription", args.transcription_rpm)
+    if args.summary_rpm:
+        rate_limit_service.buckets["summary"] = rate_limit_service.TokenBucket("summary", args.summary_rpm)
+
+    if args.input:
+        items = load_input(args.input)
+    else:
+        end = parse_time(args.until) if args.until else time.time()
+        items = load_history(parse_time(args.since), end, args.tenant)
+
+    # Drop duplicates and anything already done in a previous run
+    done = set() if args.restart else load_checkpoint(args.checkpoint)
+    seen, todo = set(), []
+    for item in items:
+        key = item_key(item)
+        if key not in seen and key not in done:
+            seen.add(key)
+            todo.append(item)
+    todo = todo[:args.limit] if args.limit else todo
+    print(f"{len(items)} recordings, {len(items) - len(todo)} skipped (duplicate/done/limit), "
+          f"{len(todo)} to process", file=sys.stderr)
+
+    with result_cache_service.refreshing(*refresh):
+        summary = asyncio.run(run(todo, args))
+
+    print(json.dumps(summary, indent=2))
+    sys.exit(1 if summary.get("failed") else 0)
+
+if __name__ == "__main__":
+    main()
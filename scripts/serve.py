@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Bluefone IVR Supervisor
+Holds the listening socket and runs the app in a uvicorn worker process that
+inherits it, so a restart never closes the port: the new worker is started on
+the same socket and is warm before the old one is told to drain.
+
+Usage:
+    python scripts/serve.py [--host 0.0.0.0] [--port 8000] [--graceful-timeout 15]
+        [--ready-timeout 120] [--stop-timeout 60] [-- extra uvicorn args]
+
+Signals:
+    SIGHUP            zero-downtime restart (systemctl reload): start a new worker,
+                      wait until its lifespan preload finished, then SIGTERM the old
+                      one, which drains (app/services/lifecycle_service.py). If the
+                      new worker does not become ready, the old one keeps serving.
+    SIGTERM / SIGINT  drain the worker and exit
+A worker that exits on its own is restarted (with backoff).
+
+Under systemd socket activation (scripts/bluefone-ivr.socket) the socket is
+inherited from systemd (LISTEN_FDS), so even a restart of the supervisor itself
+only queues connections in the kernel backlog instead of refusing them.
+"""
+
+import sys
+import os
+import time
+import select
+import signal
+import socket
+import argparse
+import threading
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SD_LISTEN_FDS_START = 3
+
+def log(message: str):
+    print(f"[serve {os.getpid()}] {message}", flush=True)
+
+def listen_socket(host: str, port: int) -> socket.socket:
+    if os.environ.get("LISTEN_FDS") and os.environ.get("LISTEN_PID") == str(os.getpid()):
+        sock = socket.socket(fileno=SD_LISTEN_FDS_START)
+        log(f"Using socket from systemd: {sock.getsockname()}")
+    else:
+        family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        sock.listen(2048)
+        log(f"Listening on {host}:{port}")
+    for name in ("LISTEN_FDS", "LISTEN_PID", "LISTEN_FDNAMES"):
+        os.environ.pop(name, None)
+    sock.set_inheritable(True)
+    return sock
+
+class Worker:
+    """One uvicorn process serving the shared socket"""
+
+    def __init__(self, sock: socket.socket, args):
+        ready_read, ready_write = os.pipe()
+        cmd = [sys.executable, "-m", "uvicorn", args.app,
+               "--fd", str(sock.fileno()),
+               "--timeout-graceful-shutdown", str(args.graceful_timeout)] + args.uvicorn_args
+        env = dict(os.environ, BLUEFONE_READY_FD=str(ready_write))
+        # Own session: a terminal Ctrl-C reaches only the supervisor, which drains the worker
+        self.proc = subprocess.Popen(cmd, cwd=ROOT, env=env, pass_fds=(sock.fileno(), ready_write),
+                                     start_new_session=True)
+        os.close(ready_write)
+        self.ready_fd = ready_read
+        log(f"Started worker {self.proc.pid}")
+
+    @property
+    def pid(self) -> int:
+        return self.proc.pid
+
+    def wait_ready(self, timeout: float) -> bool:
+        """True once the app signalled readiness (lifespan preload done)"""
+        deadline = time.monotonic() + timeout
+        try:
+            while time.monotonic() < deadline and self.proc.poll() is None:
+                readable, _, _ = select.select([self.ready_fd], [], [], 0.5)
+                if readable:
+                    return os.read(self.ready_fd, 16).startswith(b"ready")
+            return False
+        finally:
+            os.close(self.ready_fd)
+
+    def stop(self, timeout: float):
+        """SIGTERM (drain), SIGKILL after timeout"""
+        if self.proc.poll() is not None:
+            return
+        self.proc.send_signal(signal.SIGTERM)
+        try:
+            self.proc.wait(timeout)
+            log(f"Worker {self.pid} exited ({self.proc.returncode})")
+        except subprocess.TimeoutExpired:
+            log(f"Worker {self.pid} did not drain within {timeout}s, killing")
+            self.proc.kill()
+            self.proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Bluefone IVR Supervisor")
+    parser.add_argument("--app", default="app.main:app")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--graceful-timeout", type=int, default=15, help="In-flight request grace (uvicorn)")
+    parser.add_argument("--ready-timeout", type=float, default=120, help="Max seconds for a new worker to warm up")
+    parser.add_argument("--stop-timeout", type=float, default=60, help="Max seconds for a worker to drain")
+    parser.add_argument("uvicorn_args", nargs="*", help="Passed to uvicorn (after --)")
+    args = parser.parse_args()
+
+    sock = listen_socket(args.host, args.port)
+    signals = []
+    for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda signum, frame: signals.append(signum))
+
+    current = Worker(sock, args)
+    if not current.wait_ready(args.ready_timeout):
+        log("Worker did not become ready, serving anyway")
+    backoff = 1.0
+
+    while True:
+        time.sleep(0.2)
+        while signals:
+            signum = signals.pop(0)
+            if signum == signal.SIGHUP:
+                log("Reload: starting replacement worker")
+                replacement = Worker(sock, args)
+                if replacement.wait_ready(args.ready_timeout):
+                    old, current = current, replacement
+                    # The old worker drains in the background; the new one already serves
+                    threading.Thread(target=old.stop, args=(args.stop_timeout,), daemon=True).start()
+                    log(f"Worker {current.pid} took over from {old.pid}")
+                else:
+                    log("Replacement worker not ready, keeping the current one")
+                    replacement.stop(args.stop_timeout)
+            else:
+                log(f"{signal.Signals(signum).name}: draining worker {current.pid}")
+                current.stop(args.stop_timeout)
+                for thread in threading.enumerate():
+                    if thread is not threading.current_thread():
+                        thread.join(args.stop_timeout)
+                sys.exit(0)
+
+        if current.proc.poll() is not None:
+            log(f"Worker {current.pid} exited unexpectedly ({current.proc.returncode}), restarting in {backoff:.0f}s")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+            current = Worker(sock, args)
+            if current.wait_ready(args.ready_timeout):
+                backoff = 1.0
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+/**
+ * Bluefone IVR - Google Apps Script cache invalidation trigger
+ *
+ * Pushes owner edits to the IVR within seconds instead of waiting
+ * for the Sheets cache TTL to expire.
+ *
+ * Installation:
+ *   1. Open the tenant spreadsheet > Extensions > Apps Script
+ *   2. Paste this file and edit IVR_URL / IVR_TOKEN below
+ *   3. Triggers > Add Trigger > onSheetEdit, "From spreadsheet", "On edit"
+ *      (must be an installable trigger: simple onEdit cannot call UrlFetchApp)
+ *
+ * IVR_TOKEN must match INVALIDATE_TOKEN in the server .env
+ */
+
+// ===== EDIT THESE =====
+var IVR_URL = "https://your-domain.com/internal/invalidate";
+var IVR_TOKEN = "";
+// ======================
+
+function onSheetEdit(e) {
+  var spreadsheetId = e && e.source ? e.source.getId() : SpreadsheetApp.getActive().getId();
+
+  try {
+    var response = UrlFetchApp.fetch(IVR_URL, {
+      method: "post",
+      contentType: "application/json",
+      headers: { "X-Invalidate-Token": IVR_TOKEN },
+      payload: JSON.stringify({ spreadsheet_id: spreadsheetId }),
+      muteHttpExceptions: true
+    });
+    console.log("IVR invalidate: " + response.getResponseCode() + " " + response.getContentText());
+  } catch (err) {
+    // Never block the owner's edit; the TTL still catches up eventually
+    console.error("IVR invalidate failed: " + err);
+  }
+}
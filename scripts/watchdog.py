@@ -1,13 +1,20 @@
 #!/usr/bin/env python3
 """
 Bluefone IVR Watchdog Script
-Run via cron every 5 minutes to monitor server health.
+Run via cron every 5 minutes to monitor server health,
+or as a long-running daemon with latency SLO tracking.
 
 Usage:
     python watchdog.py [--slack-webhook URL] [--email EMAIL]
+    python watchdog.py --daemon [--instance URL[=SERVICE]]... [--slo-p95-ms 500]
     
 Cron example:
     */5 * * * * /home/ubuntu/venv/bin/python /home/ubuntu/bluefone-ai-phone/scripts/watchdog.py
+
+Daemon mode probes /health, /internal/status and a synthetic /voice/incoming on
+every instance concurrently, tracks rolling p95 latency against the SLO, warms
+instances whose cache went cold, and alerts (or restarts, with --restart and a
+SERVICE name) on sustained failure or latency degradation.
 """
 
 import sys
@@ -15,13 +22,18 @@ import os
 import json
 import argparse
 import subprocess
+import asyncio
+import time
+from collections import deque
 from datetime import datetime
+from urllib.parse import urlencode
 from urllib.request import urlopen, Request
 from urllib.error import URLError, HTTPError
 
 # Configuration
 SERVER_URL = os.environ.get("WATCHDOG_SERVER_URL", "http://localhost:8000")
 HEALTH_ENDPOINT = f"{SERVER_URL}/health"
+READY_ENDPOINT = f"{SERVER_URL}/ready"
 STATUS_ENDPOINT = f"{SERVER_URL}/internal/status"
 WARMUP_ENDPOINT = f"{SERVER_URL}/internal/warmup"
 
@@ -56,6 +68,19 @@ def check_health() -> tuple[bool, str]:
     except Exception as e:
         return False, f"Error: {str(e)}"
 
+def check_ready() -> tuple[bool, dict]:
+    """Check readiness endpoint (503 with details while cold)"""
+    try:
+        with urlopen(READY_ENDPOINT, timeout=10) as response:
+            return True, json.loads(response.read().decode())
+    except HTTPError as e:
+        try:
+            return False, json.loads(e.read().decode())
+        except Exception:
+            return False, {"error": f"HTTP error: {e.code}"}
+    except Exception as e:
+        return False, {"error": str(e)}
+
 def get_status() -> dict:
     """Get detailed server status"""
     try:
@@ -74,12 +99,16 @@ def trigger_warmup() -> bool:
     except:
         return False
 
-def restart_service():
-    """Attempt to restart the service via systemd"""
-    log("Attempting to restart service...", "WARN")
+def restart_service(service_name: str = SERVICE_NAME):
+    """
+    Restart the service via systemd. reload-or-restart hands over to a fresh
+    worker without dropping calls when the unit supports reload (scripts/serve.py),
+    and falls back to a full restart otherwise.
+    """
+    log(f"Attempting to restart {service_name}...", "WARN")
     try:
         result = subprocess.run(
-            ["sudo", "systemctl", "restart", SERVICE_NAME],
+            ["sudo", "systemctl", "reload-or-restart", service_name],
             capture_output=True,
             timeout=30
         )
@@ -131,6 +160,161 @@ def send_email_alert(email: str, subject: str, body: str):
     except Exception as e:
         log(f"Failed to send email alert: {e}", "WARN")
 
+# ============================================
+# DAEMON MODE
+# ============================================
+
+# Synthetic call: tagged so the app can keep it out of call statistics
+SYNTHETIC_FORM = {
+    "To": os.environ.get("WATCHDOG_SYNTHETIC_TO", "+61400000000"),
+    "From": "+10000000000",
+}
+SYNTHETIC_HEADERS = {"X-Bluefone-Synthetic": "1"}
+
+def http_probe(url: str, data: dict = None, headers: dict = None, timeout: float = 10) -> tuple[int, float, bytes]:
+    """Blocking HTTP probe. Returns (status, latency_ms, body); status 0 = connection failure"""
+    start = time.perf_counter()
+    try:
+        req = Request(
+            url,
+            data=urlencode(data).encode() if data is not None else None,
+            headers=headers or {},
+            method="POST" if data is not None else "GET"
+        )
+        with urlopen(req, timeout=timeout) as response:
+            body = response.read()
+            return response.status, (time.perf_counter() - start) * 1000, body
+    except HTTPError as e:
+        return e.code, (time.perf_counter() - start) * 1000, e.read()
+    except Exception as e:
+        return 0, (time.perf_counter() - start) * 1000, str(e).encode()
+
+def p95(samples) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+
+class InstanceMonitor:
+    """Rolling probe state for one server instance"""
+
+    def __init__(self, url: str, service: str, args):
+        self.url = url.rstrip("/")
+        self.service = service
+        self.args = args
+        self.latency = {name: deque(maxlen=args.window) for name in ("health", "status", "synthetic")}
+        self.failures = 0         # consecutive liveness failures
+        self.slo_breaches = 0     # consecutive checks with p95 over SLO
+        self.last_alert = 0.0
+        self.last_restart = 0.0
+
+    async def probe(self, path: str, data: dict = None, headers: dict = None):
+        return await asyncio.to_thread(http_probe, f"{self.url}{path}", data, headers, self.args.timeout)
+
+    async def check(self):
+        health, status, synthetic = await asyncio.gather(
+            self.probe("/health"),
+            self.probe("/internal/status"),
+            self.probe("/voice/incoming", {**SYNTHETIC_FORM, "CallSid": f"CAwatchdog{int(time.time())}"},
+                       SYNTHETIC_HEADERS) if self.args.synthetic else asyncio.sleep(0, result=None)
+        )
+
+        # Liveness
+        if health[0] != 200:
+            self.failures += 1
+            log(f"[{self.url}] health probe failed ({health[0]}) x{self.failures}: {health[2][:200]!r}", "ERROR")
+            if self.failures >= self.args.sustain:
+                await self.escalate(f"Server down: {self.failures} consecutive health failures")
+            return
+        if self.failures:
+            log(f"[{self.url}] recovered after {self.failures} failed probes", "INFO")
+        self.failures = 0
+        self.latency["health"].append(health[1])
+
+        # Cold cache -> warmup
+        if status[0] == 200:
+            self.latency["status"].append(status[1])
+            try:
+                readiness = json.loads(status[2].decode()).get("readiness", {})
+            except ValueError:
+                readiness = {}
+            if readiness and not readiness.get("ready", True):
+                log(f"[{self.url}] not ready: {readiness.get('checks')}", "WARN")
+                code, elapsed, _ = await self.probe("/internal/warmup", data={})
+                log(f"[{self.url}] warmup triggered ({code}, {elapsed:.0f}ms)", "INFO")
+
+        if synthetic is not None:
+            if synthetic[0] == 200:
+                self.latency["synthetic"].append(synthetic[1])
+            else:
+                log(f"[{self.url}] synthetic call failed ({synthetic[0]})", "WARN")
+                self.latency["synthetic"].append(self.args.timeout * 1000)
+
+        await self.evaluate_slo()
+
+    async def evaluate_slo(self):
+        samples = self.latency["synthetic"] if self.args.synthetic else self.latency["health"]
+        if len(samples) < min(5, self.args.window):
+            return
+        current = p95(samples)
+        if current <= self.args.slo_p95_ms:
+            if self.slo_breaches:
+                log(f"[{self.url}] latency back within SLO (p95 {current:.0f}ms)", "INFO")
+            self.slo_breaches = 0
+            return
+        self.slo_breaches += 1
+        log(f"[{self.url}] p95 {current:.0f}ms over SLO {self.args.slo_p95_ms}ms x{self.slo_breaches}", "WARN")
+        if self.slo_breaches >= self.args.sustain:
+            await self.escalate(f"Sustained latency degradation: p95 {current:.0f}ms > {self.args.slo_p95_ms}ms "
+                                f"for {self.slo_breaches} checks")
+
+    async def escalate(self, message: str):
+        now = time.time()
+        if now - self.last_alert >= self.args.alert_cooldown:
+            self.last_alert = now
+            alert_msg = f"[{self.url}] {message}\nTime: {datetime.now().isoformat()}"
+            log(alert_msg, "ERROR")
+            if self.args.slack_webhook:
+                await asyncio.to_thread(send_slack_alert, self.args.slack_webhook, alert_msg, True)
+            if self.args.email:
+                await asyncio.to_thread(send_email_alert, self.args.email, "🚨 Bluefone IVR Degraded", alert_msg)
+
+        if self.args.restart and self.service and now - self.last_restart >= self.args.restart_cooldown:
+            self.last_restart = now
+            if await asyncio.to_thread(restart_service, self.service):
+                self.failures = 0
+                self.slo_breaches = 0
+                for samples in self.latency.values():
+                    samples.clear()
+
+    def summary(self) -> str:
+        parts = [f"{name} p95={p95(s):.0f}ms" for name, s in self.latency.items() if s]
+        return f"[{self.url}] " + (", ".join(parts) or "no samples")
+
+async def monitor_loop(monitor: InstanceMonitor):
+    checks = 0
+    while True:
+        started = time.monotonic()
+        try:
+            await monitor.check()
+        except Exception as e:
+            log(f"[{monitor.url}] probe error: {e}", "ERROR")
+        checks += 1
+        if monitor.args.verbose or checks % monitor.args.report_every == 0:
+            log(monitor.summary(), "INFO")
+        await asyncio.sleep(max(0.0, monitor.args.interval - (time.monotonic() - started)))
+
+async def run_daemon(args):
+    instances = args.instance or [SERVER_URL]
+    monitors = []
+    for spec in instances:
+        url, _, service = spec.partition("=")
+        # Local default instance restarts the default unit
+        if not service and url == SERVER_URL and len(instances) == 1:
+            service = SERVICE_NAME
+        monitors.append(InstanceMonitor(url, service, args))
+    log(f"Watchdog daemon monitoring {len(monitors)} instance(s), "
+        f"interval {args.interval}s, SLO p95 {args.slo_p95_ms}ms", "INFO")
+    await asyncio.gather(*(monitor_loop(m) for m in monitors))
+
 def main():
     parser = argparse.ArgumentParser(description="Bluefone IVR Watchdog")
     parser.add_argument("--slack-webhook", help="Slack webhook URL for alerts")
@@ -138,8 +322,31 @@ def main():
     parser.add_argument("--warmup", action="store_true", help="Also trigger cache warmup")
     parser.add_argument("--restart", action="store_true", help="Auto-restart on failure")
     parser.add_argument("--verbose", "-v", action="store_true", help="Verbose output")
+    
+    daemon = parser.add_argument_group("daemon mode")
+    daemon.add_argument("--daemon", action="store_true", help="Run continuously instead of a single check")
+    daemon.add_argument("--instance", action="append",
+                        help="Instance to monitor as URL or URL=systemd-service (repeatable)")
+    daemon.add_argument("--interval", type=float, default=10, help="Seconds between probes (default 10)")
+    daemon.add_argument("--timeout", type=float, default=10, help="Probe timeout in seconds (default 10)")
+    daemon.add_argument("--slo-p95-ms", type=float, default=500, help="Latency SLO for p95 (default 500ms)")
+    daemon.add_argument("--window", type=int, default=30, help="Rolling window in samples (default 30)")
+    daemon.add_argument("--sustain", type=int, default=3,
+                        help="Consecutive failing checks before alert/restart (default 3)")
+    daemon.add_argument("--alert-cooldown", type=float, default=900, help="Seconds between alerts (default 900)")
+    daemon.add_argument("--restart-cooldown", type=float, default=600, help="Seconds between restarts (default 600)")
+    daemon.add_argument("--report-every", type=int, default=30, help="Log latency summary every N checks")
+    daemon.add_argument("--no-synthetic", dest="synthetic", action="store_false",
+                        help="Skip the synthetic /voice/incoming probe")
     args = parser.parse_args()
     
+    if args.daemon:
+        try:
+            asyncio.run(run_daemon(args))
+        except KeyboardInterrupt:
+            log("Watchdog daemon stopped", "INFO")
+        return
+    
     log("Starting health check...", "INFO")
     
     # Check health
@@ -156,8 +363,15 @@ def main():
                 calls = status.get("calls", {}).get("total", 0)
                 log(f"Uptime: {uptime}, Total calls: {calls}", "INFO")
         
+        # Alive but cold: warm it so callers don't hit a cold cache
+        ready, details = check_ready()
+        if not ready:
+            log(f"Not ready: {details}", "WARN")
+            if trigger_warmup():
+                log("Cache warmup triggered (not ready)", "INFO")
+        
         # Optionally warmup cache
-        if args.warmup:
+        elif args.warmup:
             if trigger_warmup():
                 log("Cache warmup triggered", "INFO")
             else:
@@ -184,7 +398,6 @@ def main():
         if args.restart:
             if restart_service():
                 # Wait and check again
-                import time
                 time.sleep(5)
                 healthy2, message2 = check_health()
                 if healthy2:
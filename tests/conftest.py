@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# Before any app import: module paths (outbox, handoff, CDR) derive from DATA_DIR
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="bluefone-tests-")
+os.environ.setdefault("MOCK_MODE", "TRUE")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
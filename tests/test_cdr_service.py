@@ -0,0 +1,84 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import cdr_service
+
+HOUR = 3600
+
+@pytest.fixture(autouse=True)
+def db(monkeypatch, tmp_path):
+    """Fresh calls.db in tmp_path"""
+    monkeypatch.setattr(cdr_service, "DB_PATH", str(tmp_path / "calls.db"))
+    monkeypatch.setattr(cdr_service, "_conn", None)
+    cdr_service._pending.clear()
+    yield
+    if cdr_service._conn is not None:
+        cdr_service._conn.close()
+    cdr_service._pending.clear()
+
+def record_at(monkeypatch, ts, call_sid, tenant_id="t1", event="incoming", **detail):
+    with monkeypatch.context() as m:
+        m.setattr(time, "time", lambda: ts)
+        cdr_service.record_event(call_sid, tenant_id, event, from_number="+61400000001", **detail)
+
+def test_pages_across_identical_timestamps(monkeypatch):
+    for i in range(7):
+        record_at(monkeypatch, 1000.5, f"CA{i}")
+    record_at(monkeypatch, 999.0, "CAolder")
+    record_at(monkeypatch, 1001.0, "CAnewer")
+    assert cdr_service.flush() == 9
+
+    seen, cursor = [], None
+    while True:
+        page = cdr_service.query_events(limit=3, cursor=cursor)
+        seen += [e["call_sid"] for e in page["events"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    # Newest first, ties broken by insertion order (newest id first), nothing repeated or skipped
+    assert seen == ["CAnewer"] + [f"CA{i}" for i in reversed(range(7))] + ["CAolder"]
+
+def test_cursor_keeps_full_timestamp_precision(monkeypatch):
+    record_at(monkeypatch, 1000.123456789, "CAa")
+    record_at(monkeypatch, 1000.123456789, "CAb")
+    cdr_service.flush()
+    page = cdr_service.query_events(limit=1)
+    assert page["events"][0]["call_sid"] == "CAb"
+    assert [e["call_sid"] for e in cdr_service.query_events(limit=1, cursor=page["next_cursor"])["events"]] == ["CAa"]
+
+def test_filters_and_detail(monkeypatch):
+    record_at(monkeypatch, 1000.0, "CA1", tenant_id="t1", event="menu", digit="1")
+    record_at(monkeypatch, 1001.0, "CA2", tenant_id="t2", event="menu", digit="2")
+    cdr_service.flush()
+    events = cdr_service.query_events(tenant_id="t2")["events"]
+    assert [(e["call_sid"], e["digit"]) for e in events] == [("CA2", "2")]
+    assert [e["call_sid"] for e in cdr_service.query_events(end=1001.0)["events"]] == ["CA1"]
+
+def test_hourly_rollup_counts(monkeypatch):
+    for ts, tenant_id, event in [(10, "t1", "incoming"), (20, "t1", "incoming"), (30, "t1", "menu"),
+                                 (HOUR + 5, "t1", "incoming"), (40, "t2", "incoming")]:
+        record_at(monkeypatch, float(ts), "CA", tenant_id=tenant_id, event=event)
+    cdr_service.flush()
+    record_at(monkeypatch, 50.0, "CA", tenant_id="t1", event="incoming")  # later batch, same bucket
+    cdr_service.flush()
+
+    hours = cdr_service.query_hourly(tenant_id="t1")
+    assert hours == [
+        {"tenant_id": "t1", "hour": HOUR, "events": {"incoming": 1}},
+        {"tenant_id": "t1", "hour": 0, "events": {"incoming": 3, "menu": 1}}
+    ]
+    assert [h["tenant_id"] for h in cdr_service.query_hourly(start=0, end=HOUR - 1)] == ["t1", "t2"]
+
+def test_calls_endpoints(monkeypatch):
+    record_at(monkeypatch, 1000.0, "CA1")
+    cdr_service.flush()
+    client = TestClient(app)
+    assert client.get("/internal/calls", params={"limit": 1}).json()["events"][0]["call_sid"] == "CA1"
+    for cursor in ("bogus", "abc:1", "1000.0:x", "1:2:3"):
+        assert client.get("/internal/calls", params={"cursor": cursor}).status_code == 400
+    hours = client.get("/internal/calls/hourly", params={"tenant_id": "t1"}).json()["hours"]
+    assert hours == [{"tenant_id": "t1", "hour": 0, "events": {"incoming": 1}}]
+    assert client.get("/internal/calls/hourly", params={"start": "not a time"}).status_code == 400
@@ -0,0 +1,110 @@
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from app.services import digest_service, email_service
+
+DIGEST = {"email_mode": "digest", "store_name": "Test Store", "digest_max_items": "1000"}
+
+@pytest.fixture(autouse=True)
+def digest(monkeypatch, tmp_path):
+    """Digest buffers in tmp_path; sent reports recorded (and appended to sent.jsonl)"""
+    sent_log = tmp_path / "sent.jsonl"
+    sent = []
+
+    def send_report(recipients, subject, body):
+        sent.append({"recipients": recipients, "subject": subject, "body": body})
+        with open(sent_log, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"recipients": recipients, "subject": subject, "body": body}) + "\n")
+    monkeypatch.setattr(digest_service, "DIGEST_DIR", str(tmp_path / "digest"))
+    monkeypatch.setattr(email_service, "send_report", send_report)
+    return {"sent": sent, "sent_log": sent_log}
+
+def report(index, menu="accessory", settings=DIGEST, recipients=("store@example.com",)):
+    digest_service.deliver_report("t1", settings, list(recipients), f"Voicemail {index}", f"body {index}",
+                                  menu_selection=menu)
+
+def _append_and_flush(start, count):
+    for i in range(start, start + count):
+        report(i)
+        if i % 7 == 0:
+            digest_service.flush_tenant("t1")
+
+def test_overlapping_processes_send_every_item_once(digest):
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=_append_and_flush, args=(start, 60)) for start in (0, 1000)]
+    for worker in workers:
+        worker.start()
+    for _ in range(20):
+        digest_service.flush_due(now=float("inf"))
+    for worker in workers:
+        worker.join(30)
+        assert worker.exitcode == 0
+    digest_service.flush_tenant("t1")
+
+    bodies = [json.loads(line)["body"] for line in open(digest["sent_log"], encoding="utf-8")]
+    delivered = [line for body in bodies for line in body.splitlines() if line.startswith("Voicemail ")]
+    expected = [f"Voicemail {i}" for start in (0, 1000) for i in range(start, start + 60)]
+    assert sorted(delivered) == sorted(expected)
+    assert not [n for n in os.listdir(digest_service.DIGEST_DIR) if not n.endswith(".lock")]
+
+def test_immediate_mode_sends_right_away(digest):
+    report(1, settings={"store_name": "Test Store"})
+    assert [r["subject"] for r in digest["sent"]] == ["Voicemail 1"]
+
+def test_urgent_menu_bypasses_digest(digest):
+    settings = {**DIGEST, "digest_urgent_menus": "repair, off"}
+    report(1, menu="Repair", settings=settings)
+    report(2, menu="accessory", settings=settings)
+    assert [r["subject"] for r in digest["sent"]] == ["Voicemail 1"]
+    assert digest_service.pending_counts() == {"t1": 1}
+
+def test_buffer_is_durable_and_flushes_at_max_items(digest):
+    settings = {**DIGEST, "digest_max_items": "3"}
+    report(1, settings=settings)
+    report(2, settings=settings)
+    assert not digest["sent"]
+    assert len(digest_service._read_items(digest_service._buffer_path("t1"))) == 2  # on disk
+
+    report(3, settings=settings)
+    assert len(digest["sent"]) == 1
+    sent = digest["sent"][0]
+    assert sent["subject"] == "Test Store Voicemail Digest | 3 recordings"
+    assert [line for line in sent["body"].splitlines() if line.startswith("Voicemail ")] == \
+        ["Voicemail 1", "Voicemail 2", "Voicemail 3"]
+    assert digest_service.pending_counts() == {}
+
+def test_flush_due_after_max_minutes(monkeypatch, digest):
+    from app.services import sheet_service
+    monkeypatch.setattr(sheet_service, "get_tenant_config",
+                        lambda tenant_id: {"settings": {**DIGEST, "digest_max_minutes": "10"}})
+    report(1)
+    queued_at = digest_service._oldest_queued_at(digest_service._buffer_path("t1"))
+    assert digest_service.flush_due(now=queued_at + 9 * 60) == 0
+    assert digest_service.flush_due(now=queued_at + 10 * 60) == 1
+    assert len(digest["sent"]) == 1
+
+def test_leftover_flushing_file_is_resent(digest):
+    report(1)
+    path = digest_service._buffer_path("t1")
+    os.replace(path, path + ".flushing")  # crashed mid-send
+    report(2)
+    assert digest_service.pending_counts() == {"t1": 2}
+
+    # A leftover .flushing file is always due; it goes out first, on its own
+    assert digest_service.flush_due() == 2
+    assert [[line for line in r["body"].splitlines() if line.startswith("Voicemail ")]
+            for r in digest["sent"]] == [["Voicemail 1"], ["Voicemail 2"]]
+    assert digest_service.pending_counts() == {}
+
+def test_items_go_to_the_recipients_they_were_addressed_to(digest):
+    report(1, recipients=["a@example.com"])
+    report(2, recipients=["b@example.com", "a@example.com"])
+    report(3, recipients=["a@example.com"])
+    assert digest_service.flush_tenant("t1") == 3
+    by_recipients = {tuple(r["recipients"]): r for r in digest["sent"]}
+    assert set(by_recipients) == {("a@example.com",), ("a@example.com", "b@example.com")}
+    assert by_recipients[("a@example.com",)]["subject"].endswith("| 2 recordings")
+    assert "Voicemail 2" in by_recipients[("a@example.com", "b@example.com")]["body"]
@@ -0,0 +1,39 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import health_service, lifecycle_service, sheet_service, voice_service
+
+@pytest.fixture
+def tenants(monkeypatch):
+    """300 tenants, each with its own loaded config (more than any fixed cache size)"""
+    base = sheet_service._fetch_from_csv()
+    configs = {f"tenant_{i}": base.with_settings(store_name=f"Store {i}") for i in range(300)}
+    monkeypatch.setattr(sheet_service, "TENANT_MAP", dict.fromkeys(configs, "SPREADSHEET_ID_PLACEHOLDER"))
+    monkeypatch.setattr(sheet_service, "get_loaded_config", configs.get)
+    monkeypatch.setattr(lifecycle_service, "draining", False)
+    health_service._lag_samples.clear()
+    return configs
+
+def test_ready_once_every_tenant_is_precompiled(tenants):
+    app = SimpleNamespace(state=SimpleNamespace(preloaded=True))
+    assert health_service.readiness(app)["checks"]["cold_tenants"] == list(tenants)
+
+    for config in tenants.values():
+        voice_service.precompile(config)
+    result = health_service.readiness(app)
+    assert result["checks"]["cold_tenants"] == []
+    assert result["ready"]
+
+def test_lag_fails_readiness_only_after_consecutive_bad_samples(tenants, monkeypatch):
+    monkeypatch.setattr(health_service.settings, "READY_LAG_BAD_SAMPLES", 3)
+    for config in tenants.values():
+        voice_service.precompile(config)
+    app = SimpleNamespace(state=SimpleNamespace(preloaded=True))
+    limit = health_service.settings.READY_MAX_LOOP_LAG_MS
+    health_service._lag_samples.extend([limit + 1, limit + 1])
+    assert health_service.readiness(app)["ready"]
+    health_service._lag_samples.append(limit + 1)
+    assert not health_service.readiness(app)["ready"]
+    health_service._lag_samples.append(0.0)
+    assert health_service.readiness(app)["ready"]
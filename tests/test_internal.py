@@ -0,0 +1,19 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+@pytest.mark.parametrize("refresh, refreshed", [
+    (True, True), (False, False), ("true", True), ("false", False), ("0", False), ("No", False), ("1", True)
+])
+def test_invalidate_refresh_flag_in_json_body(client, refresh, refreshed):
+    resp = client.post("/internal/invalidate", json={"tenant_id": "bluefone_cannonhill", "refresh": refresh})
+    assert resp.status_code == 200
+    assert resp.json()["refreshed"] is refreshed
+
+def test_invalidate_unknown_tenant(client):
+    assert client.post("/internal/invalidate", json={"tenant_id": "nope"}).status_code == 404
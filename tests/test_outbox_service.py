@@ -0,0 +1,143 @@
+import asyncio
+import json
+import os
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.services import email_service, outbox_service
+
+OK = {"ok": True, "status": 202, "retry_after": None, "error": None}
+
+def failure(status, retry_after=None):
+    return {"ok": False, "status": status, "retry_after": retry_after, "error": f"status {status}"}
+
+@pytest.fixture(autouse=True)
+def outbox(monkeypatch, tmp_path):
+    """Fresh outbox in tmp_path; deliveries answered from `results` (default OK)"""
+    monkeypatch.setattr(outbox_service, "OUTBOX_DIR", str(tmp_path))
+    monkeypatch.setattr(outbox_service, "_loaded", False)
+    monkeypatch.setattr(outbox_service, "_log", None)
+    monkeypatch.setattr(outbox_service, "_log_path", None)
+    monkeypatch.setattr(outbox_service, "_paused_until", 0.0)
+    monkeypatch.setattr(outbox_service, "_stats", dict.fromkeys(outbox_service._stats, 0))
+    monkeypatch.setattr(settings, "OUTBOX_MAX_ATTEMPTS", 3)
+    outbox_service._pending.clear()
+    outbox_service._in_flight.clear()
+    results, sent, dead = [], [], []
+
+    def deliver_email(recipients, subject, body):
+        sent.append(subject)
+        return results.pop(0) if results else OK
+    monkeypatch.setattr(email_service, "deliver_email", deliver_email)
+    monkeypatch.setattr(outbox_service, "_dead_letter", lambda entry, error: dead.append(entry["subject"]))
+    yield {"dir": tmp_path, "results": results, "sent": sent, "dead": dead}
+    if outbox_service._log:
+        outbox_service._log.close()
+
+def test_delivered_entry_is_done():
+    outbox_service.enqueue(["a@example.com"], "report", "body")
+    assert outbox_service.drain(timeout=5) == 0
+    assert outbox_service.get_stats()["sent"] == 1
+
+def test_failure_is_retried_with_backoff(outbox):
+    outbox["results"].append(failure(500))
+    entry_id = outbox_service.enqueue(["a@example.com"], "report", "body")
+    before = time.time()
+    assert outbox_service.drain(timeout=5) == 1
+    entry = outbox_service._pending[entry_id]
+    assert entry["attempts"] == 1
+    base = settings.OUTBOX_BACKOFF_BASE
+    assert before + 0.8 * base <= entry["next_at"] <= time.time() + 1.2 * base
+    assert outbox_service._take_due() == []  # not due yet
+
+    entry["next_at"] = 0.0
+    assert outbox_service.drain(timeout=5) == 0
+    assert outbox["sent"] == ["report", "report"]
+
+def test_backoff_doubles_up_to_max(monkeypatch):
+    monkeypatch.setattr(settings, "OUTBOX_BACKOFF_BASE", 10.0)
+    monkeypatch.setattr(settings, "OUTBOX_BACKOFF_MAX", 50.0)
+    assert 32 <= outbox_service._backoff(3) <= 48
+    assert 40 <= outbox_service._backoff(10) <= 60
+
+def test_rate_limit_pauses_all_sends(outbox):
+    outbox["results"].append(failure(429, retry_after=30))
+    outbox_service.enqueue(["a@example.com"], "first", "body")
+    outbox_service.enqueue(["b@example.com"], "second", "body")
+    assert outbox_service.drain(timeout=5) == 1  # second sent in the same pass
+    assert outbox_service._paused_until >= time.time() + 29
+    for entry in outbox_service._pending.values():
+        entry["next_at"] = 0.0
+    assert outbox_service._take_due() == []
+
+def test_permanent_failure_is_dead_lettered(outbox):
+    outbox["results"].append(failure(400))
+    outbox_service.enqueue(["a@example.com"], "bad", "body")
+    assert outbox_service.drain(timeout=5) == 0
+    assert outbox["dead"] == ["bad"]
+
+def test_dead_lettered_after_max_attempts(outbox):
+    outbox["results"].extend([failure(500)] * settings.OUTBOX_MAX_ATTEMPTS)
+    entry_id = outbox_service.enqueue(["a@example.com"], "flaky", "body")
+    for _ in range(settings.OUTBOX_MAX_ATTEMPTS):
+        outbox_service.drain(timeout=5)
+        if entry_id in outbox_service._pending:
+            outbox_service._pending[entry_id]["next_at"] = 0.0
+    assert entry_id not in outbox_service._pending
+    assert outbox["dead"] == ["flaky"]
+    assert len(outbox["sent"]) == settings.OUTBOX_MAX_ATTEMPTS
+
+def test_abandoned_log_is_adopted(outbox):
+    records = [
+        {"op": "add", "id": "keep", "recipients": ["a@example.com"], "subject": "keep", "body": "",
+         "created_at": 1.0, "attempts": 0, "next_at": 0.0},
+        {"op": "add", "id": "sent", "recipients": ["a@example.com"], "subject": "sent", "body": "",
+         "created_at": 2.0, "attempts": 0, "next_at": 0.0},
+        {"op": "fail", "id": "keep", "attempts": 2, "next_at": 5.0, "error": "status 500"},
+        {"op": "done", "id": "sent"}
+    ]
+    with open(outbox["dir"] / "outbox-1-deadbeef.log", "w", encoding="utf-8") as f:
+        f.write("\n".join(json.dumps(r) for r in records) + "\n")
+
+    assert outbox_service.adopt_logs() == 0  # claimed at load, nothing left
+    assert list(outbox_service._pending) == ["keep"]
+    assert outbox_service._pending["keep"]["attempts"] == 2
+    assert os.listdir(outbox["dir"]) == [os.path.basename(outbox_service._log_path)]
+    assert outbox_service.get_stats()["adopted"] == 1
+
+def test_own_log_survives_restart(monkeypatch, outbox):
+    outbox_service.enqueue(["a@example.com"], "pending", "body")
+    outbox_service._log.close()  # process exits: lock released
+    monkeypatch.setattr(outbox_service, "_loaded", False)
+    monkeypatch.setattr(outbox_service, "_log_path", None)
+    outbox_service._pending.clear()
+    assert outbox_service.get_stats()["pending"] == 1
+    assert outbox_service.drain(timeout=5) == 0
+
+def test_sender_loop_survives_errors(monkeypatch, outbox):
+    take_due = outbox_service._take_due
+    errors = []
+
+    def flaky_take_due():
+        if not errors:
+            errors.append(1)
+            raise OSError("disk full")
+        return take_due()
+    monkeypatch.setattr(outbox_service, "_take_due", flaky_take_due)
+    monkeypatch.setattr(outbox_service, "_loop", None)
+    monkeypatch.setattr(outbox_service, "_wakeup", None)
+
+    async def scenario():
+        loop_task = asyncio.create_task(outbox_service.run_sender_loop())
+        await asyncio.sleep(0.05)
+        outbox_service.enqueue(["a@example.com"], "after error", "body")
+        for _ in range(300):
+            if outbox_service._stats["sent"]:
+                break
+            await asyncio.sleep(0.01)
+        loop_task.cancel()
+        await asyncio.gather(loop_task, return_exceptions=True)
+    asyncio.run(scenario())
+    assert errors and outbox["sent"] == ["after error"]
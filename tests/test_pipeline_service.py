@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.services import ai_service, pipeline_service, processing_service
+
+@pytest.fixture(autouse=True)
+def pipeline(monkeypatch, tmp_path):
+    """Empty pipeline with recorded link-only emails and processing calls"""
+    monkeypatch.setattr(pipeline_service, "HANDOFF_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PIPELINE_MAX_BACKLOG", 200)
+    monkeypatch.setattr(settings, "PIPELINE_DEGRADE_DEPTH", 20)
+    monkeypatch.setattr(settings, "PIPELINE_TENANT_CONCURRENCY", 2)
+    monkeypatch.setattr(pipeline_service, "_stopping", False)
+    links, processed = [], []
+    monkeypatch.setattr(pipeline_service, "_send_link_only", lambda job, note: links.append(job["call_sid"]))
+
+    async def process_recording(**kwargs):
+        processed.append((kwargs["call_sid"], kwargs["mode"]))
+    monkeypatch.setattr(processing_service, "process_recording", process_recording)
+
+    for state in (pipeline_service._backlog, pipeline_service._running, pipeline_service._active,
+                  pipeline_service._delayed, pipeline_service._stats):
+        state.clear()
+    yield {"links": links, "processed": processed}
+    pipeline_service._backlog.clear()
+    pipeline_service._running.clear()
+    monkeypatch.setattr(pipeline_service, "_cond", None)
+
+def submit(call_sid, menu="repair", tenant="t1"):
+    return pipeline_service.submit(tenant, f"http://localhost/{call_sid}", "+61400000001", call_sid,
+                                   menu_selection=menu)
+
+def run(coro_fn):
+    async def main():
+        pipeline_service._cond = asyncio.Condition()
+        return await coro_fn()
+    return asyncio.run(main())
+
+def test_jobs_taken_by_menu_priority_then_arrival():
+    async def scenario():
+        for call_sid, menu in [("a1", "accessory"), ("u1", "invalid"), ("r1", "repair"),
+                               ("o1", "off"), ("r2", "repair")]:
+            await submit(call_sid, menu)
+        return [pipeline_service._take_next()["call_sid"] for _ in range(5)]
+    assert run(scenario) == ["r1", "r2", "o1", "a1", "u1"]
+
+def test_tenant_at_its_limit_is_skipped():
+    async def scenario():
+        await submit("r1", tenant="busy")
+        await submit("a1", "accessory", tenant="idle")
+        pipeline_service._running["busy"] = settings.PIPELINE_TENANT_CONCURRENCY
+        first = pipeline_service._take_next()["call_sid"]
+        second = pipeline_service._take_next()
+        return first, second
+    assert run(scenario) == ("a1", None)
+
+def test_deep_backlog_degrades_to_link_first(monkeypatch, pipeline):
+    monkeypatch.setattr(settings, "PIPELINE_DEGRADE_DEPTH", 2)
+    async def scenario():
+        return [await submit(f"r{i}") for i in range(3)]
+    assert run(scenario) == ["queued", "queued", "degraded"]
+    assert pipeline["links"] == ["r2"]
+    followup = next(job for job in pipeline_service._backlog if job["call_sid"] == "r2")
+    assert followup["mode"] == "followup"
+
+def test_full_backlog_sheds_lowest_priority_newest_first(monkeypatch, pipeline):
+    monkeypatch.setattr(settings, "PIPELINE_MAX_BACKLOG", 3)
+    async def scenario():
+        decisions = [await submit(call_sid, menu) for call_sid, menu in
+                     [("a1", "accessory"), ("a2", "accessory"), ("o1", "off")]]
+        decisions.append(await submit("r1", "repair"))      # sheds a2
+        decisions.append(await submit("u1", "invalid"))     # lowest itself: shed
+        return decisions
+    assert run(scenario) == ["queued", "queued", "queued", "queued", "shed"]
+    assert pipeline["links"] == ["a2", "u1"]
+    assert sorted(job["call_sid"] for job in pipeline_service._backlog) == ["a1", "o1", "r1"]
+    assert pipeline_service.get_stats()["counters"]["shed"] == 2
+
+def test_shed_followup_gets_no_second_link(monkeypatch, pipeline):
+    monkeypatch.setattr(settings, "PIPELINE_MAX_BACKLOG", 2)
+    monkeypatch.setattr(settings, "PIPELINE_DEGRADE_DEPTH", 1)
+    async def scenario():
+        return [await submit(call_sid) for call_sid in ("r1", "r2", "r3")]
+    # r2 was degraded (link sent) and, as a follow-up, is the first shed
+    assert run(scenario) == ["queued", "degraded", "degraded"]
+    assert pipeline["links"] == ["r2", "r3"]
+    assert sorted(job["call_sid"] for job in pipeline_service._backlog) == ["r1", "r3"]
+
+def test_rate_limited_job_is_requeued_as_followup(monkeypatch, pipeline):
+    monkeypatch.setattr(settings, "PIPELINE_CONCURRENCY", 1)
+    calls = []
+
+    async def process_recording(**kwargs):
+        calls.append(kwargs["mode"])
+        if len(calls) == 1:
+            raise ai_service.RateLimited("429", retry_after=0.01)
+    monkeypatch.setattr(processing_service, "process_recording", process_recording)
+
+    async def scenario():
+        pipeline_service.start()
+        await submit("r1")
+        for _ in range(200):
+            if pipeline_service._stats["completed"]:
+                break
+            await asyncio.sleep(0.01)
+        await pipeline_service.stop(timeout=1)
+        return dict(pipeline_service._stats)
+    stats = asyncio.run(scenario())
+    assert calls == ["full", "followup"]
+    assert pipeline["links"] == ["r1"]
+    assert stats["rate_limited"] == 1 and stats["retried"] == 1 and stats["completed"] == 1
+
+def test_rate_limited_too_often_gets_link_only(monkeypatch, pipeline):
+    monkeypatch.setattr(settings, "PIPELINE_MAX_RETRIES", 0)
+
+    async def process_recording(**kwargs):
+        raise ai_service.RateLimited("429")
+    monkeypatch.setattr(processing_service, "process_recording", process_recording)
+
+    async def scenario():
+        await submit("r1")
+        job = pipeline_service._take_next()
+        await pipeline_service._run(job)
+    run(scenario)
+    assert pipeline["links"] == ["r1"]
+    assert pipeline_service._stats["failed"] == 1
+    assert not pipeline_service._backlog and not pipeline_service._delayed
+
+def test_stop_hands_over_backlog_to_next_process(pipeline):
+    async def scenario():
+        pipeline_service._stopping = True  # no workers: the job stays queued
+        await submit("r1")
+        return await pipeline_service.stop(timeout=0.1)
+    assert run(scenario) == 1
+    assert pipeline_service.adopt_handoffs() == 1
+    assert pipeline_service._backlog[0]["call_sid"] == "r1"
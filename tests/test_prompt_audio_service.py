@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.services import prompt_audio_service, sheet_service, voice_service
+
+@pytest.fixture
+def flaky_backend(monkeypatch, tmp_path):
+    """TTS backend that fails its first `failures` calls, then writes silent audio"""
+    calls = []
+    state = {"failures": 1}
+
+    def synthesize(text):
+        calls.append(text)
+        if len(calls) <= state["failures"]:
+            raise RuntimeError("TTS unavailable")
+        return prompt_audio_service._stub_backend(text)
+
+    monkeypatch.setitem(prompt_audio_service.BACKENDS, "flaky", (synthesize, "wav"))
+    monkeypatch.setattr(prompt_audio_service, "AUDIO_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "TTS_BACKEND", "flaky")
+    monkeypatch.setattr(settings, "PROMPT_AUDIO_ENABLED", True)
+    monkeypatch.setattr(settings, "PROMPT_AUDIO_RETRY_BASE", 0.05)
+    monkeypatch.setattr(settings, "PROMPT_AUDIO_RETRY_MAX", 0.2)
+    prompt_audio_service._queue.clear()
+    prompt_audio_service._retry.clear()
+    yield {"calls": calls, "state": state}
+    monkeypatch.setattr(settings, "PROMPT_AUDIO_ENABLED", False)
+    with prompt_audio_service._lock:
+        prompt_audio_service._queue.clear()
+        prompt_audio_service._retry.clear()
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+def test_failed_render_is_retried_with_backoff(flaky_backend):
+    flaky_backend["state"]["failures"] = 2
+    assert prompt_audio_service.url_for("Hello there") is None
+    assert wait_for(lambda: prompt_audio_service.url_for("Hello there") is not None)
+    assert len(flaky_backend["calls"]) == 3
+    stats = prompt_audio_service.get_stats()
+    assert stats["retried"] >= 2 and stats["retry_pending"] == 0
+
+def test_prompt_waiting_for_retry_is_not_requeued(flaky_backend, monkeypatch):
+    monkeypatch.setattr(settings, "PROMPT_AUDIO_RETRY_BASE", 60.0)
+    monkeypatch.setattr(settings, "PROMPT_AUDIO_RETRY_MAX", 60.0)
+    prompt_audio_service.url_for("Hello there")
+    assert wait_for(lambda: prompt_audio_service._retry)
+    assert prompt_audio_service.url_for("Hello there") is None
+    assert not prompt_audio_service._queue
+    assert len(flaky_backend["calls"]) == 1
+
+def test_twiml_switches_to_play_after_retry(flaky_backend):
+    config = sheet_service._fetch_from_csv().with_settings(store_name="Retry Store")
+    assert "<Play" not in voice_service.generate_no_input_response(config)
+    assert wait_for(lambda: not prompt_audio_service._retry and not prompt_audio_service._queue
+                    and prompt_audio_service._worker is None)
+    assert "<Play" in voice_service.generate_no_input_response(config)
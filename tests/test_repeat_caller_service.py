@@ -0,0 +1,56 @@
+import pytest
+
+from app.core.config import settings
+from app.services import repeat_caller_service
+
+HALF_LIFE = 1000.0
+NUMBER = "+61 400 000 001"
+
+@pytest.fixture(autouse=True)
+def index(monkeypatch):
+    monkeypatch.setattr(settings, "REPEAT_CALLER_ENABLED", True)
+    monkeypatch.setattr(settings, "REPEAT_CALLER_HALF_LIFE", HALF_LIFE)
+    monkeypatch.setattr(settings, "REPEAT_CALLER_MAX_PER_TENANT", 50000)
+    repeat_caller_service.clear()
+    yield
+    repeat_caller_service.clear()
+
+def test_one_call_is_recent_for_one_half_life():
+    repeat_caller_service.record_event("t1", NUMBER, "incoming", ts=0.0)
+    assert repeat_caller_service.is_returning("t1", NUMBER, now=0.9 * HALF_LIFE)
+    assert not repeat_caller_service.is_returning("t1", NUMBER, now=1.1 * HALF_LIFE)
+
+def test_repeat_calls_stay_recent_longer():
+    repeat_caller_service.record_event("t1", NUMBER, "incoming", ts=0.0)
+    repeat_caller_service.record_event("t1", NUMBER, "incoming", ts=0.0)
+    assert repeat_caller_service.is_returning("t1", NUMBER, now=1.9 * HALF_LIFE)
+    assert not repeat_caller_service.is_returning("t1", NUMBER, now=2.1 * HALF_LIFE)
+
+def test_decayed_count_carries_into_the_next_call():
+    repeat_caller_service.record_event("t1", NUMBER, "incoming", ts=0.0)
+    repeat_caller_service.record_event("t1", NUMBER, "incoming", ts=HALF_LIFE)
+    # 0.5 left from the first call + 1 = 1.5 calls at t=1: recent until t=1+log2(3)
+    assert repeat_caller_service.is_returning("t1", NUMBER, now=2.5 * HALF_LIFE)
+    assert not repeat_caller_service.is_returning("t1", NUMBER, now=2.7 * HALF_LIFE)
+
+def test_only_incoming_events_count_per_tenant():
+    repeat_caller_service.record_event("t1", NUMBER, "menu", ts=0.0)
+    assert not repeat_caller_service.is_returning("t1", NUMBER, now=1.0)
+    repeat_caller_service.record_event("t1", NUMBER, "incoming", ts=0.0)
+    assert not repeat_caller_service.is_returning("t2", NUMBER, now=1.0)
+
+def test_oldest_last_call_is_evicted(monkeypatch):
+    monkeypatch.setattr(settings, "REPEAT_CALLER_MAX_PER_TENANT", 2)
+    for i, number in enumerate(["+61400000001", "+61400000002", "+61400000001", "+61400000003"]):
+        repeat_caller_service.record_event("t1", number, "incoming", ts=float(i))
+    assert repeat_caller_service.is_returning("t1", "+61400000001", now=4.0)
+    assert not repeat_caller_service.is_returning("t1", "+61400000002", now=4.0)
+    assert repeat_caller_service.is_returning("t1", "+61400000003", now=4.0)
+    assert repeat_caller_service.get_stats()["evicted"] >= 1
+
+def test_normalize():
+    assert repeat_caller_service.normalize("+61 400-000-001") == repeat_caller_service.normalize("61400000001")
+    assert repeat_caller_service.normalize("0400000001") != repeat_caller_service.normalize("400000001")
+    assert repeat_caller_service.normalize("+266696687") is None  # anonymous
+    assert repeat_caller_service.normalize("12345") is None
+    assert repeat_caller_service.normalize("") is None
@@ -0,0 +1,31 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import routes
+from app.main import app
+from app.services import cdr_service
+
+FORM = {"To": "+61400000000", "From": "+61400000001"}
+
+@pytest.fixture
+def client():
+    """Routes only (no lifespan: background loops are not needed here)"""
+    routes.call_context_cache.clear()
+    cdr_service._pending.clear()
+    yield TestClient(app)
+    routes.call_context_cache.clear()
+    cdr_service._pending.clear()
+
+def test_watchdog_probe_leaves_no_call_context(client):
+    for second in range(5):
+        resp = client.post("/voice/incoming", data={**FORM, "CallSid": f"CAwatchdog{second}"},
+                           headers={"X-Bluefone-Synthetic": "1"})
+        assert resp.status_code == 200
+    assert len(routes.call_context_cache) == 0
+    assert not cdr_service._pending
+
+def test_real_call_keeps_menu_selection(client):
+    client.post("/voice/incoming", data={**FORM, "CallSid": "CAreal"})
+    client.post("/voice/menu", data={**FORM, "CallSid": "CAreal", "Digits": "1"})
+    assert routes.call_context_cache["CAreal"]["menu_selection"] == "repair"
+    assert [event[2] for event in cdr_service._pending] == ["incoming", "menu"]
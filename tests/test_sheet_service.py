@@ -0,0 +1,28 @@
+import pytest
+
+from app.core.config import settings
+from app.services import fast_summary_service, sheet_service
+
+@pytest.fixture
+def tenants(monkeypatch):
+    """1000 sheet tenants; revision checks counted"""
+    checks = []
+    tenant_ids = [f"tenant_{i}" for i in range(1000)]
+    monkeypatch.setattr(sheet_service, "TENANT_MAP", dict.fromkeys(tenant_ids, "SPREADSHEET_ID_PLACEHOLDER"))
+    monkeypatch.setattr(sheet_service, "get_config_revision", lambda tenant_id: checks.append(tenant_id) or "r1")
+    monkeypatch.setattr(settings, "MOCK_MODE", True)
+    sheet_service.clear_all()
+    yield {"ids": tenant_ids, "checks": checks}
+    sheet_service.clear_all()
+
+def test_every_active_tenant_stays_cached(tenants):
+    for _ in range(2):
+        for tenant_id in tenants["ids"]:
+            assert sheet_service.get_tenant_config(tenant_id) is not None
+    assert len(tenants["checks"]) == len(tenants["ids"])
+
+def test_matchers_are_kept_per_loaded_config():
+    base = sheet_service._fetch_from_csv()
+    configs = [base.with_settings(store_name=f"Store {i}") for i in range(300)]
+    matchers = [fast_summary_service._get_matcher(config) for config in configs]
+    assert all(fast_summary_service._get_matcher(c) is m for c, m in zip(configs, matchers))
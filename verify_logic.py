@@ -25,9 +25,8 @@ def verify():
     # 2. Store Open Logic
     print("\n[2] Testing Is Store Open")
     # Using defaults from CSV (Manual=False, ManualEnabled=True, Schedule... depends on day)
-    # Let's force Manual Mode
-    config["settings"]["manual_mode"] = "TRUE"
-    config["settings"]["manual_enabled"] = "TRUE"
+    # Let's force Manual Mode (configs are immutable: derive an overridden copy)
+    config = config.with_settings(manual_mode="TRUE", manual_enabled="TRUE")
     
     is_open = sheet_service.is_store_open(config)
     print(f"Manual Mode ON, Enabled TRUE -> is_open: {is_open}")
@@ -36,7 +35,7 @@ def verify():
     else:
         print("FAIL: Manual Mode logic broken")
         
-    config["settings"]["manual_enabled"] = "FALSE"
+    config = config.with_settings(manual_enabled="FALSE")
     is_open_closed = sheet_service.is_store_open(config)
     print(f"Manual Mode ON, Enabled FALSE -> is_open: {is_open_closed}")
     if not is_open_closed: